@@ -12,6 +12,9 @@ load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")  # 请在.env文件中设置此变量
 OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
 
+# 本地嵌入服务地址（见src/llm/db/embedding_server.py），为空时各进程在本地加载模型
+EMBEDDING_SERVER_URL = os.getenv("EMBEDDING_SERVER_URL", "")
+
 # 默认模型配置
 DEFAULT_MODEL = "anthropic/claude-3.7-sonnet"  # Claude 3 Opus
 AVAILABLE_MODELS = {
@@ -711,5 +714,15 @@ system_prompt_code_to_semantic = """
 你是一个代码专家,你的任务是根据输入的代码片段,生成自然语言的描述的语义.
 你需要解释代码的功能和行为,非常客观的描述即可,可以稍微带上一些关键细节,流程或者控制流等.不需要任何评价或者判断,例如是否安全,是否有漏洞,不要出现cwe编号等.尤其不要从注释中获取信息,或者说明有何安全问题,漏洞等字眼,只需要描述代码的客观语义和流程.字数在100个左右.
 """
+system_prompt_compile_repair = """
+你是一个Java编译错误修复专家。输入是一个经过语义还原（用直接的Java代码替代注解语义）后无法编译的Java源文件，以及javac给出的编译错误。
+你的任务是修改这个文件使其能够编译通过：
+- 只修改与编译错误相关的代码，保留其余代码和语义还原的结果不变
+- 缺少的类、方法或变量无法确定时，使用null、临时变量或简单的构造函数替代，不要引入新的依赖
+- 不要删除类中已有的public方法，不要修改包名和类名
+
+直接返回修复后的完整Java文件，不需要任何解释。
+"""
+
 # 项目路径配置
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) 
\ No newline at end of file
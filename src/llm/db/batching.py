@@ -0,0 +1,80 @@
+"""
+嵌入推理的长度分桶动态批处理工具
+
+同一批次内的输入会被填充到该批次最长序列的长度，长短输入混在一起时大部分计算都浪费在填充上。
+这里按token长度排序后在token预算内组桶，每个桶单独推理，最后由调用方按原始顺序还原结果。
+"""
+
+from typing import List, Optional, Sequence
+
+# 单个桶允许的填充后token总数（batch_size * 桶内最大长度）
+DEFAULT_MAX_BATCH_TOKENS = 8192
+
+
+def build_length_buckets(lengths: Sequence[int],
+                         max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+                         max_batch_size: Optional[int] = None) -> List[List[int]]:
+    """
+    按长度对输入分桶
+
+    参数:
+        lengths: 每个输入的token长度
+        max_batch_tokens: 每个桶填充后的token上限，单个超长输入会独占一个桶
+        max_batch_size: 每个桶最多包含的输入数量，None表示不限制
+
+    返回:
+        桶列表，每个桶是原始输入下标的列表，桶内按长度升序排列
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets = []
+    current = []
+    for index in order:
+        # 升序遍历，加入当前输入后桶内最大长度就是它本身的长度
+        padded = lengths[index] * (len(current) + 1)
+        full = max_batch_size is not None and len(current) >= max_batch_size
+        if current and (padded > max_batch_tokens or full):
+            buckets.append(current)
+            current = []
+        current.append(index)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def padded_tokens(lengths: Sequence[int], buckets: Sequence[Sequence[int]]) -> int:
+    """计算按给定分桶推理时实际送入模型的token数（含填充）"""
+    return sum(len(bucket) * max(lengths[i] for i in bucket) for bucket in buckets if bucket)
+
+
+def padding_ratio(lengths: Sequence[int], buckets: Sequence[Sequence[int]]) -> float:
+    """计算填充token占模型输入的比例"""
+    total = padded_tokens(lengths, buckets)
+    if total == 0:
+        return 0.0
+    return 1.0 - sum(lengths) / total
+
+
+def shard_by_tokens(lengths: Sequence[int], max_shard_tokens: int) -> List[List[int]]:
+    """
+    按token总量把输入切分成工作分片，用于多进程推理
+
+    输入先按长度降序排列，长输入所在的分片先被调度，避免最后只剩一个大分片拖尾；
+    每个分片的真实token总数不超过max_shard_tokens（单个超长输入独占一个分片）。
+
+    返回:
+        分片列表，每个分片是原始输入下标的列表
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    shards = []
+    current = []
+    current_tokens = 0
+    for index in order:
+        if current and current_tokens + lengths[index] > max_shard_tokens:
+            shards.append(current)
+            current = []
+            current_tokens = 0
+        current.append(index)
+        current_tokens += lengths[index]
+    if current:
+        shards.append(current)
+    return shards
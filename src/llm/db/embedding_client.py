@@ -0,0 +1,64 @@
+"""
+本地嵌入服务的客户端
+
+多个并发的流水线进程通过该客户端共享同一个常驻的嵌入服务（见embedding_server），
+无需在每个进程中各自加载CodeBERT和文本模型。
+"""
+
+import logging
+from typing import List
+
+import requests
+
+logger = logging.getLogger("embedding_client")
+
+
+class EmbeddingClient:
+    """
+    嵌入服务HTTP客户端
+    """
+
+    def __init__(self, server_url: str, timeout: int = 300):
+        """
+        参数:
+            server_url: 服务地址，例如 http://127.0.0.1:8765
+            timeout: 单次请求超时时间（秒）
+        """
+        self.server_url = server_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, payload) -> List[List[float]]:
+        response = self.session.post(f"{self.server_url}/embed", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    def embed_token_ids(self, token_ids: List[List[int]], normalize: bool = False) -> List[List[float]]:
+        """使用服务端代码模型计算已分词输入的向量"""
+        if not token_ids:
+            return []
+        return self._post({"model": "code", "input_ids": [list(ids) for ids in token_ids], "normalize": normalize})
+
+    def embed_texts(self, texts: List[str], normalize: bool = False) -> List[List[float]]:
+        """使用服务端文本模型计算向量"""
+        if not texts:
+            return []
+        return self._post({"model": "text", "texts": list(texts), "normalize": normalize})
+
+    def health(self) -> dict:
+        response = self.session.get(f"{self.server_url}/health", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+class RemoteTextEmbeddingFunction:
+    """
+    Chroma文本嵌入函数的客户端实现，替代本地加载的SentenceTransformerEmbeddingFunction
+    """
+
+    def __init__(self, server_url: str, normalize: bool = False):
+        self.client = EmbeddingClient(server_url)
+        self.normalize = normalize
+
+    def __call__(self, input):
+        return self.client.embed_texts(list(input), normalize=self.normalize)
@@ -0,0 +1,129 @@
+"""
+多进程嵌入推理工作池
+
+单进程加单个PyTorch线程池无法吃满多核索引机器。这里每个工作进程只加载一次模型，
+输入按token总量切分成分片分发给各进程，完成的分片按完成顺序流式返回，
+由主进程作为唯一的Chroma写入方写库。
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from src.llm.db.batching import DEFAULT_MAX_BATCH_TOKENS, shard_by_tokens
+
+logger = logging.getLogger("embedding_pool")
+
+# 工作进程中按每进程线程数设置的线程池环境变量
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# 工作进程内的嵌入函数，由_init_worker初始化
+_worker_embedding_function = None
+
+
+def _init_worker(model_path: str, threads: int, max_batch_tokens: int,
+                 embedding_factory: Optional[Callable[..., Any]] = None) -> None:
+    # 必须在导入torch之前限制线程数，否则OpenMP/MKL线程池已按全部核数创建
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    if embedding_factory is None:
+        import torch
+        from src.llm.db.vector_db import CustomEmbeddingFunction
+
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+        embedding_factory = CustomEmbeddingFunction
+
+    global _worker_embedding_function
+    _worker_embedding_function = embedding_factory(model_path, max_batch_tokens=max_batch_tokens)
+
+
+def _embed_shard(token_ids: List[List[int]]) -> List[List[float]]:
+    return _worker_embedding_function.embed_token_ids(token_ids)
+
+
+class EmbeddingWorkerPool:
+    """
+    进程池嵌入执行器
+
+    用法:
+        with EmbeddingWorkerPool(model_path, num_workers=8, threads_per_worker=8) as pool:
+            db = VectorDB(model_path, embedding_pool=pool)
+            db.save_code(docs, metadata)
+    """
+
+    def __init__(
+            self,
+            model_path: str,
+            num_workers: Optional[int] = None,
+            threads_per_worker: Optional[int] = None,
+            max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+            max_shard_tokens: int = 32768,
+            embedding_factory: Optional[Callable[..., Any]] = None,
+    ):
+        """
+        初始化工作池
+
+        参数:
+            model_path: 嵌入模型路径
+            num_workers: 工作进程数，默认为CPU核数除以每进程线程数
+            threads_per_worker: 每个进程的PyTorch线程数，默认为CPU核数除以进程数；
+                num_workers * threads_per_worker 不应超过物理核数，否则会发生超额订阅
+            max_batch_tokens: 进程内单次前向推理的填充后token上限
+            max_shard_tokens: 每个分发分片的token总量上限
+            embedding_factory: 在工作进程中创建嵌入函数的可pickle调用对象，
+                以(model_path, max_batch_tokens=...)调用，返回值需提供embed_token_ids；默认为CustomEmbeddingFunction
+        """
+        cpu_count = os.cpu_count() or 1
+        if num_workers is None:
+            num_workers = max(1, cpu_count // (threads_per_worker or 4))
+        if threads_per_worker is None:
+            threads_per_worker = max(1, cpu_count // num_workers)
+        if num_workers * threads_per_worker > cpu_count:
+            logger.warning(f"工作进程数({num_workers}) x 每进程线程数({threads_per_worker}) 超过CPU核数({cpu_count})")
+
+        self.model_path = model_path
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.max_shard_tokens = max_shard_tokens
+        # torch在fork后的子进程中不安全，统一使用spawn
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_path, threads_per_worker, max_batch_tokens, embedding_factory),
+        )
+        logger.info(f"嵌入工作池已启动: {num_workers} 个进程, 每进程 {threads_per_worker} 个线程")
+
+    def iter_embed(self, token_ids: Sequence[List[int]]) -> Iterator[Tuple[List[int], List[List[float]]]]:
+        """
+        分片并行推理，按完成顺序产出(原始下标列表, 向量列表)
+        """
+        shards = shard_by_tokens([len(ids) for ids in token_ids], self.max_shard_tokens)
+        futures = {self.executor.submit(_embed_shard, [token_ids[i] for i in shard]): shard for shard in shards}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def embed(self, token_ids: Sequence[List[int]]) -> List[List[float]]:
+        """并行推理并按输入顺序返回全部向量"""
+        results = [None] * len(token_ids)
+        for indices, vectors in self.iter_embed(token_ids):
+            for index, vector in zip(indices, vectors):
+                results[index] = vector
+        return results
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
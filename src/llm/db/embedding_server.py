@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+本地嵌入服务
+
+每次构造VectorDB都要花数秒加载模型并各自占用约500MB的CodeBERT副本。该服务在本机常驻一份预热的
+代码模型和文本模型，通过localhost HTTP对外提供嵌入计算；来自不同客户端的并发请求在短时间窗口内
+合并成一个批次，再交给长度分桶推理，多个并发运行共享同一个模型。
+
+用法:
+    python -m src.llm.db.embedding_server --model-path /path/to/codebert --port 8765
+客户端:
+    在.env中设置 EMBEDDING_SERVER_URL=http://127.0.0.1:8765，或 VectorDB(..., embedding_server_url=...)
+"""
+
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.llm.db.batching import DEFAULT_MAX_BATCH_TOKENS
+from src.llm.db.vector_db import DEFAULT_TEXT_MODEL, CustomEmbeddingFunction, normalize_vectors
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("embedding_server")
+
+# 单个请求等待批处理结果的默认时长上限（秒）
+DEFAULT_TIMEOUT = 300.0
+
+
+class _Job:
+    def __init__(self, model: str, inputs: list, normalize: bool):
+        self.model = model
+        self.inputs = inputs
+        self.normalize = normalize
+        # 文本输入按字符数粗略估计token数
+        self.tokens = sum(len(item) for item in inputs) if model == "code" else sum(len(t) for t in inputs) // 4
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class EmbeddingBatcher:
+    """
+    跨请求的批处理器：单个推理线程从队列中取出请求，在等待窗口内尽量合并更多请求后统一推理
+    """
+
+    def __init__(self, embed_functions: Dict[str, Callable[[list], List[List[float]]]], max_wait_ms: float = 10,
+                 max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS * 4, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        self.embed_functions = embed_functions
+        self.timeout = timeout
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_tokens = max_batch_tokens
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        self.thread = threading.Thread(target=self._loop, name="embedding-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, model: str, inputs: list, normalize: bool = False) -> List[List[float]]:
+        """
+        提交一次嵌入请求并等待批处理结果
+
+        返回:
+            与inputs一一对应的向量；推理出错时抛出对应异常，超过timeout仍未完成时抛出TimeoutError
+        """
+        if model not in self.embed_functions:
+            raise ValueError(f"服务未加载模型: {model}")
+        job = _Job(model, inputs, normalize)
+        self.queue.put(job)
+        if not job.event.wait(self.timeout):
+            raise TimeoutError(f"嵌入请求超时（{self.timeout}秒）")
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _collect(self) -> List[_Job]:
+        jobs = [self.queue.get()]
+        tokens = jobs[0].tokens
+        deadline = time.monotonic() + self.max_wait
+        while tokens < self.max_batch_tokens:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            tokens += job.tokens
+        return jobs
+
+    def _loop(self):
+        while True:
+            jobs = self._collect()
+            self.batches += 1
+            self.requests += len(jobs)
+            try:
+                for model in {job.model for job in jobs}:
+                    self._embed_group([job for job in jobs if job.model == model])
+            except Exception as e:
+                logger.error(f"批处理失败: {str(e)}")
+                for job in jobs:
+                    if job.result is None and job.error is None:
+                        job.error = e
+            finally:
+                # 无论推理或后处理是否出错都唤醒等待的请求，推理线程本身不退出
+                for job in jobs:
+                    job.event.set()
+
+    def _embed_group(self, group: List[_Job]):
+        """同一模型的请求合并推理后按请求切分结果，任何错误都记录到该组每个请求上"""
+        try:
+            inputs = [item for job in group for item in job.inputs]
+            vectors = self.embed_functions[group[0].model](inputs)
+            if len(vectors) != len(inputs):
+                raise ValueError(f"模型返回 {len(vectors)} 个向量，输入为 {len(inputs)} 条")
+            results = []
+            offset = 0
+            for job in group:
+                # 文本模型（SentenceTransformer）返回numpy数组，转为list后才能序列化为JSON
+                result = [np.asarray(v, dtype=float).tolist() for v in vectors[offset:offset + len(job.inputs)]]
+                offset += len(job.inputs)
+                results.append(normalize_vectors(result) if job.normalize and result else result)
+        except Exception as e:
+            logger.error(f"嵌入计算失败: {str(e)}")
+            for job in group:
+                job.error = e
+            return
+        for job, result in zip(group, results):
+            job.result = result
+
+
+def _make_handler(batcher: EmbeddingBatcher, info: dict):
+    class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: dict):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._reply(404, {"error": "not found"})
+                return
+            self._reply(200, {**info, "batches": batcher.batches, "requests": batcher.requests})
+
+        def do_POST(self):
+            if self.path != "/embed":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                model = payload.get("model", "code")
+                inputs = payload["input_ids"] if model == "code" else payload["texts"]
+                embeddings = batcher.submit(model, inputs, bool(payload.get("normalize", False)))
+                self._reply(200, {"embeddings": embeddings})
+            except (KeyError, ValueError) as e:
+                self._reply(400, {"error": str(e)})
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return EmbeddingRequestHandler
+
+
+def serve(model_path: str, host: str = "127.0.0.1", port: int = 8765, text_model: str = DEFAULT_TEXT_MODEL,
+          max_wait_ms: float = 10, max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS, threads: int = 0,
+          request_timeout: float = DEFAULT_TIMEOUT):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    start_time = time.time()
+    code_function = CustomEmbeddingFunction(model_path, max_batch_tokens=max_batch_tokens)
+    embed_functions = {"code": code_function.embed_token_ids}
+    if text_model:
+        from chromadb.utils.embedding_functions.sentence_transformer_embedding_function import \
+            SentenceTransformerEmbeddingFunction
+        embed_functions["text"] = SentenceTransformerEmbeddingFunction(model_name=text_model)
+    logger.info(f"模型加载完成，耗时 {time.time() - start_time:.2f} 秒")
+
+    batcher = EmbeddingBatcher(embed_functions, max_wait_ms, max_batch_tokens * 4, request_timeout)
+    info = {"code_model": model_path, "text_model": text_model or None}
+    server = ThreadingHTTPServer((host, port), _make_handler(batcher, info))
+    logger.info(f"嵌入服务已启动: http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("嵌入服务已停止")
+    finally:
+        server.server_close()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='本地嵌入服务，供多个并发流水线进程共享模型')
+    parser.add_argument('--model-path', default='microsoft/codebert-base', help='代码嵌入模型路径')
+    parser.add_argument('--text-model', default=DEFAULT_TEXT_MODEL, help='文本嵌入模型，传空字符串则不加载')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--max-wait-ms', type=float, default=10, help='合并跨客户端请求的最长等待时间（毫秒）')
+    parser.add_argument('--max-batch-tokens', type=int, default=DEFAULT_MAX_BATCH_TOKENS,
+                        help='单次前向推理的填充后token上限')
+    parser.add_argument('--threads', type=int, default=0, help='PyTorch线程数，0表示默认')
+    parser.add_argument('--request-timeout', type=float, default=DEFAULT_TIMEOUT, help='单个请求等待结果的时长上限（秒）')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    serve(args.model_path, args.host, args.port, args.text_model, args.max_wait_ms, args.max_batch_tokens,
+          args.threads, args.request_timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+基于NumPy的内存映射精确检索索引
+
+SFPP模式库规模较小（数千个分块），无需经过Chroma PersistentClient的SQLite和HNSW。
+向量经L2归一化后以float32/float16存入.npy文件并以内存映射方式加载，
+元数据保存在旁路JSON表中，一次矩阵乘法即可完成批量精确top-k及元数据过滤查询。
+"""
+
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger("flat_index")
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.json"
+
+# float16存储时分块转换为float32计算，避免在半精度上做无BLAS加速的矩阵乘法
+FLOAT16_BLOCK_ROWS = 8192
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+def match_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    判断元数据是否满足过滤条件，支持Chroma where语法的常用子集：
+    {"k": v}, {"k": {"$eq"|"$ne"|"$in"|"$nin"|"$gt"|"$gte"|"$lt"|"$lte": v}}, {"$and": [...]}, {"$or": [...]}
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(match_where(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq":
+                ok = value == expected
+            elif op == "$ne":
+                ok = value != expected
+            elif op == "$in":
+                ok = value in expected
+            elif op == "$nin":
+                ok = value not in expected
+            elif value is None:
+                ok = False
+            elif op == "$gt":
+                ok = value > expected
+            elif op == "$gte":
+                ok = value >= expected
+            elif op == "$lt":
+                ok = value < expected
+            elif op == "$lte":
+                ok = value <= expected
+            else:
+                raise ValueError(f"不支持的过滤操作符: {op}")
+            if not ok:
+                return False
+    return True
+
+
+class FlatIndex:
+    """
+    内存映射的精确向量索引，查询结果格式与Chroma collection.query保持一致
+    """
+
+    def __init__(self, path: str, dtype: Optional[str] = None):
+        """
+        初始化索引，目录中已有数据时以内存映射方式加载
+
+        参数:
+            path: 索引目录，包含vectors.npy和metadata.json
+            dtype: 向量存储精度，float32或float16；None表示沿用已有索引的精度，新索引默认float32。
+                与已有索引的精度不一致时报错，需要转换精度请用from_collection重建
+        """
+        if dtype not in (None, "float32", "float16"):
+            raise ValueError(f"不支持的存储精度: {dtype}")
+        self.path = path
+        self.dtype = np.dtype(dtype or "float32")
+        self.vectors = np.zeros((0, 0), dtype=self.dtype)
+        self.ids: List[str] = []
+        self.documents: List[Optional[str]] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self._id_positions: Dict[str, int] = {}
+        self._mask_cache: Dict[str, np.ndarray] = {}
+        if os.path.exists(os.path.join(path, METADATA_FILE)):
+            self.load()
+            if dtype is not None and self.dtype != np.dtype(dtype):
+                raise ValueError(f"索引 {path} 的存储精度为 {self.dtype}，与指定的 {dtype} 不一致")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load(self) -> None:
+        with open(os.path.join(self.path, METADATA_FILE), 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        self.dtype = np.dtype(table["dtype"])
+        self.ids = table["ids"]
+        self.documents = table["documents"]
+        self.metadatas = table["metadatas"]
+        self.vectors = np.load(os.path.join(self.path, VECTORS_FILE), mmap_mode='r')
+        self._id_positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self._mask_cache = {}
+        logger.info(f"加载向量索引: {self.path}, {len(self.ids)} 条, 维度 {self.vectors.shape[1]}, {self.dtype}")
+
+    def save(self) -> None:
+        """写入向量文件和元数据表，先写临时文件再替换，避免中途失败留下不一致的索引"""
+        os.makedirs(self.path, exist_ok=True)
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        metadata_path = os.path.join(self.path, METADATA_FILE)
+        with open(vectors_path + ".tmp", 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.vectors, dtype=self.dtype))
+        with open(metadata_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"dtype": self.dtype.name, "ids": self.ids, "documents": self.documents,
+                       "metadatas": self.metadatas}, f, ensure_ascii=False)
+        os.replace(vectors_path + ".tmp", vectors_path)
+        os.replace(metadata_path + ".tmp", metadata_path)
+        self.load()
+
+    def add(self, ids: Sequence[str], embeddings, documents: Optional[Sequence[str]] = None,
+            metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        """
+        添加或覆盖向量（相同ID覆盖），需调用save()持久化
+        """
+        embeddings = l2_normalize(embeddings).astype(self.dtype)
+        documents = list(documents) if documents is not None else [None] * len(ids)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in ids]
+        vectors = np.array(self.vectors, dtype=self.dtype) if len(self.ids) else \
+            np.zeros((0, embeddings.shape[1]), dtype=self.dtype)
+        appended = []
+        for i, chunk_id in enumerate(ids):
+            position = self._id_positions.get(chunk_id)
+            if position is None:
+                self._id_positions[chunk_id] = len(self.ids)
+                self.ids.append(chunk_id)
+                self.documents.append(documents[i])
+                self.metadatas.append(metadatas[i])
+                appended.append(i)
+            else:
+                vectors[position] = embeddings[i]
+                self.documents[position] = documents[i]
+                self.metadatas[position] = metadatas[i]
+        self.vectors = np.concatenate([vectors, embeddings[appended]]) if appended else vectors
+        self._mask_cache = {}
+
+    def _where_mask(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            mask = np.fromiter((match_where(m, where) for m in self.metadatas), dtype=bool, count=len(self.metadatas))
+            self._mask_cache[key] = mask
+        return mask
+
+    def similarities(self, query_embeddings) -> np.ndarray:
+        """返回(查询数 x 索引条数)的余弦相似度矩阵"""
+        queries = l2_normalize(query_embeddings)
+        if self.dtype == np.float32:
+            return queries @ np.asarray(self.vectors).T
+        result = np.empty((queries.shape[0], len(self.ids)), dtype=np.float32)
+        for start in range(0, len(self.ids), FLOAT16_BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + FLOAT16_BLOCK_ROWS], dtype=np.float32)
+            result[:, start:start + block.shape[0]] = queries @ block.T
+        return result
+
+    def query(self, query_embeddings, n_results: int = 5, where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = ('documents', 'metadatas', 'distances')) -> Dict[str, Any]:
+        """
+        精确top-k查询
+
+        参数:
+            query_embeddings: 查询向量（单个或批量）
+            n_results: 每个查询返回的结果数
+            where: 元数据过滤条件
+            include: 返回字段，可选documents、metadatas、distances、similarities
+
+        返回:
+            与Chroma一致的结果字典，distances为余弦距离(1 - cosine)
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        result = {"ids": [[] for _ in range(len(queries))]}
+        for field in include:
+            result[field] = [[] for _ in range(len(queries))]
+        if not self.ids:
+            return result
+
+        scores = self.similarities(queries)
+        mask = self._where_mask(where)
+        candidates = len(self.ids) if mask is None else int(mask.sum())
+        k = min(n_results, candidates)
+        if k == 0:
+            return result
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        for row, (indices, row_scores) in enumerate(zip(top, top_scores)):
+            result["ids"][row] = [self.ids[i] for i in indices]
+            if 'documents' in include:
+                result["documents"][row] = [self.documents[i] for i in indices]
+            if 'metadatas' in include:
+                result["metadatas"][row] = [self.metadatas[i] for i in indices]
+            if 'distances' in include:
+                result["distances"][row] = (1.0 - row_scores).tolist()
+            if 'similarities' in include:
+                result["similarities"][row] = row_scores.tolist()
+        return result
+
+    @classmethod
+    def from_collection(cls, collection, path: str, dtype: str = "float32", where: Optional[Dict[str, Any]] = None):
+        """
+        从Chroma集合导出为扁平索引，向量直接复用，不重新计算
+
+        每次导出都在空目录中重建后整体替换path下的索引，集合中已删除的分块不会残留，精度以dtype为准
+        """
+        data = collection.get(where=where, include=['embeddings', 'documents', 'metadatas'])
+        with tempfile.TemporaryDirectory() as empty:
+            index = cls(empty, dtype)
+            if data['ids']:
+                index.add(data['ids'], np.asarray(data['embeddings']), data['documents'], data['metadatas'])
+            index.path = path
+            index.save()
+        return index
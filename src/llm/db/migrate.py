@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+向量集合存储格式迁移工具
+
+将旧格式(v1: 未归一化的均值池化向量, l2空间)的semantic/code/context集合迁移为
+v2格式(L2归一化向量, cosine空间)。均值池化向量归一化后与v2模型直接输出的向量一致，
+因此默认直接转换已有向量；模型发生变化或旧集合缺少向量时可使用--re-embed重新计算。
+可选地把迁移后的集合导出为float16的FlatIndex，供SFPP匹配使用，向量内存减半。
+
+用法:
+    python -m src.llm.db.migrate --path ./chromadb
+    python -m src.llm.db.migrate --path ./chromadb --re-embed --model-path /path/to/codebert
+    python -m src.llm.db.migrate --path ./chromadb --flat-index ./sfpp_index --dtype float16
+"""
+
+import argparse
+import logging
+import os
+from typing import Dict, Optional
+
+import chromadb
+
+from src.llm.db.vector_db import (COLLECTION_DESCRIPTIONS, chunk_id, collection_name, normalize_vectors)
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("vector_db_migrate")
+
+TARGET_VERSION = 2
+
+
+def _target_id(target_name: str, old_id: str, metadata: Dict) -> str:
+    # 带有来源信息的分块按新集合名重新生成确定性ID，保证迁移后再次写入不会产生重复
+    if metadata and 'source_id' in metadata and 'content_hash' in metadata:
+        return chunk_id(target_name, metadata['source_id'], max(int(metadata.get('chunk', 0)), 0),
+                        metadata['content_hash'])
+    return old_id
+
+
+def migrate_collection(client, base_name: str, page_size: int = 1000, vector_db=None,
+                       drop_legacy: bool = False) -> Dict[str, int]:
+    """
+    迁移单个集合
+
+    参数:
+        client: chromadb客户端
+        base_name: 集合基础名称（semantic/code/context）
+        page_size: 每次读取和写入的记录数
+        vector_db: v2格式的VectorDB实例，提供时根据文档重新计算向量，否则直接归一化旧向量
+        drop_legacy: 迁移完成后删除旧集合
+
+    返回:
+        {"migrated": 迁移记录数, "dimension": 向量维度}
+    """
+    source_name = collection_name(base_name, 1)
+    target_name = collection_name(base_name, TARGET_VERSION)
+    source = client.get_collection(source_name)
+    target = client.get_or_create_collection(target_name, metadata={
+        "description": COLLECTION_DESCRIPTIONS[base_name],
+        "hnsw:space": "cosine",
+        "format_version": TARGET_VERSION,
+    })
+
+    include = ['documents', 'metadatas'] if vector_db is not None else ['documents', 'metadatas', 'embeddings']
+    migrated = 0
+    dimension = 0
+    offset = 0
+    while True:
+        page = source.get(limit=page_size, offset=offset, include=include)
+        if not page['ids']:
+            break
+        offset += len(page['ids'])
+        if vector_db is not None:
+            embeddings = vector_db.embed_queries(base_name, page['documents'])
+        else:
+            embeddings = normalize_vectors(page['embeddings'])
+        dimension = len(embeddings[0])
+        ids = [_target_id(target_name, old_id, m) for old_id, m in zip(page['ids'], page['metadatas'])]
+        target.upsert(ids=ids, embeddings=embeddings, documents=page['documents'], metadatas=page['metadatas'])
+        migrated += len(ids)
+        logger.info(f"{source_name} -> {target_name}: 已迁移 {migrated} 条")
+
+    if drop_legacy:
+        client.delete_collection(source_name)
+        logger.info(f"已删除旧集合: {source_name}")
+    return {"migrated": migrated, "dimension": dimension}
+
+
+def export_flat_index(client, path: str, base_name: str = 'code', dtype: str = 'float16'):
+    """
+    把迁移后的v2集合导出为FlatIndex，已有索引会被整体重建（集合中已删除的分块不会残留）
+
+    返回:
+        导出的FlatIndex
+    """
+    from src.llm.db.flat_index import FlatIndex
+    target = client.get_collection(collection_name(base_name, TARGET_VERSION))
+    index = FlatIndex.from_collection(target, path, dtype)
+    size = os.path.getsize(os.path.join(path, 'vectors.npy'))
+    logger.info(f"已导出FlatIndex: {path}, {len(index)} 条, {index.dtype}, 向量文件 {size / 1024 / 1024:.2f} MB")
+    return index
+
+
+def migrate(path: str, collections=tuple(COLLECTION_DESCRIPTIONS), re_embed: bool = False,
+            model_path: Optional[str] = None, page_size: int = 1000, drop_legacy: bool = False,
+            flat_index: Optional[str] = None, flat_index_collection: str = 'code',
+            dtype: str = 'float16') -> Dict[str, Dict[str, int]]:
+    client = chromadb.PersistentClient(path)
+    existing = {c if isinstance(c, str) else c.name for c in client.list_collections()}
+    vector_db = None
+    if re_embed:
+        from src.llm.db.vector_db import VectorDB
+        vector_db = VectorDB(model_path, path=path, storage_version=TARGET_VERSION)
+
+    report = {}
+    for base_name in collections:
+        if collection_name(base_name, 1) not in existing:
+            logger.warning(f"未找到旧集合 {base_name}，跳过")
+            continue
+        report[base_name] = migrate_collection(client, base_name, page_size, vector_db, drop_legacy)
+
+    if flat_index:
+        export_flat_index(client, flat_index, flat_index_collection, dtype)
+
+    for base_name, stats in report.items():
+        # Chroma内部以float32保存，float16只在FlatIndex/快照中生效
+        float32_mb = stats["migrated"] * stats["dimension"] * 4 / 1024 / 1024
+        logger.info(f"{base_name}: {stats['migrated']} 条, 维度 {stats['dimension']}, "
+                    f"float32 {float32_mb:.2f} MB, float16 {float32_mb / 2:.2f} MB")
+    return report
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='向量集合存储格式迁移工具（v1 -> v2）')
+    parser.add_argument('--path', default='./chromadb', help='Chroma持久化目录')
+    parser.add_argument('--collections', nargs='+', default=list(COLLECTION_DESCRIPTIONS),
+                        choices=list(COLLECTION_DESCRIPTIONS), help='需要迁移的集合')
+    parser.add_argument('--re-embed', action='store_true', help='根据文档重新计算向量，而不是归一化旧向量')
+    parser.add_argument('--model-path', default='microsoft/codebert-base', help='重新计算向量时使用的代码模型')
+    parser.add_argument('--page-size', type=int, default=1000, help='每批迁移的记录数')
+    parser.add_argument('--drop-legacy', action='store_true', help='迁移后删除旧集合')
+    parser.add_argument('--flat-index', help='将迁移后的集合导出为FlatIndex的目录')
+    parser.add_argument('--flat-index-collection', default='code', choices=list(COLLECTION_DESCRIPTIONS),
+                        help='导出为FlatIndex的集合')
+    parser.add_argument('--dtype', default='float16', choices=['float16', 'float32'], help='FlatIndex存储精度')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    migrate(args.path, args.collections, args.re_embed, args.model_path, args.page_size, args.drop_legacy,
+            args.flat_index, args.flat_index_collection, args.dtype)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+向量集合的Arrow/Parquet快照导出与批量加载
+
+每个集合导出为一个Parquet文件，列为id、document、metadata(JSON字符串)和embedding(定长列表)，
+另有manifest.json记录存储格式版本、向量维度和条数。新机器从快照批量加载时直接写入已有向量，
+不需要重新计算，也不依赖Chroma内部的SQLite/HNSW文件布局。
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable
+
+import numpy as np
+
+logger = logging.getLogger("vector_db_snapshot")
+
+MANIFEST_FILE = "manifest.json"
+SNAPSHOT_FORMAT = 1
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("快照导出/加载需要pyarrow，请先执行 pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+def _schema(pa, dimension: int, dtype: str):
+    value_type = pa.float16() if dtype == "float16" else pa.float32()
+    return pa.schema([
+        ("id", pa.string()),
+        ("document", pa.string()),
+        ("metadata", pa.string()),
+        ("embedding", pa.list_(value_type, dimension)),
+    ])
+
+
+def export_collection(collection, file_path: str, dtype: str = "float32", page_size: int = 1000) -> Dict[str, int]:
+    """
+    分页读取集合并以行组形式流式写入Parquet文件
+
+    返回:
+        {"count": 记录数, "dimension": 向量维度}
+    """
+    pa, pq = _require_pyarrow()
+    writer = None
+    count = 0
+    dimension = 0
+    offset = 0
+    try:
+        while True:
+            page = collection.get(limit=page_size, offset=offset,
+                                  include=['documents', 'metadatas', 'embeddings'])
+            if not page['ids']:
+                break
+            offset += len(page['ids'])
+            embeddings = np.asarray(page['embeddings'], dtype=np.float16 if dtype == "float16" else np.float32)
+            if writer is None:
+                dimension = embeddings.shape[1]
+                writer = pq.ParquetWriter(file_path, _schema(pa, dimension, dtype), compression="zstd")
+            table = pa.Table.from_arrays([
+                pa.array(page['ids'], pa.string()),
+                pa.array(page['documents'], pa.string()),
+                pa.array([json.dumps(m or {}, ensure_ascii=False) for m in page['metadatas']], pa.string()),
+                pa.FixedSizeListArray.from_arrays(pa.array(embeddings.reshape(-1)), dimension),
+            ], schema=writer.schema)
+            writer.write_table(table)
+            count += len(page['ids'])
+    finally:
+        if writer is not None:
+            writer.close()
+    return {"count": count, "dimension": dimension}
+
+
+def iter_snapshot_batches(file_path: str, batch_size: int = 5000) -> Iterable[Dict[str, list]]:
+    """按批读取快照文件，向量统一还原为float32"""
+    _, pq = _require_pyarrow()
+    parquet_file = pq.ParquetFile(file_path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        embedding_column = batch.column("embedding")
+        dimension = embedding_column.type.list_size
+        embeddings = embedding_column.flatten().to_numpy(zero_copy_only=False).astype(np.float32)
+        yield {
+            "ids": batch.column("id").to_pylist(),
+            "documents": batch.column("document").to_pylist(),
+            # Chroma不接受空字典作为元数据
+            "metadatas": [json.loads(m) or None for m in batch.column("metadata").to_pylist()],
+            "embeddings": embeddings.reshape(-1, dimension),
+        }
+
+
+def export_snapshot(vector_db, path: str, dtype: str = "float32", page_size: int = 1000) -> dict:
+    """导出VectorDB的全部集合到目录path"""
+    os.makedirs(path, exist_ok=True)
+    start_time = time.time()
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "storage_version": vector_db.storage_version,
+        "dtype": dtype,
+        "created_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "collections": {},
+    }
+    for base_name in ('semantic', 'code', 'context'):
+        file_name = f"{base_name}.parquet"
+        stats = export_collection(vector_db.get_collection(base_name), os.path.join(path, file_name), dtype,
+                                  page_size)
+        if stats["count"] == 0:
+            continue
+        manifest["collections"][base_name] = {"file": file_name, **stats}
+    with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    logger.info(f"快照已导出到 {path}，耗时 {time.time() - start_time:.2f} 秒: "
+                f"{ {name: c['count'] for name, c in manifest['collections'].items()} }")
+    return manifest
+
+
+def load_snapshot(vector_db, path: str, batch_size: int = 5000) -> dict:
+    """从快照目录批量加载到VectorDB对应的集合，直接写入已有向量，不重新计算"""
+    with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("storage_version", 1) != vector_db.storage_version:
+        raise ValueError(f"快照存储格式版本({manifest.get('storage_version', 1)})"
+                         f"与当前VectorDB({vector_db.storage_version})不一致")
+    start_time = time.time()
+    loaded = {}
+    for base_name, info in manifest["collections"].items():
+        collection = vector_db.get_collection(base_name)
+        loaded[base_name] = 0
+        for batch in iter_snapshot_batches(os.path.join(path, info["file"]), batch_size):
+            collection.upsert(ids=batch["ids"], embeddings=batch["embeddings"].tolist(),
+                              documents=batch["documents"], metadatas=batch["metadatas"])
+            loaded[base_name] += len(batch["ids"])
+    logger.info(f"快照已从 {path} 加载，耗时 {time.time() - start_time:.2f} 秒: {loaded}")
+    return loaded
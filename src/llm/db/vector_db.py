@@ -1,30 +1,73 @@
+import hashlib
 import uuid
 
 import chromadb
+import numpy as np
 import torch
 from chromadb.utils.embedding_functions.sentence_transformer_embedding_function import \
     SentenceTransformerEmbeddingFunction
 from transformers import AutoModel, AutoTokenizer
 
+from src.config.config import EMBEDDING_SERVER_URL
+from src.llm.db.batching import DEFAULT_MAX_BATCH_TOKENS, build_length_buckets
+from src.llm.db.embedding_client import EmbeddingClient, RemoteTextEmbeddingFunction
+
 
 class CustomEmbeddingFunction:
-    def __init__(self, model_path='microsoft/codebert-base'):
+    def __init__(self, model_path='microsoft/codebert-base', max_batch_tokens=DEFAULT_MAX_BATCH_TOKENS,
+                 max_length=512, normalize=False, server_url=None):
         # 加载本地模型和 tokenizer
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-        self.model = AutoModel.from_pretrained(model_path)
+        # 客户端模式：只在本地分词，向量由共享的嵌入服务计算，不加载模型
+        self.client = EmbeddingClient(server_url) if server_url else None
+        self.model = None
+        if self.client is None:
+            self.model = AutoModel.from_pretrained(model_path)
+            self.model.eval()
+        # 每个推理批次填充后的token上限
+        self.max_batch_tokens = max_batch_tokens
+        self.max_length = max_length
+        # 是否输出L2归一化向量（v2存储格式）
+        self.normalize = normalize
 
     def __call__(self, input):
         # input 应该是一个字符串列表
-        inputs = self.tokenizer(input, padding=True, truncation=True, return_tensors="pt")
-        outputs = self.model(**inputs)
+        encoded = self.tokenizer(list(input), truncation=True, max_length=self.max_length)
+        return self.embed_token_ids(encoded["input_ids"])
+
+    def embed_token_ids(self, token_ids):
+        """
+        对已分词的输入按长度分桶推理，返回顺序与输入一致
+
+        参数:
+            token_ids: token id列表的列表（已包含特殊token）
+
+        返回:
+            向量列表，每个元素是对应输入的向量（list 格式）
+        """
+        if self.client is not None:
+            return self.client.embed_token_ids(token_ids, normalize=self.normalize)
+        lengths = [len(ids) for ids in token_ids]
+        results = [None] * len(token_ids)
+        for bucket in build_length_buckets(lengths, self.max_batch_tokens):
+            inputs = self.tokenizer.pad({"input_ids": [token_ids[i] for i in bucket]}, return_tensors="pt")
+            for index, vector in zip(bucket, self._forward(inputs)):
+                results[index] = vector
+        return results
+
+    def _forward(self, inputs):
+        with torch.no_grad():
+            outputs = self.model(**inputs)
         embeddings = outputs.last_hidden_state
         attention_mask = inputs["attention_mask"].unsqueeze(-1).expand(embeddings.size()).float()
         masked_embeddings = embeddings * attention_mask
         summed = torch.sum(masked_embeddings, dim=1)
         counts = torch.clamp(attention_mask.sum(dim=1), min=1e-9)
         mean_pooled = summed / counts
+        if self.normalize:
+            mean_pooled = torch.nn.functional.normalize(mean_pooled, p=2, dim=1)
         # 返回一个 list，每个元素是对应文本的向量（list 格式）
-        return mean_pooled.detach().numpy().tolist()
+        return mean_pooled.numpy().tolist()
 
     def get_model(self):
         return self.model
@@ -42,6 +85,91 @@ def sliding_window(text, tokenizer, max_length=512, stride=256):
     return result
 
 
+def sliding_window_chunks(text, tokenizer, max_length=512, stride=256):
+    """
+    只分词一次，直接生成可送入模型的token id窗口
+
+    每个窗口都补上模型需要的特殊token，同时保留字符偏移，展示文本直接从原文切片得到，
+    不再经过decode再encode的往返，窗口边界与送入模型的token严格一致。
+    已被前一个窗口完全覆盖的尾部窗口会被丢弃。
+
+    参数:
+        text: 原始文本
+        tokenizer: fast tokenizer（需要支持offset mapping）
+        max_length: 每个窗口的最大token数（含特殊token）
+        stride: 窗口步长
+
+    返回:
+        窗口列表，每个元素为{"input_ids", "start", "end", "text"}，start/end为原文中的字符偏移
+    """
+    if not getattr(tokenizer, "is_fast", False):
+        raise ValueError("sliding_window_chunks需要fast tokenizer以获取字符偏移")
+    window = max_length - tokenizer.num_special_tokens_to_add()
+    if stride > window:
+        raise ValueError(f"步长{stride}不能大于窗口内容长度{window}")
+
+    encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    ids = encoded["input_ids"]
+    offsets = encoded["offset_mapping"]
+    chunks = []
+    start = 0
+    while True:
+        end = min(start + window, len(ids))
+        piece = ids[start:end]
+        char_start = offsets[start][0] if piece else 0
+        char_end = offsets[end - 1][1] if piece else 0
+        chunks.append({
+            "input_ids": tokenizer.build_inputs_with_special_tokens(piece),
+            "start": char_start,
+            "end": char_end,
+            "text": text[char_start:char_end],
+        })
+        # 当前窗口已覆盖到结尾，后续窗口都是它的子集
+        if end >= len(ids):
+            break
+        start += stride
+    return chunks
+
+
+# 生成确定性分块ID的命名空间
+CHUNK_ID_NAMESPACE = uuid.UUID("5d0c1a4e-7f57-4b8e-9a0b-3c1f2b6d8e91")
+
+
+# 存储格式版本：
+# 1: 未归一化的均值池化向量，l2空间（旧格式）
+# 2: L2归一化向量，cosine空间，集合名带_v2后缀，各集合的距离可直接比较
+STORAGE_VERSIONS = (1, 2)
+COLLECTION_DESCRIPTIONS = {
+    'semantic': "语义信息数据库",
+    'code': "代码特征数据库",
+    'context': "上下文信息数据库",
+}
+DEFAULT_TEXT_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def collection_name(base_name, storage_version=1):
+    return base_name if storage_version == 1 else f"{base_name}_v{storage_version}"
+
+
+def normalize_vectors(vectors):
+    """对向量逐行做L2归一化，返回list格式"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.clip(norms, 1e-12, None)).tolist()
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(collection_name, source_id, chunk_index, chunk_content_hash):
+    """
+    根据(集合, 来源ID, 分块序号, 内容哈希)生成确定性ID，同一内容重复写入得到相同ID
+    """
+    key = f"{collection_name}\x00{source_id}\x00{chunk_index}\x00{chunk_content_hash}"
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, key))
+
+
 def restore_text_from_tokens(tokens, tokenizer):
     """
     根据token列表还原原始文本
@@ -69,17 +197,37 @@ def restore_text_from_tokens(tokens, tokenizer):
         raise TypeError("输入的tokens必须是列表类型")
 
 
+# 单次写入Chroma的最大记录数
+WRITE_BATCH_SIZE = 1000
+
+
 class VectorDB:
-    def __init__(self, model_path='microsoft/codebert-base', path='./chromadb'):
+    def __init__(self, model_path='microsoft/codebert-base', path='./chromadb', embedding_pool=None,
+                 storage_version=1, embedding_server_url=None):
+        if storage_version not in STORAGE_VERSIONS:
+            raise ValueError(f"不支持的存储格式版本: {storage_version}")
+        self.storage_version = storage_version
+        # v2格式写入和查询都使用归一化向量
+        self.normalize = storage_version >= 2
+        # 配置了本地嵌入服务时以客户端模式运行，多个进程共享同一份预热的模型
+        self.embedding_server_url = embedding_server_url or EMBEDDING_SERVER_URL or None
         # embedding function for codes
-        self.embedding_function = CustomEmbeddingFunction(model_path)
+        self.embedding_function = CustomEmbeddingFunction(model_path, normalize=self.normalize,
+                                                          server_url=self.embedding_server_url)
+        # 可选的多进程嵌入工作池（EmbeddingWorkerPool），用于大规模写入代码/上下文集合
+        self.embedding_pool = embedding_pool
         # embedding function for other
-        self.default_embedding_function = SentenceTransformerEmbeddingFunction(
-            model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-        self.default_tokenizer = AutoTokenizer.from_pretrained(
-            "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-        self.model = AutoModel.from_pretrained(model_path)
+        self.text_model = DEFAULT_TEXT_MODEL
+        if self.embedding_server_url:
+            self.default_embedding_function = RemoteTextEmbeddingFunction(self.embedding_server_url,
+                                                                          normalize=self.normalize)
+        else:
+            self.default_embedding_function = SentenceTransformerEmbeddingFunction(
+                model_name=DEFAULT_TEXT_MODEL, normalize_embeddings=self.normalize)
+        self.tokenizer = self.embedding_function.get_tokenizer()
+        self.default_tokenizer = AutoTokenizer.from_pretrained(DEFAULT_TEXT_MODEL)
+        # 复用嵌入函数中的模型，不再单独加载一份
+        self.model = self.embedding_function.get_model()
         self.path = path
         self.client = chromadb.PersistentClient(self.path)
 
@@ -92,48 +240,255 @@ class VectorDB:
     def _init_db(self):
         # create 3 collections
         # 1. semantic collection
-        self.semantic_collection = self.client.get_or_create_collection('semantic',
-                                                                        metadata={"description": "语义信息数据库",
-                                                                                  "hnsw:space": "l2"},
-                                                                        embedding_function=self.default_embedding_function)
+        self.semantic_collection = self._get_or_create_collection('semantic', self.default_embedding_function)
         # 2. code collection
-        self.code_collection = self.client.get_or_create_collection('code',
-                                                                    metadata={"description": "代码特征数据库",
-                                                                              "hnsw:space": "l2"},
-                                                                    embedding_function=self.embedding_function)
-
+        self.code_collection = self._get_or_create_collection('code', self.embedding_function)
         # 3. context collection
-        self.context_collection = self.client.get_or_create_collection('context',
-                                                                       metadata={"description": "上下文信息数据库",
-                                                                                 "hnsw:space": "l2"},
-                                                                       embedding_function=self.embedding_function)
+        self.context_collection = self._get_or_create_collection('context', self.embedding_function)
+
+    def _get_or_create_collection(self, base_name, embedding_function):
+        metadata = {"description": COLLECTION_DESCRIPTIONS[base_name],
+                    "hnsw:space": "l2" if self.storage_version == 1 else "cosine"}
+        if self.storage_version >= 2:
+            # Chroma的HNSW索引只支持float32，半精度存储由FlatIndex和快照导出提供
+            metadata["format_version"] = self.storage_version
+        return self.client.get_or_create_collection(collection_name(base_name, self.storage_version),
+                                                    metadata=metadata,
+                                                    embedding_function=embedding_function)
+
+    def build_code_chunks(self, code):
+        return sliding_window_chunks(code, self.tokenizer)
+
+    def build_text_chunks(self, text):
+        return sliding_window_chunks(text, self.default_tokenizer)
 
     def build_code_input(self, code):
-        chunks = sliding_window(code, self.tokenizer)
-        return restore_text_from_tokens(chunks, self.tokenizer)
+        return [[chunk["text"]] for chunk in self.build_code_chunks(code)]
 
     def build_text_input(self, text):
-        chunks = sliding_window(text, self.default_tokenizer)
-        return restore_text_from_tokens(chunks, self.default_tokenizer)
-
-    def save_code(self, docs: list[str], metadata: list[dict[str:str | int | float]]):
-        self._save(docs, metadata, self.build_code_input, self.code_collection)
-
-    def save_semantic(self, docs: list[str], metadata: list[dict[str:str | int | float]]) -> None:
-        self._save(docs, metadata, self.build_text_input, self.semantic_collection)
-
-    def save_context(self, docs: list[str], metadata: list[dict[str:str | int | float]]):
-        self._save(docs, metadata, self.build_code_input, self.context_collection)
-
-    def _save(self, docs: list[str], metadata: list[dict[str:str | int | float]], input_builder, collection) -> None:
-        for doc, m in zip(docs, metadata):
-            chunks = input_builder(doc)
-            if len(chunks) == 1:
-                m['chunk'] = -1
-                unique_id = str(uuid.uuid4())
-                collection.add(ids=[unique_id], metadatas=[m], documents=chunks[0])
-                continue
-            for index, chunk in enumerate(chunks):
-                m['chunk'] = index
-                unique_id = str(uuid.uuid4())
-                collection.add(ids=[unique_id], metadatas=[m], documents=chunk)
+        return [[chunk["text"]] for chunk in self.build_text_chunks(text)]
+
+    def embed_code_chunks(self, chunks):
+        """直接用窗口的token id计算代码向量，不再重新分词"""
+        return self.embedding_function.embed_token_ids([chunk["input_ids"] for chunk in chunks])
+
+    def get_collection(self, collection):
+        """集合既可以传名称（semantic/code/context），也可以直接传集合对象"""
+        if not isinstance(collection, str):
+            return collection
+        collections = {
+            'semantic': self.semantic_collection,
+            'code': self.code_collection,
+            'context': self.context_collection,
+        }
+        if collection not in collections:
+            raise ValueError(f"未知的集合: {collection}")
+        return collections[collection]
+
+    def embed_queries(self, collection, texts):
+        """
+        按集合所用的模型一次性批量计算查询向量
+
+        参数:
+            texts: 文本列表，或build_code_chunks/build_text_chunks返回的分块列表（代码分块直接使用token id）
+        """
+        collection = self.get_collection(collection)
+        if collection is self.semantic_collection:
+            texts = [t["text"] if isinstance(t, dict) else t for t in texts]
+            return self.default_embedding_function(texts)
+        if texts and all(isinstance(t, dict) for t in texts):
+            return self.embed_code_chunks(texts)
+        return self.embedding_function(texts)
+
+    def query_chunks(self, collection, texts, where=None, k=5) -> np.ndarray:
+        """
+        多分块批量查询：所有分块一次前向推理、一次多查询检索
+
+        参数:
+            collection: 集合名称或集合对象
+            texts: 查询分块（文本或分块字典）
+            where: 元数据过滤条件
+            k: 每个分块返回的结果数
+
+        返回:
+            (分块数 x k) 的距离矩阵，结果不足k个的位置填充NaN，可直接用np.nanmean等聚合
+        """
+        distances = np.full((len(texts), k), np.nan, dtype=np.float32)
+        if not texts:
+            return distances
+        collection = self.get_collection(collection)
+        result = collection.query(query_embeddings=self.embed_queries(collection, texts), where=where, n_results=k,
+                                  include=['distances'])
+        for row, row_distances in enumerate(result['distances']):
+            distances[row, :len(row_distances)] = row_distances
+        return distances
+
+    def export_snapshot(self, path, dtype="float32"):
+        """将三个集合的id、文档、元数据和向量导出为Parquet快照"""
+        from src.llm.db.snapshot import export_snapshot
+        return export_snapshot(self, path, dtype)
+
+    def load_snapshot(self, path):
+        """从Parquet快照批量加载集合，不重新计算向量"""
+        from src.llm.db.snapshot import load_snapshot
+        return load_snapshot(self, path)
+
+    def iter_chunk_embeddings(self, collection, chunks):
+        """
+        按集合所用的模型批量计算分块向量，按批产出(分块下标列表, 向量列表)
+
+        与embed_queries不同，配置了工作池时代码分块由多进程并行计算、按完成顺序返回，适合大批量入库前的预计算
+
+        参数:
+            collection: 集合名称或集合对象
+            chunks: build_code_chunks/build_text_chunks返回的分块列表
+        """
+        if self.get_collection(collection) is self.semantic_collection:
+            return self._iter_text_embeddings(chunks)
+        return self._iter_code_embeddings(chunks)
+
+    def _iter_code_embeddings(self, chunks):
+        """按批产出(分块下标列表, 向量列表)，配置了工作池时由多进程并行计算并按完成顺序返回"""
+        if self.embedding_pool is not None:
+            for indices, vectors in self.embedding_pool.iter_embed([chunk["input_ids"] for chunk in chunks]):
+                yield indices, normalize_vectors(vectors) if self.normalize else vectors
+            return
+        yield list(range(len(chunks))), self.embed_code_chunks(chunks)
+
+    def _iter_text_embeddings(self, chunks):
+        yield list(range(len(chunks))), self.default_embedding_function([chunk["text"] for chunk in chunks])
+
+    @staticmethod
+    def _with_chunk_embeddings(chunk_embedder, chunk_embeddings):
+        """
+        优先使用调用方已计算好的分块向量（分块内容哈希 -> 向量），其余分块再交给chunk_embedder计算
+        """
+        if chunk_embeddings is None:
+            return chunk_embedder
+
+        def embed(chunks):
+            hashes = [content_hash(chunk["text"]) for chunk in chunks]
+            found = [i for i, h in enumerate(hashes) if h in chunk_embeddings]
+            missing = [i for i, h in enumerate(hashes) if h not in chunk_embeddings]
+            if found:
+                yield found, [chunk_embeddings[hashes[i]] for i in found]
+            if missing:
+                for indices, vectors in chunk_embedder([chunks[i] for i in missing]):
+                    yield [missing[i] for i in indices], vectors
+
+        return embed
+
+    def save_code(self, docs: list[str], metadata: list[dict[str:str | int | float]], source_ids=None,
+                  chunk_embeddings=None) -> dict:
+        return self._save(docs, metadata, self.build_code_chunks, self.code_collection,
+                          self._with_chunk_embeddings(self._iter_code_embeddings, chunk_embeddings), source_ids)
+
+    def save_semantic(self, docs: list[str], metadata: list[dict[str:str | int | float]], source_ids=None,
+                      chunk_embeddings=None) -> dict:
+        # 语义集合使用sentence-transformers自带的分词与池化，未提供向量时以文本形式写入
+        chunk_embedder = None
+        if chunk_embeddings is not None:
+            chunk_embedder = self._with_chunk_embeddings(self._iter_text_embeddings, chunk_embeddings)
+        return self._save(docs, metadata, self.build_text_chunks, self.semantic_collection, chunk_embedder,
+                          source_ids)
+
+    def save_context(self, docs: list[str], metadata: list[dict[str:str | int | float]], source_ids=None,
+                     chunk_embeddings=None) -> dict:
+        return self._save(docs, metadata, self.build_code_chunks, self.context_collection,
+                          self._with_chunk_embeddings(self._iter_code_embeddings, chunk_embeddings), source_ids)
+
+    def sync_code(self, docs: list[str], metadata: list[dict[str:str | int | float]], source_ids=None, *,
+                  where: dict, chunk_embeddings=None) -> dict:
+        return self._sync(self.save_code(docs, metadata, source_ids, chunk_embeddings), self.code_collection, where)
+
+    def sync_semantic(self, docs: list[str], metadata: list[dict[str:str | int | float]], source_ids=None, *,
+                      where: dict, chunk_embeddings=None) -> dict:
+        return self._sync(self.save_semantic(docs, metadata, source_ids, chunk_embeddings), self.semantic_collection,
+                          where)
+
+    def sync_context(self, docs: list[str], metadata: list[dict[str:str | int | float]], source_ids=None, *,
+                     where: dict, chunk_embeddings=None) -> dict:
+        return self._sync(self.save_context(docs, metadata, source_ids, chunk_embeddings), self.context_collection,
+                          where)
+
+    def _save(self, docs: list[str], metadata: list[dict[str:str | int | float]], chunk_builder, collection,
+              chunk_embedder=None, source_ids=None) -> dict:
+        """
+        幂等写入：分块ID由(集合, 来源ID, 分块序号, 内容哈希)确定，已存在的分块只更新元数据，不再重新计算向量
+
+        参数:
+            chunk_embedder: 产出(分块下标列表, 向量列表)的生成器函数，为None时由集合的embedding function计算
+                （下标列表在一批之内可以无序，向量与之一一对应）
+            source_ids: 每个文档的来源ID，默认取元数据中的id，没有时使用文档内容哈希
+
+        返回:
+            {"ids": 本次写入的全部分块ID（已去重）, "upserted": 新写入的分块数, "unchanged": 已存在的分块数}
+        """
+        ids = []
+        metadatas = []
+        chunks = []
+        # 同一次调用中重复的(来源ID, 分块, 内容)得到相同的ID，Chroma拒绝同一批upsert中的重复ID，只保留第一次出现
+        seen = set()
+        for position, (doc, m) in enumerate(zip(docs, metadata)):
+            if source_ids is not None:
+                source_id = source_ids[position]
+            else:
+                source_id = m.get('id') or content_hash(doc)
+            doc_chunks = chunk_builder(doc)
+            for index, chunk in enumerate(doc_chunks):
+                chunk_hash = content_hash(chunk["text"])
+                chunk_id_ = chunk_id(collection.name, source_id, index, chunk_hash)
+                if chunk_id_ in seen:
+                    continue
+                seen.add(chunk_id_)
+                chunk_metadata = dict(m)
+                chunk_metadata['chunk'] = -1 if len(doc_chunks) == 1 else index
+                chunk_metadata['source_id'] = source_id
+                chunk_metadata['content_hash'] = chunk_hash
+                ids.append(chunk_id_)
+                metadatas.append(chunk_metadata)
+                chunks.append(chunk)
+        stats = {"ids": ids, "upserted": 0, "unchanged": 0}
+
+        existing = set()
+        for start in range(0, len(ids), WRITE_BATCH_SIZE):
+            existing.update(collection.get(ids=ids[start:start + WRITE_BATCH_SIZE], include=[])['ids'])
+        positions = [i for i, chunk_id_ in enumerate(ids) if chunk_id_ in existing]
+        for start in range(0, len(positions), WRITE_BATCH_SIZE):
+            batch = positions[start:start + WRITE_BATCH_SIZE]
+            collection.update(ids=[ids[i] for i in batch], metadatas=[metadatas[i] for i in batch])
+        stats["unchanged"] = len(positions)
+
+        positions = [i for i, chunk_id_ in enumerate(ids) if chunk_id_ not in existing]
+        if chunk_embedder is None:
+            batches = ((positions[start:start + WRITE_BATCH_SIZE], None)
+                       for start in range(0, len(positions), WRITE_BATCH_SIZE))
+        else:
+            batches = (([positions[i] for i in indices], vectors)
+                       for indices, vectors in chunk_embedder([chunks[i] for i in positions]))
+        # 由当前进程统一写库，工作池只负责计算向量
+        for batch, vectors in batches:
+            for start in range(0, len(batch), WRITE_BATCH_SIZE):
+                part = batch[start:start + WRITE_BATCH_SIZE]
+                collection.upsert(ids=[ids[i] for i in part], metadatas=[metadatas[i] for i in part],
+                                  documents=[chunks[i]["text"] for i in part],
+                                  embeddings=vectors[start:start + WRITE_BATCH_SIZE] if vectors is not None else None)
+            stats["upserted"] += len(batch)
+        return stats
+
+    @staticmethod
+    def _sync(stats, collection, where: dict) -> dict:
+        """
+        删除集合中where范围内不属于本次写入结果的分块，使集合与数据源保持一致
+
+        where必须给出：collection.get(where=None)返回整个集合，会把其他CWE、其他项目及CONTEXT的分块一并删除
+        """
+        if not where:
+            raise ValueError("sync需要where限定删除范围")
+        current = set(stats["ids"])
+        existing = collection.get(where=where, include=[])['ids']
+        stale = [chunk_id_ for chunk_id_ in existing if chunk_id_ not in current]
+        if stale:
+            collection.delete(ids=stale)
+        stats["deleted"] = len(stale)
+        return stats
@@ -18,6 +18,7 @@ from src.config.config import (
     DEFAULT_PARAMS,
     AVAILABLE_MODELS
 )
+from src.llm.tracing import span as trace_span
 
 # 配置日志
 logging.basicConfig(
@@ -168,24 +169,30 @@ class LLMClient:
         
         while attempt < self.retry_attempts:
             try:
-                response = requests.post(
-                    self.chat_endpoint,
-                    headers=self._prepare_headers(),
-                    json=request_body,
-                    timeout=300  # 设置超时时间
-                )
-                
-                response.raise_for_status()  # 如果请求失败，抛出异常
-                
-                if stream:
-                    # 返回响应对象以便调用者处理流式传输
-                    return response
-                else:
-                    # 解析并返回JSON响应
-                    result = response.json()
-                    if len(result['choices']) == 0:
-                        raise Exception("没有choice返回")
-                    return result
+                with trace_span("llm.request", "llm", model=self.model, attempt=attempt + 1,
+                                prompt_chars=len(prompt)) as trace:
+                    response = requests.post(
+                        self.chat_endpoint,
+                        headers=self._prepare_headers(),
+                        json=request_body,
+                        timeout=300  # 设置超时时间
+                    )
+                    trace.set(status_code=response.status_code)
+
+                    response.raise_for_status()  # 如果请求失败，抛出异常
+
+                    if stream:
+                        # 返回响应对象以便调用者处理流式传输
+                        return response
+                    else:
+                        # 解析并返回JSON响应
+                        result = response.json()
+                        usage = result.get('usage') or {}
+                        trace.set(prompt_tokens=usage.get('prompt_tokens'),
+                                  completion_tokens=usage.get('completion_tokens'))
+                        if len(result['choices']) == 0:
+                            raise Exception("没有choice返回")
+                        return result
             
             except Exception as e:
                 attempt += 1
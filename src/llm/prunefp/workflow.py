@@ -10,6 +10,7 @@ from typing import Optional, Tuple
 
 from src.llm.llm_client import LLMClient
 from src.llm.prunefp.controller import FalsePositiveAnalysisController
+from src.llm.workflow.runner import run_command
 
 # 配置日志
 logging.basicConfig(
@@ -18,29 +19,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger("prunefp_workflow")
 
-def execute_command(command: str, cwd: Optional[str] = None) -> Tuple[int, str, str]:
+def execute_command(command: str, cwd: Optional[str] = None, log_file: Optional[str] = None,
+                    timeout: Optional[float] = None, idle_timeout: Optional[float] = None) -> Tuple[int, str, str]:
     """
-    执行命令行命令
+    执行命令行命令，输出流式写入日志文件，超时后终止
     
     参数:
         command: 要执行的命令
         cwd: 命令执行的工作目录，默认为None表示当前目录
+        log_file: 完整输出追加写入的日志文件
+        timeout: 总时长上限（秒）
+        idle_timeout: 没有输出的时长上限（秒）
         
     返回:
-        Tuple[int, str, str]: (返回码, 标准输出, 标准错误)
+        Tuple[int, str, str]: (返回码, 标准输出末尾, 标准错误末尾)
     """
-    try:
-        import subprocess
-        result = subprocess.run(
-            command,
-            shell=True,
-            cwd=cwd,
-            capture_output=True,
-            text=True
-        )
-        return result.returncode, result.stdout, result.stderr
-    except Exception as e:
-        return 1, "", str(e)
+    result = run_command(command, cwd=cwd, log_file=log_file, timeout=timeout, idle_timeout=idle_timeout)
+    return result.returncode, result.stdout, result.stderr
 
 class PruneFalsePositivesWorkflow:
     """
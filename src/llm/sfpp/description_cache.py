@@ -0,0 +1,132 @@
+"""
+方法语义描述的持久化缓存
+
+SFPP匹配中最耗时的一步是调用LLM为每个漏洞所在方法生成语义描述。缓存以
+(soot签名, 方法源码哈希, 提示词版本, LLM模型) 为键保存生成的描述及其语义子块向量，
+方法体未改变时重复运行与重叠的漏洞直接复用，不再调用LLM也不再计算向量。
+提示词版本取提示词文本的哈希，修改system_prompt_code_to_semantic后旧缓存自然失效。
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.config.config import system_prompt_code_to_semantic
+
+logger = logging.getLogger("sfpp_description_cache")
+
+PROMPT_VERSION = hashlib.sha256(system_prompt_code_to_semantic.encode('utf-8')).hexdigest()[:12]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS descriptions (
+    signature TEXT NOT NULL,
+    source_hash TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    model TEXT NOT NULL,
+    description TEXT NOT NULL,
+    embedding_model TEXT,
+    embedding BLOB,
+    embedding_shape TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (signature, source_hash, prompt_version, model)
+)
+"""
+
+
+def source_hash(code: str) -> str:
+    """方法源码的哈希，忽略首尾空白"""
+    return hashlib.sha256(code.strip().encode('utf-8')).hexdigest()
+
+
+class DescriptionCache:
+    """
+    基于SQLite的语义描述缓存，多个匹配进程可以共享同一个缓存文件
+
+    用法:
+        cache = DescriptionCache("sfpp_descriptions.sqlite")
+        key = cache.key(signature, code, llm_client.model)
+        description, embedding = cache.get(key, embedding_model)
+    """
+
+    def __init__(self, path: str = "sfpp_descriptions.sqlite", prompt_version: str = PROMPT_VERSION):
+        """
+        参数:
+            path: 缓存文件路径
+            prompt_version: 提示词版本，默认取当前system_prompt_code_to_semantic的哈希
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.prompt_version = prompt_version
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, signature: Optional[str], code: str, model: str) -> Tuple[str, str, str, str]:
+        """缓存键 (soot签名, 源码哈希, 提示词版本, 模型)"""
+        return signature or "", source_hash(code), self.prompt_version, model or ""
+
+    def get(self, key: Tuple[str, str, str, str],
+            embedding_model: Optional[str] = None) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        查询缓存
+
+        参数:
+            key: key()返回的缓存键
+            embedding_model: 语义向量所用的嵌入模型，与缓存中的不一致时只返回描述
+
+        返回:
+            (描述, 语义子块向量矩阵)，未命中时描述为None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT description, embedding_model, embedding, embedding_shape FROM descriptions "
+                "WHERE signature=? AND source_hash=? AND prompt_version=? AND model=?", key).fetchone()
+        if row is None:
+            self.misses += 1
+            return None, None
+        self.hits += 1
+        description, cached_model, blob, shape = row
+        if blob is None or cached_model != embedding_model:
+            return description, None
+        rows, dimension = (int(v) for v in shape.split(','))
+        return description, np.frombuffer(blob, dtype=np.float32).reshape(rows, dimension).copy()
+
+    def put(self, key: Tuple[str, str, str, str], description: str, embedding: Optional[np.ndarray] = None,
+            embedding_model: Optional[str] = None):
+        """写入或覆盖一条缓存"""
+        blob, shape = None, None
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32).reshape(len(embedding), -1)
+            blob, shape = embedding.tobytes(), f"{embedding.shape[0]},{embedding.shape[1]}"
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO descriptions (signature, source_hash, prompt_version, model, description, "
+                "embedding_model, embedding, embedding_shape, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, description, embedding_model if blob is not None else None, blob, shape, time.time()))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
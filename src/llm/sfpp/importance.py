@@ -0,0 +1,95 @@
+"""
+查询子块重要性评估，实现SFPP_matching_formal_model.md第5.2节的重要子块优先策略
+
+Importance(d_i) = f(Entropy(d_i), KeywordDensity(d_i), Position(d_i))，只使用分词结果和文本，
+不需要调用嵌入模型，可以在计算向量之前决定子块的查询顺序。
+"""
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# 与误报判定相关的关键标识符：危险API、校验/净化逻辑与控制流
+SECURITY_KEYWORDS = frozenset({
+    # 命令执行
+    'Runtime', 'getRuntime', 'exec', 'ProcessBuilder', 'command', 'start',
+    # 文件与路径
+    'File', 'Files', 'Path', 'Paths', 'getCanonicalPath', 'normalize', 'resolve', 'FileInputStream',
+    'FileOutputStream',
+    # SQL
+    'Statement', 'PreparedStatement', 'prepareStatement', 'createStatement', 'executeQuery', 'executeUpdate',
+    'setString', 'setInt', 'query', 'update',
+    # 校验与净化
+    'matches', 'contains', 'startsWith', 'endsWith', 'equals', 'isValid', 'validate', 'sanitize', 'escape',
+    'replaceAll', 'Pattern', 'whitelist', 'allowlist', 'ALLOWED', 'length',
+    # 控制流
+    'if', 'else', 'switch', 'case', 'throw', 'return', 'try', 'catch',
+})
+
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+
+@dataclass
+class ImportanceConfig:
+    """重要性各因素的权重"""
+    entropy_weight: float = 0.4
+    keyword_weight: float = 0.4
+    position_weight: float = 0.2
+
+
+def token_entropy(token_ids: Sequence[int]) -> float:
+    """token分布的归一化香农熵，取值0~1，重复模板代码熵低"""
+    if len(token_ids) < 2:
+        return 0.0
+    counts = Counter(token_ids)
+    total = len(token_ids)
+    entropy = -sum(c / total * math.log2(c / total) for c in counts.values())
+    return entropy / math.log2(total)
+
+
+def keyword_density(text: str, keywords=SECURITY_KEYWORDS) -> float:
+    """关键标识符占全部标识符的比例"""
+    identifiers = IDENTIFIER_PATTERN.findall(text)
+    if not identifiers:
+        return 0.0
+    return sum(1 for identifier in identifiers if identifier in keywords) / len(identifiers)
+
+
+def position_importance(index: int, count: int) -> float:
+    """起始和结束部分权重较高的U形位置因子，取值0.5~1"""
+    if count <= 1:
+        return 1.0
+    x = index / (count - 1)
+    return 0.5 + 0.5 * abs(2 * x - 1)
+
+
+def block_importance(chunks: List[Dict], config: Optional[ImportanceConfig] = None) -> np.ndarray:
+    """
+    计算每个子块的重要性
+
+    参数:
+        chunks: sliding_window_chunks返回的分块列表（包含input_ids和text）
+        config: 各因素权重，默认ImportanceConfig()
+
+    返回:
+        (子块数,) 的重要性数组，关键词密度按本文档内最大值归一化，所有值均大于0
+    """
+    config = config or ImportanceConfig()
+    count = len(chunks)
+    entropy = np.array([token_entropy(chunk["input_ids"]) for chunk in chunks], dtype=np.float32)
+    density = np.array([keyword_density(chunk["text"]) for chunk in chunks], dtype=np.float32)
+    if count and density.max() > 0:
+        density = density / density.max()
+    position = np.array([position_importance(i, count) for i in range(count)], dtype=np.float32)
+    importance = (config.entropy_weight * entropy + config.keyword_weight * density
+                  + config.position_weight * position)
+    return np.maximum(importance, 1e-3)
+
+
+def importance_order(importance: np.ndarray) -> np.ndarray:
+    """按重要性降序排列的子块下标，重要性相同时保持原有顺序"""
+    return np.argsort(-importance, kind='stable')
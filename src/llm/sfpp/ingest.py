@@ -0,0 +1,317 @@
+"""
+SFPP模式库批量入库工具
+
+并行读取SFPP目录（ret*/SFPP.java + SFPP.semantic）或sfpp.json，所有分块一次性批量计算向量，
+按模式级相似度把近似重复的SFPP聚成簇，每簇只保留一个代表写入向量库，最后输出模式库规模汇总。
+
+用法:
+    python -m src.llm.sfpp.ingest experiments/sfppexp --cwe 78 --db ./chromadb --model-path /path/to/codebert
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.llm.sfpp.scorer import DIMENSIONS, ScoringConfig
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("sfpp_ingest")
+
+SFPP_CODE_FILE = "SFPP.java"
+SFPP_SEMANTIC_FILE = "SFPP.semantic"
+SFPP_CONTEXT_FILE = "SFPP.context"
+
+
+def _read(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _read_pattern_dir(directory: str, pattern_id: str) -> Dict[str, str]:
+    record = {"id": pattern_id, "source": directory, "code": _read(os.path.join(directory, SFPP_CODE_FILE))}
+    for dim, file_name in (("semantic", SFPP_SEMANTIC_FILE), ("context", SFPP_CONTEXT_FILE)):
+        text = _read(os.path.join(directory, file_name))
+        if text and text.strip():
+            record[dim] = text
+    return record
+
+
+def _join(*parts) -> str:
+    lines = []
+    for part in parts:
+        if isinstance(part, list):
+            lines.extend(str(p) for p in part if p)
+        elif part:
+            lines.append(str(part))
+    return "\n".join(lines)
+
+
+def read_sfpp_json(path: str) -> List[Dict[str, str]]:
+    """
+    读取sfpp.json格式的模式定义
+
+    code取code_pattern.abstract_representation及其variants，semantic由summary、false_positive_reason
+    和safety_explanation拼接，context由context_features拼接
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    records = []
+    for item in data:
+        code_pattern = item.get("code_pattern", {})
+        semantic = item.get("semantic_description", {})
+        context = item.get("context_features", {})
+        record = {
+            "id": item["sfpp_id"],
+            "source": path,
+            "code": _join(code_pattern.get("abstract_representation"), code_pattern.get("variants")),
+            "semantic": _join(semantic.get("summary"), semantic.get("false_positive_reason"),
+                              semantic.get("safety_explanation")),
+            "context": _join(context.get("architectural_context"), context.get("dependencies"),
+                             context.get("business_scenarios")),
+        }
+        records.append({k: v for k, v in record.items() if v})
+    return records
+
+
+def discover(paths: List[str], cwe: str, workers: int = 8) -> List[Dict[str, str]]:
+    """
+    遍历输入路径，找出全部SFPP并行读取
+
+    参数:
+        paths: SFPP目录、包含多个SFPP目录的根目录或sfpp.json文件
+        cwe: 写入元数据的CWE编号，目录形式的SFPP以 SFPP-{cwe}-{相对路径} 作为ID
+
+    返回:
+        按ID排序的SFPP记录列表，每项包含id、source、code以及可选的semantic、context
+    """
+    pattern_dirs = []
+    json_files = []
+    for path in paths:
+        if os.path.isfile(path):
+            json_files.append(path)
+            continue
+        root = os.path.abspath(path)
+        for directory, _, files in os.walk(root):
+            if SFPP_CODE_FILE in files:
+                relative = os.path.relpath(directory, os.path.dirname(root) if directory == root else root)
+                pattern_dirs.append((directory, f"SFPP-{cwe}-{relative.replace(os.sep, '-')}"))
+            json_files.extend(os.path.join(directory, f) for f in files if f == "sfpp.json")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_read_pattern_dir, d, pattern_id) for d, pattern_id in pattern_dirs]
+        futures += [executor.submit(read_sfpp_json, f) for f in json_files]
+        records = []
+        for future in futures:
+            result = future.result()
+            records.extend(result if isinstance(result, list) else [result])
+
+    unique = {}
+    for record in records:
+        if not record.get("code"):
+            logger.warning(f"缺少代码，跳过: {record['source']}")
+            continue
+        if record["id"] in unique:
+            logger.warning(f"SFPP ID重复，保留先出现的一个: {record['id']} ({record['source']})")
+            continue
+        unique[record["id"]] = record
+    return [unique[pattern_id] for pattern_id in sorted(unique)]
+
+
+def pattern_vectors(chunk_vectors: List[np.ndarray]) -> np.ndarray:
+    """每个SFPP的分块向量取均值并归一化，作为模式级向量；缺少该维度时为零向量"""
+    dimension = next((len(v[0]) for v in chunk_vectors if v is not None and len(v)), 0)
+    result = np.zeros((len(chunk_vectors), dimension), dtype=np.float32)
+    for i, vectors in enumerate(chunk_vectors):
+        if vectors is not None and len(vectors):
+            mean = np.asarray(vectors, dtype=np.float32).mean(axis=0)
+            result[i] = mean / max(float(np.linalg.norm(mean)), 1e-12)
+    return result
+
+
+def pattern_similarity(vectors: Dict[str, np.ndarray], weights: Dict[str, float]) -> np.ndarray:
+    """
+    模式两两之间的相似度：各维度余弦相似度按维度权重加权，只在两个模式都具备的维度上重新归一化
+    """
+    count = len(next(iter(vectors.values())))
+    total = np.zeros((count, count), dtype=np.float32)
+    weight_sum = np.zeros((count, count), dtype=np.float32)
+    for dim, matrix in vectors.items():
+        present = (np.linalg.norm(matrix, axis=1) > 0).astype(np.float32)
+        both = np.outer(present, present) * weights.get(dim, 0.0)
+        total += both * (matrix @ matrix.T)
+        weight_sum += both
+    return np.where(weight_sum > 0, total / np.where(weight_sum > 0, weight_sum, 1), 0.0)
+
+
+def cluster_duplicates(similarity: np.ndarray, threshold: float) -> List[List[int]]:
+    """
+    贪心聚类：按顺序遍历，与已有代表的相似度不低于阈值则并入该簇，否则成为新簇的代表
+
+    返回:
+        簇列表，每簇第一个下标为代表
+    """
+    clusters: List[List[int]] = []
+    for i in range(len(similarity)):
+        representatives = [cluster[0] for cluster in clusters]
+        if representatives:
+            sims = similarity[i, representatives]
+            best = int(np.argmax(sims))
+            if sims[best] >= threshold:
+                clusters[best].append(i)
+                continue
+        clusters.append([i])
+    return clusters
+
+
+def embed_records(db, records: List[Dict[str, str]]):
+    """
+    所有SFPP的分块一次性批量计算向量
+
+    返回:
+        (维度 -> 每个SFPP的分块向量列表, 维度 -> {分块内容哈希: 向量})
+    """
+    from src.llm.db.vector_db import content_hash
+
+    per_record, by_hash = {}, {}
+    for dim in DIMENSIONS:
+        owners, chunks = [], []
+        for i, record in enumerate(records):
+            if record.get(dim):
+                record_chunks = db.build_text_chunks(record[dim]) if dim == 'semantic' \
+                    else db.build_code_chunks(record[dim])
+                owners.extend([i] * len(record_chunks))
+                chunks.extend(record_chunks)
+        if not chunks:
+            continue
+        vectors = [None] * len(chunks)
+        for indices, batch_vectors in db.iter_chunk_embeddings(dim, chunks):
+            for index, vector in zip(indices, batch_vectors):
+                vectors[index] = list(map(float, vector))
+        per_record[dim] = [[] for _ in records]
+        by_hash[dim] = {}
+        for owner, chunk, vector in zip(owners, chunks, vectors):
+            per_record[dim][owner].append(vector)
+            by_hash[dim][content_hash(chunk["text"])] = vector
+    return per_record, by_hash
+
+
+def ingest(db, records: List[Dict[str, str]], cwe: str, threshold: float = 0.95, sync: bool = False,
+           weights: Optional[Dict[str, float]] = None) -> dict:
+    """
+    批量计算向量、折叠近似重复并写入向量库
+
+    参数:
+        db: VectorDB实例
+        records: discover返回的SFPP记录
+        cwe: CWE编号
+        threshold: 近似重复的模式级相似度阈值
+        sync: 是否删除该CWE下不在本次结果中的SFPP分块（包括被折叠的重复项）
+        weights: 维度权重，默认与打分器一致
+
+    返回:
+        汇总信息，包括簇划分
+    """
+    weights = weights or ScoringConfig().dimension_weights
+    start_time = time.time()
+    per_record, by_hash = embed_records(db, records)
+    embed_time = time.time() - start_time
+
+    vectors = {dim: pattern_vectors(chunk_vectors) for dim, chunk_vectors in per_record.items()}
+    clusters = cluster_duplicates(pattern_similarity(vectors, weights), threshold)
+
+    where = {"$and": [{"type": "SFPP"}, {"cwe": str(cwe)}]}
+    collections = {}
+    for dim in DIMENSIONS:
+        members = [cluster for cluster in clusters if records[cluster[0]].get(dim)]
+        docs = [records[cluster[0]][dim] for cluster in members]
+        metadata = [{"type": "SFPP", "cwe": str(cwe), "id": records[cluster[0]]["id"], "duplicates": len(cluster) - 1}
+                    for cluster in members]
+        save = {"code": db.sync_code if sync else db.save_code,
+                "semantic": db.sync_semantic if sync else db.save_semantic,
+                "context": db.sync_context if sync else db.save_context}[dim]
+        kwargs = {"chunk_embeddings": by_hash.get(dim)}
+        if sync:
+            kwargs["where"] = where
+        stats = save(docs, metadata, **kwargs)
+        stats.pop("ids")
+        collections[dim] = {"patterns": len(docs), **stats}
+
+    return {
+        "discovered": len(records),
+        "stored": len(clusters),
+        "collapsed": len(records) - len(clusters),
+        "threshold": threshold,
+        "collections": collections,
+        "embed_time": round(embed_time, 2),
+        "elapsed": round(time.time() - start_time, 2),
+        "clusters": [[records[i]["id"] for i in cluster] for cluster in clusters if len(cluster) > 1],
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='SFPP模式库批量入库，折叠近似重复的模式')
+    parser.add_argument('paths', nargs='+', help='SFPP目录、包含ret*子目录的根目录或sfpp.json文件')
+    parser.add_argument('--cwe', required=True, help='模式所属的CWE编号')
+    parser.add_argument('--db', default='./chromadb', help='SFPP向量库目录')
+    parser.add_argument('--model-path', default='microsoft/codebert-base', help='代码嵌入模型路径')
+    parser.add_argument('--storage-version', type=int, default=1, help='向量库存储格式版本')
+    parser.add_argument('--threshold', type=float, default=0.95, help='近似重复的相似度阈值')
+    parser.add_argument('--sync', action='store_true', help='删除该CWE下不在本次入库结果中的SFPP')
+    parser.add_argument('--read-workers', type=int, default=8, help='并行读取SFPP文件的线程数')
+    parser.add_argument('--embed-workers', type=int, default=0, help='计算代码向量的进程数，0表示在当前进程计算')
+    parser.add_argument('--threads-per-worker', type=int, default=1, help='每个嵌入进程的PyTorch线程数')
+    parser.add_argument('--report', help='将汇总与重复簇写入该JSON文件')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    from src.llm.db.vector_db import VectorDB
+
+    start_time = time.time()
+    records = discover(args.paths, args.cwe, args.read_workers)
+    logger.info(f"发现 {len(records)} 个SFPP，读取耗时 {time.time() - start_time:.2f} 秒")
+    if not records:
+        return
+
+    pool = None
+    if args.embed_workers > 0:
+        from src.llm.db.embedding_pool import EmbeddingWorkerPool
+        pool = EmbeddingWorkerPool(args.model_path, args.embed_workers, args.threads_per_worker)
+    try:
+        db = VectorDB(args.model_path, path=args.db, embedding_pool=pool, storage_version=args.storage_version)
+        summary = ingest(db, records, args.cwe, args.threshold, args.sync)
+    finally:
+        if pool is not None:
+            pool.close()
+
+    print(f"\nSFPP模式库入库完成 (CWE-{args.cwe}):")
+    print(f"  发现模式数: {summary['discovered']}")
+    print(f"  入库模式数: {summary['stored']} (折叠近似重复 {summary['collapsed']} 个，阈值 {args.threshold})")
+    for dim, stats in summary["collections"].items():
+        print(f"  {dim}: 模式 {stats['patterns']}，新写入分块 {stats['upserted']}，未变化分块 {stats['unchanged']}"
+              + (f"，删除分块 {stats['deleted']}" if "deleted" in stats else ""))
+    print(f"  向量计算耗时: {summary['embed_time']} 秒，总耗时: {summary['elapsed']} 秒")
+    for cluster in summary["clusters"]:
+        print(f"  重复簇: {cluster[0]} <- {', '.join(cluster[1:])}")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
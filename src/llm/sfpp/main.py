@@ -0,0 +1,133 @@
+"""
+SFPP匹配工具的主程序入口，对整个FlowDroid结果文件执行两阶段SFPP匹配
+
+用法:
+    python -m src.llm.sfpp.main -r experiments/restore_detailed_results.json --cwe 78 \
+        -s /path/to/project/src/main/java --model-path /path/to/codebert -o sfpp_match_result.json
+"""
+
+import argparse
+import json
+import logging
+import time
+
+from src.llm.sfpp.matcher import MatchConfig, SFPPMatcher, load_findings
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("sfpp_main")
+
+
+def parse_arguments():
+    """
+    解析命令行参数
+
+    返回:
+        解析后的参数命名空间
+    """
+    parser = argparse.ArgumentParser(description='基于语义误报模式(SFPP)的静态分析误报识别工具')
+
+    parser.add_argument('--result', '-r', required=True,
+                        help='FlowDroid结果文件（原始输出、按CWE分组结果或评估后的详细结果）')
+    parser.add_argument('--source', '-s', required=True,
+                        help='Java源码根目录，用于提取漏洞所在方法的源码')
+    parser.add_argument('--output', '-o', default='sfpp_match_result.json',
+                        help='匹配结果输出文件')
+    parser.add_argument('--cwe', help='只处理指定CWE的漏洞')
+    parser.add_argument('--code-index', default='.',
+                        help='代码索引目录路径（包含call_graph.json）')
+    parser.add_argument('--code-index-jar',
+                        help='code-index工具的jar包路径')
+    parser.add_argument('--db', default='./chromadb', help='SFPP向量库目录')
+    parser.add_argument('--model-path', default='microsoft/codebert-base', help='代码嵌入模型路径')
+    parser.add_argument('--storage-version', type=int, default=1, help='向量库存储格式版本')
+    parser.add_argument('--model', '-m', help='生成方法语义描述所用的LLM模型，不指定则只使用代码维度')
+    parser.add_argument('--description-cache', default='sfpp_descriptions.sqlite',
+                        help='方法语义描述缓存文件，传空字符串则不使用缓存')
+    parser.add_argument('--reliability', default='sfpp_reliability.sqlite',
+                        help='SFPP可靠性存储文件，不存在时所有SFPP可靠性为1，传空字符串则不使用')
+    parser.add_argument('--threshold', type=float, default=0.85, help='误报判定阈值θ')
+    parser.add_argument('--top-k', type=int, default=4, help='粗筛阶段每个维度使用的查询子块数')
+    parser.add_argument('--no-early-stop', action='store_true',
+                        help='关闭按重要性逐批检索与提前终止，查询全部代码子块')
+    parser.add_argument('--early-stop-similarity', type=float, default=0.9, help='提前终止阈值θ_early')
+    parser.add_argument('--early-stop-coverage', type=float, default=0.7, help='提前终止覆盖度阈值ρ')
+    parser.add_argument('--max-findings', type=int, help='最大处理的漏洞数量，用于测试')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    from src.llm.db.vector_db import VectorDB
+    from src.llm.prunefp.repository import SourceCodeRepository
+
+    findings = load_findings(args.result, args.cwe)
+    if args.max_findings:
+        findings = findings[:args.max_findings]
+    logger.info(f"共 {len(findings)} 个待匹配漏洞")
+
+    llm_client = None
+    if args.model:
+        from src.llm.llm_client import LLMClient
+        llm_client = LLMClient(model=args.model)
+
+    db = VectorDB(args.model_path, path=args.db, storage_version=args.storage_version)
+    config = MatchConfig(threshold=args.threshold, coarse_top_k=args.top_k, early_stop=not args.no_early_stop,
+                         early_stop_similarity=args.early_stop_similarity,
+                         early_stop_coverage=args.early_stop_coverage)
+    description_cache = None
+    if llm_client is not None and args.description_cache:
+        from src.llm.sfpp.description_cache import DescriptionCache
+        description_cache = DescriptionCache(args.description_cache)
+    reliability_store = None
+    if args.reliability:
+        from src.llm.sfpp.reliability import ReliabilityStore
+        reliability_store = ReliabilityStore(args.reliability)
+    matcher = SFPPMatcher(db, llm_client, config, description_cache, reliability_store)
+    repository = SourceCodeRepository(args.source, args.code_index, args.code_index_jar)
+
+    start_time = time.time()
+    results = []
+    for index, finding in enumerate(findings, start=1):
+        code = repository.get_method_source(finding.get('class_name'), finding.get('method_name'),
+                                            finding['signature'])
+        if not code:
+            logger.warning(f"[{index}/{len(findings)}] 未找到方法源码，跳过: {finding['signature']}")
+            results.append({**finding, "error": "source not found"})
+            continue
+        try:
+            match = matcher.match(code, cwe=finding['cwe'], signature=finding['signature'])
+        except Exception as e:
+            logger.error(f"[{index}/{len(findings)}] 匹配失败: {finding['signature']}: {str(e)}")
+            results.append({**finding, "error": str(e)})
+            continue
+        logger.info(f"[{index}/{len(findings)}] {finding['signature']}: "
+                    f"误报={match.is_false_positive}, 置信度={match.confidence:.4f}, 确定性={match.certainty}")
+        results.append({**finding, "match": match.to_dict()})
+
+    elapsed = time.time() - start_time
+    summary = {
+        "total": len(results),
+        "false_positives": sum(1 for r in results if r.get("match", {}).get("is_false_positive")),
+        "errors": sum(1 for r in results if "error" in r),
+        "early_stopped": sum(1 for r in results if r.get("match", {}).get("stats", {}).get("early_stopped")),
+        "skipped_queries": sum(r.get("match", {}).get("stats", {}).get("skipped_queries", 0) for r in results),
+        "elapsed": round(elapsed, 2),
+    }
+    if description_cache is not None:
+        summary["description_cache"] = description_cache.stats()
+        description_cache.close()
+    if reliability_store is not None:
+        reliability_store.close()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"summary": summary, "results": results}, f, indent=2, ensure_ascii=False)
+    logger.info(f"匹配完成: {summary}，结果已保存到 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
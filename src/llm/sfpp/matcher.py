@@ -0,0 +1,413 @@
+"""
+SFPP两阶段匹配引擎，实现SFPP_matching_formal_model.md第6节的匹配流程
+
+1. 预处理：对漏洞所在方法的源码切分子块，（可选）由LLM生成语义描述并切分，描述与其向量可由DescriptionCache复用
+2. 粗筛：用最重要的k个查询子块在semantic/code/context集合上做ANN检索，合并得到候选SFPP
+3. 精细匹配：只对候选SFPP取出其全部子块向量，用分层MaxSim打分器计算相似度、覆盖度与置信度
+4. 决策：与阈值比较得到是否误报及确定性级别
+
+代码维度按第5.2节的重要性顺序逐批计算与检索子块，已查询子块对最佳候选满足
+MaxSim_top-k ≥ θ_early 且 Coverage_top-k ≥ ρ 时提前终止，剩余子块不再计算向量和检索。
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.config.config import system_prompt_code_to_semantic
+from src.llm.sfpp.importance import ImportanceConfig, block_importance, importance_order
+from src.llm.sfpp.scorer import DIMENSIONS, PatternBlocks, ScoringConfig, block_max_sim, score_patterns
+
+logger = logging.getLogger("sfpp_matcher")
+
+
+@dataclass
+class MatchConfig:
+    """匹配参数"""
+    # 粗筛阶段每个维度最多使用的查询子块数k
+    coarse_top_k: int = 4
+    # 粗筛阶段每个查询子块召回的分块数N
+    coarse_results: int = 10
+    # 判定阈值θ
+    threshold: float = 0.85
+    # 置信度边界参数γ
+    certainty_margin: float = 0.1
+    # 返回结果中保留的候选数
+    max_candidates: int = 5
+    # 是否按重要性逐批检索代码子块并提前终止
+    early_stop: bool = True
+    # 提前终止阈值θ_early：已查询子块对最佳候选的加权MaxSim均值
+    early_stop_similarity: float = 0.9
+    # 提前终止覆盖度ρ：已查询子块中MaxSim达到局部阈值的比例
+    early_stop_coverage: float = 0.7
+    scoring: ScoringConfig = field(default_factory=ScoringConfig)
+    importance: ImportanceConfig = field(default_factory=ImportanceConfig)
+
+
+@dataclass
+class MatchResult:
+    """单个漏洞的匹配结果"""
+    is_false_positive: bool
+    confidence: float
+    certainty: str
+    best_sfpp: Optional[str]
+    threshold: float
+    candidates: List[Dict[str, Any]] = field(default_factory=list)
+    key_matches: Dict[str, List[float]] = field(default_factory=dict)
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "is_false_positive": self.is_false_positive,
+            "confidence": self.confidence,
+            "certainty": self.certainty,
+            "best_sfpp": self.best_sfpp,
+            "threshold": self.threshold,
+            "candidates": self.candidates,
+            "key_matches": self.key_matches,
+            "stats": self.stats,
+        }
+
+
+def certainty_level(confidence: float, threshold: float, margin: float) -> str:
+    """按第4.2节计算决策确定性级别"""
+    gap = abs(confidence - threshold)
+    if gap >= margin:
+        return "High"
+    if gap >= margin / 2:
+        return "Medium"
+    return "Low"
+
+
+def _float(value) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), 6)
+
+
+class SFPPMatcher:
+    """
+    SFPP匹配引擎
+
+    用法:
+        matcher = SFPPMatcher(VectorDB(model_path), llm_client=LLMClient())
+        result = matcher.match(code, cwe="78")
+    """
+
+    def __init__(self, vector_db, llm_client=None, config: Optional[MatchConfig] = None, description_cache=None,
+                 reliability_store=None):
+        """
+        参数:
+            vector_db: VectorDB实例，SFPP以metadata {"type": "SFPP", "id": SFPP ID, "cwe": ...}写入各集合
+            llm_client: 用于生成方法语义描述的LLM客户端，为None时跳过语义维度
+            config: 匹配参数
+            description_cache: DescriptionCache实例，缓存方法语义描述及其向量
+            reliability_store: ReliabilityStore实例，提供SFPP的历史可靠性系数
+        """
+        self.db = vector_db
+        self.llm_client = llm_client
+        self.config = config or MatchConfig()
+        self.description_cache = description_cache
+        self.reliability_store = reliability_store
+        # SFPP ID -> {维度: 子块向量矩阵}，批量匹配时在漏洞之间复用
+        self._pattern_cache: Dict[str, Dict[str, np.ndarray]] = {}
+
+    def describe(self, code: str) -> Optional[str]:
+        """调用LLM生成方法源码的客观语义描述"""
+        if self.llm_client is None:
+            return None
+        response = self.llm_client.generate_completion(prompt=code, system_prompt=system_prompt_code_to_semantic)
+        return response['choices'][0]['message']['content']
+
+    def _embed_semantic(self, semantic: str) -> np.ndarray:
+        return np.asarray(self.db.embed_queries('semantic', self.db.build_text_chunks(semantic)), np.float32)
+
+    def semantic_blocks(self, code: str, signature: Optional[str] = None):
+        """
+        生成方法语义描述并计算语义子块向量，配置了缓存时优先复用
+
+        返回:
+            (描述, 语义子块向量矩阵)，未配置LLM时均为None
+        """
+        if self.llm_client is None:
+            return None, None
+        if self.description_cache is None:
+            semantic = self.describe(code)
+            return semantic, self._embed_semantic(semantic) if semantic else None
+
+        key = self.description_cache.key(signature, code, self.llm_client.model)
+        # 向量与嵌入模型及是否归一化有关
+        embedding_model = f"{getattr(self.db, 'text_model', 'semantic')}@v{getattr(self.db, 'storage_version', 1)}"
+        semantic, blocks = self.description_cache.get(key, embedding_model)
+        if semantic is not None and blocks is not None:
+            return semantic, blocks
+        if semantic is None:
+            semantic = self.describe(code)
+        blocks = self._embed_semantic(semantic) if semantic else None
+        if semantic:
+            self.description_cache.put(key, semantic, blocks, embedding_model)
+        return semantic, blocks
+
+    @staticmethod
+    def _where(cwe: Optional[str], extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        conditions = [{"type": "SFPP"}]
+        if cwe is not None:
+            conditions.append({"cwe": str(cwe)})
+        if extra:
+            conditions.append(extra)
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def build_query_blocks(self, code: Optional[str], semantic: Optional[str] = None,
+                           context: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """预处理：切分子块并批量计算查询向量，code为None时不计算代码维度"""
+        blocks = {}
+        if code:
+            blocks['code'] = np.asarray(self.db.embed_queries('code', self.db.build_code_chunks(code)), np.float32)
+        if semantic:
+            blocks['semantic'] = self._embed_semantic(semantic)
+        if context:
+            blocks['context'] = np.asarray(
+                self.db.embed_queries('context', self.db.build_code_chunks(context)), np.float32)
+        return blocks
+
+    def select_coarse_blocks(self, dim: str, blocks: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """选择参与粗筛的查询子块下标，给定子块权重时取最重要的k个"""
+        if weights is None:
+            return np.arange(min(len(blocks), self.config.coarse_top_k))
+        return importance_order(np.asarray(weights))[:self.config.coarse_top_k]
+
+    def _query_candidates(self, dim: str, vectors: np.ndarray, cwe: Optional[str], candidates: List[str]) -> int:
+        """对一批查询向量做ANN检索，把新出现的SFPP ID按顺序追加到candidates，返回查询次数"""
+        result = self.db.get_collection(dim).query(
+            query_embeddings=vectors.tolist(),
+            where=self._where(cwe),
+            n_results=self.config.coarse_results,
+            include=['metadatas'],
+        )
+        seen = set(candidates)
+        for metadatas in result['metadatas']:
+            for metadata in metadatas:
+                sfpp_id = metadata.get('id')
+                if sfpp_id is not None and sfpp_id not in seen:
+                    seen.add(sfpp_id)
+                    candidates.append(sfpp_id)
+        return len(vectors)
+
+    def coarse_candidates(self, query_blocks: Dict[str, np.ndarray], cwe: Optional[str] = None,
+                          block_weights: Optional[Dict[str, np.ndarray]] = None):
+        """
+        粗筛：每个维度最重要的k个查询子块在对应集合上做ANN检索，按SFPP ID合并候选
+
+        返回:
+            (候选SFPP ID列表, 查询次数)
+        """
+        block_weights = block_weights or {}
+        candidates = []
+        queries = 0
+        for dim in DIMENSIONS:
+            if dim not in query_blocks or not len(query_blocks[dim]):
+                continue
+            selected = self.select_coarse_blocks(dim, query_blocks[dim], block_weights.get(dim))
+            queries += self._query_candidates(dim, query_blocks[dim][selected], cwe, candidates)
+        return candidates, queries
+
+    def load_pattern_blocks(self, sfpp_ids: List[str]) -> Dict[str, Dict[str, np.ndarray]]:
+        """取出候选SFPP在各维度上的全部子块向量，按分块序号排列"""
+        missing = [sfpp_id for sfpp_id in sfpp_ids if sfpp_id not in self._pattern_cache]
+        if missing:
+            loaded = {sfpp_id: {} for sfpp_id in missing}
+            for dim in DIMENSIONS:
+                data = self.db.get_collection(dim).get(where=self._where(None, {"id": {"$in": missing}}),
+                                                       include=['embeddings', 'metadatas'])
+                grouped: Dict[str, list] = {}
+                for embedding, metadata in zip(data['embeddings'], data['metadatas']):
+                    grouped.setdefault(metadata['id'], []).append((max(int(metadata.get('chunk', 0)), 0), embedding))
+                for sfpp_id, items in grouped.items():
+                    items.sort(key=lambda item: item[0])
+                    loaded[sfpp_id][dim] = np.asarray([embedding for _, embedding in items], dtype=np.float32)
+            self._pattern_cache.update(loaded)
+        return {sfpp_id: self._pattern_cache[sfpp_id] for sfpp_id in sfpp_ids}
+
+    def reliability(self, sfpp_ids: List[str]) -> Optional[np.ndarray]:
+        """SFPP的历史可靠性系数，未配置可靠性存储时均为1"""
+        if self.reliability_store is None:
+            return None
+        return self.reliability_store.get_many(sfpp_ids)
+
+    def _pack(self, sfpp_ids: List[str], dim: str, dimension: int) -> PatternBlocks:
+        patterns = self.load_pattern_blocks(sfpp_ids)
+        return PatternBlocks.pack([patterns[sfpp_id].get(dim) for sfpp_id in sfpp_ids], dimension)
+
+    def rerank(self, query_blocks: Dict[str, np.ndarray], sfpp_ids: List[str],
+               block_weights: Optional[Dict[str, np.ndarray]] = None,
+               block_positions: Optional[Dict[str, np.ndarray]] = None,
+               reliability: Optional[np.ndarray] = None):
+        """精细匹配：对候选SFPP做分层相似度打分，reliability为None时从reliability()读取"""
+        packed = {dim: self._pack(sfpp_ids, dim, query_blocks[dim].shape[1])
+                  for dim in DIMENSIONS if dim in query_blocks and len(query_blocks[dim])}
+        if reliability is None:
+            reliability = self.reliability(sfpp_ids)
+        return score_patterns(query_blocks, packed, block_weights, reliability, self.config.scoring, block_positions)
+
+    def is_decisive(self, vectors: np.ndarray, weights: np.ndarray, sfpp_ids: List[str]) -> bool:
+        """
+        第5.2节的提前终止条件：已查询的代码子块对某个候选同时满足
+        加权MaxSim均值 ≥ θ_early 且 MaxSim达到局部阈值的子块比例 ≥ ρ
+        """
+        if not sfpp_ids:
+            return False
+        sims = np.nan_to_num(block_max_sim(vectors, self._pack(sfpp_ids, 'code', vectors.shape[1])), nan=0.0)
+        similarity = sims @ weights / max(float(weights.sum()), 1e-12)
+        coverage = (sims >= self.config.scoring.local_threshold).mean(axis=1)
+        decisive = (similarity >= self.config.early_stop_similarity) & (coverage >= self.config.early_stop_coverage)
+        return bool(decisive.any())
+
+    def match(self, code: str, cwe: Optional[str] = None, semantic: Optional[str] = None,
+              context: Optional[str] = None, project_context_factor: float = 1.0,
+              signature: Optional[str] = None) -> MatchResult:
+        """
+        对单个漏洞执行两阶段匹配
+
+        参数:
+            code: 漏洞所在方法的源码
+            cwe: 只匹配该CWE的SFPP
+            semantic: 方法的语义描述，为None时由LLM生成（未配置LLM则跳过语义维度）
+            context: 上下文代码
+            project_context_factor: 项目上下文调整因子
+            signature: 方法的soot签名，作为语义描述缓存键的一部分
+
+        返回:
+            MatchResult
+        """
+        semantic_blocks = None
+        if semantic is None:
+            semantic, semantic_blocks = self.semantic_blocks(code, signature)
+        code_chunks = self.db.build_code_chunks(code)
+        importance = block_importance(code_chunks, self.config.importance)
+        query_blocks = self.build_query_blocks(code if not self.config.early_stop else None,
+                                               semantic if semantic_blocks is None else None, context)
+        if semantic_blocks is not None:
+            query_blocks['semantic'] = semantic_blocks
+        if not self.config.early_stop:
+            return self.match_blocks(query_blocks, cwe, project_context_factor, {'code': importance})
+
+        candidates, queries = self.coarse_candidates(query_blocks, cwe)
+        order = importance_order(importance)
+        batch_size = max(self.config.coarse_top_k, 1)
+        processed = 0
+        vectors = []
+        while processed < len(order):
+            selected = order[processed:processed + batch_size]
+            embedded = np.asarray(self.db.embed_queries('code', [code_chunks[i] for i in selected]), np.float32)
+            queries += self._query_candidates('code', embedded, cwe, candidates)
+            vectors.append(embedded)
+            processed += len(selected)
+            if processed < len(order) and self.is_decisive(np.concatenate(vectors), importance[order[:processed]],
+                                                           candidates):
+                break
+
+        used = order[:processed]
+        if vectors:
+            query_blocks['code'] = np.concatenate(vectors)
+        # key_matches中代码维度的MaxSim按code_block_order（原文子块下标）排列
+        stats = {"code_blocks": len(order), "skipped_queries": len(order) - processed,
+                 "early_stopped": processed < len(order), "code_block_order": used.tolist()}
+        return self.match_blocks(query_blocks, cwe, project_context_factor, {'code': importance[used]},
+                                 {'code': (used + 1) / len(order)}, candidates=(candidates, queries), stats=stats)
+
+    def match_blocks(self, query_blocks: Dict[str, np.ndarray], cwe: Optional[str] = None,
+                     project_context_factor: float = 1.0,
+                     block_weights: Optional[Dict[str, np.ndarray]] = None,
+                     block_positions: Optional[Dict[str, np.ndarray]] = None,
+                     candidates=None, stats: Optional[Dict[str, Any]] = None) -> MatchResult:
+        """
+        对已计算好的查询子块向量执行粗筛、精排与决策
+
+        参数:
+            block_weights: 维度 -> 子块重要性权重，同时决定粗筛使用哪k个子块
+            block_positions: 维度 -> 子块在原文中的相对位置，子块不按原顺序排列时传入
+            candidates: 已完成的粗筛结果(候选SFPP ID列表, 查询次数)，为None时在此执行粗筛
+            stats: 需要合并到结果中的额外统计
+        """
+        threshold = self.config.threshold
+        candidates, queries = candidates or self.coarse_candidates(query_blocks, cwe, block_weights)
+        stats = {"query_blocks": sum(len(b) for b in query_blocks.values()), "coarse_queries": queries,
+                 "candidates": len(candidates), **(stats or {})}
+        if not candidates:
+            return MatchResult(False, 0.0, certainty_level(0.0, threshold, self.config.certainty_margin), None,
+                               threshold, stats=stats)
+
+        reliability = self.reliability(candidates)
+        scores = self.rerank(query_blocks, candidates, block_weights, block_positions, reliability)
+        adjusted = scores.confidence * project_context_factor
+        order = np.argsort(-adjusted)
+        best = int(order[0])
+        confidence = float(adjusted[best])
+        ranked = []
+        for index in order[:self.config.max_candidates]:
+            ranked.append({
+                "sfpp_id": candidates[index],
+                "confidence": _float(adjusted[index]),
+                "similarity": _float(scores.similarity[index]),
+                "coverage": _float(scores.coverage[index]),
+                "reliability": _float(reliability[index]) if reliability is not None else 1.0,
+                "sparse_score": _float(scores.sparse_score[index]),
+                "dimensions": {dim: _float(values[index]) for dim, values in scores.dimension_similarity.items()},
+            })
+        key_matches = {dim: [_float(v) for v in values[best]] for dim, values in scores.max_sim.items()}
+        return MatchResult(
+            is_false_positive=confidence >= threshold,
+            confidence=round(confidence, 6),
+            certainty=certainty_level(confidence, threshold, self.config.certainty_margin),
+            best_sfpp=candidates[best],
+            threshold=threshold,
+            candidates=ranked,
+            key_matches=key_matches,
+            stats=stats,
+        )
+
+
+def load_findings(path: str, cwe: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    读取FlowDroid结果文件中的漏洞，支持三种格式：
+    1. 污点分析原始输出：[{"ruleCwe", "result": [{"path": [...]}]}]
+    2. 按CWE分组的转换结果：{"78": [{"function", "class_name", "method_name", ...}]}
+    3. 评估后的详细结果：{"78": [{"result_type", "flowdroid_item": {"soot_signature", ...}}]}
+
+    返回:
+        去重后的漏洞列表，每项包含cwe、signature、class_name、method_name，详细结果还包含result_type
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    findings = []
+    if isinstance(data, list):
+        for rule in data:
+            for item in rule.get('result', []):
+                if not item.get('path'):
+                    continue
+                sink_node = item['path'][-1]
+                findings.append({"cwe": str(rule.get('ruleCwe')), "signature": sink_node['function'],
+                                 "class_name": sink_node.get('javaClass')})
+    else:
+        for rule_cwe, items in data.items():
+            for item in items:
+                if 'flowdroid_item' in item:
+                    flowdroid_item = item['flowdroid_item']
+                    findings.append({"cwe": str(rule_cwe), "signature": flowdroid_item['soot_signature'],
+                                     "class_name": flowdroid_item.get('class_name'),
+                                     "method_name": flowdroid_item.get('method_name'),
+                                     "result_type": item.get('result_type')})
+                elif 'function' in item:
+                    findings.append({"cwe": str(rule_cwe), "signature": item['function'],
+                                     "class_name": item.get('class_name'), "method_name": item.get('method_name')})
+
+    unique = []
+    seen = set()
+    for finding in findings:
+        key = (finding['cwe'], finding['signature'])
+        if (cwe is None or finding['cwe'] == str(cwe)) and key not in seen:
+            seen.add(key)
+            unique.append(finding)
+    return unique
@@ -0,0 +1,248 @@
+"""
+SFPP可靠性系数的持久化存储，实现SFPP_matching_formal_model.md第6.5节的反馈学习
+
+每条反馈只需一次O(1)的事务性更新:
+    Reliability_new = (1-α)·Reliability_old + α·Feedback
+同时累计反馈次数与确认/否定计数，不需要像weight_optimization.py那样对全部结果重新计算。
+匹配引擎在打分时读取可靠性系数，没有记录的SFPP视为1。
+
+用法:
+    python -m src.llm.sfpp.reliability apply -r sfpp_match_result.json --store sfpp_reliability.sqlite
+    python -m src.llm.sfpp.reliability feedback --sfpp SFPP-78-ret0 --label TP
+    python -m src.llm.sfpp.reliability show
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("sfpp_reliability")
+
+DEFAULT_RELIABILITY = 1.0
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS reliability (
+        sfpp_id TEXT PRIMARY KEY,
+        reliability REAL NOT NULL,
+        feedback_count INTEGER NOT NULL,
+        confirmed INTEGER NOT NULL,
+        rejected INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS feedback (
+        sfpp_id TEXT NOT NULL,
+        finding TEXT NOT NULL,
+        feedback REAL NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (sfpp_id, finding)
+    )
+    """,
+]
+
+
+class ReliabilityStore:
+    """
+    基于SQLite的SFPP可靠性表
+
+    用法:
+        store = ReliabilityStore("sfpp_reliability.sqlite", alpha=0.1)
+        store.record_feedback("SFPP-78-ret0", 0.0, finding="<A: void f()>")
+        store.get_many(["SFPP-78-ret0", "SFPP-78-ret1"])
+    """
+
+    def __init__(self, path: str = "sfpp_reliability.sqlite", alpha: float = 0.1,
+                 default: float = DEFAULT_RELIABILITY):
+        """
+        参数:
+            path: 存储文件路径
+            alpha: 学习率α
+            default: 没有反馈记录的SFPP的可靠性
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError(f"学习率α必须在(0, 1]之间: {alpha}")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.alpha = alpha
+        self.default = default
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    def record_feedback(self, sfpp_id: str, feedback: float, finding: Optional[str] = None) -> Optional[float]:
+        """
+        记录一条反馈并增量更新可靠性
+
+        同一漏洞的标注被修正时视为替换原来的反馈，而不是新增一条：反馈次数不变，确认/否定计数从旧标注
+        移到新标注，可靠性按 Reliability + α·(Feedback_new - Feedback_old) 修正。若旧反馈是该SFPP最近的
+        一次更新，结果与当初直接记录新反馈完全一致；之后还有其他反馈时，旧反馈的影响已按(1-α)衰减，
+        修正量会略大于精确值，结果截断到[0, 1]。
+
+        参数:
+            sfpp_id: 判定所依据的SFPP
+            feedback: 反馈分数，1表示判定为误报正确，0表示错误
+            finding: 漏洞标识（如soot签名），给出时同一漏洞对同一SFPP的相同反馈只计一次，不同反馈视为修正
+
+        返回:
+            更新后的可靠性；重复反馈被忽略时返回None
+        """
+        feedback = min(max(float(feedback), 0.0), 1.0)
+        now = time.time()
+        confirmed, rejected = int(feedback >= 0.5), int(feedback < 0.5)
+        with self._lock, self._conn:
+            previous = None
+            if finding is not None:
+                row = self._conn.execute("SELECT feedback FROM feedback WHERE sfpp_id=? AND finding=?",
+                                         (sfpp_id, finding)).fetchone()
+                if row is not None and row[0] == feedback:
+                    return None
+                previous = row[0] if row is not None else None
+                self._conn.execute("INSERT OR REPLACE INTO feedback (sfpp_id, finding, feedback, created_at) "
+                                   "VALUES (?, ?, ?, ?)", (sfpp_id, finding, feedback, now))
+            exists = self._conn.execute("SELECT 1 FROM reliability WHERE sfpp_id=?", (sfpp_id,)).fetchone()
+            if previous is not None and exists:
+                # 修正标注：撤销旧标注的计数，不增加反馈次数
+                self._conn.execute(
+                    "UPDATE reliability SET reliability = MIN(1.0, MAX(0.0, reliability + ? * (? - ?))), "
+                    "confirmed = confirmed + ?, rejected = rejected + ?, updated_at = ? WHERE sfpp_id = ?",
+                    (self.alpha, feedback, previous, confirmed - int(previous >= 0.5), rejected - int(previous < 0.5),
+                     now, sfpp_id))
+            else:
+                self._conn.execute(
+                    "INSERT INTO reliability (sfpp_id, reliability, feedback_count, confirmed, rejected, updated_at) "
+                    "VALUES (?, ?, 1, ?, ?, ?) "
+                    "ON CONFLICT(sfpp_id) DO UPDATE SET "
+                    "reliability = (1 - ?) * reliability + ? * ?, feedback_count = feedback_count + 1, "
+                    "confirmed = confirmed + ?, rejected = rejected + ?, updated_at = ?",
+                    (sfpp_id, (1 - self.alpha) * self.default + self.alpha * feedback, confirmed, rejected, now,
+                     self.alpha, self.alpha, feedback, confirmed, rejected, now))
+            return self._conn.execute("SELECT reliability FROM reliability WHERE sfpp_id=?",
+                                      (sfpp_id,)).fetchone()[0]
+
+    def get(self, sfpp_id: str) -> float:
+        return float(self.get_many([sfpp_id])[0])
+
+    def get_many(self, sfpp_ids: List[str]) -> np.ndarray:
+        """按给定顺序返回可靠性数组，没有记录的取默认值"""
+        values = {}
+        with self._lock:
+            for start in range(0, len(sfpp_ids), 500):
+                part = sfpp_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT sfpp_id, reliability FROM reliability WHERE sfpp_id IN ({','.join('?' * len(part))})",
+                    part).fetchall()
+                values.update(rows)
+        return np.array([values.get(sfpp_id, self.default) for sfpp_id in sfpp_ids], dtype=np.float32)
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT sfpp_id, reliability, feedback_count, confirmed, rejected, updated_at "
+                                      "FROM reliability ORDER BY sfpp_id").fetchall()
+        keys = ("sfpp_id", "reliability", "feedback_count", "confirmed", "rejected", "updated_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def verdict_feedback(result_type: str) -> Optional[float]:
+    """
+    由漏洞的真实标注得到反馈分数：SFPP把漏洞判为误报，标注为误报(FP/TN)时为1，标注为真实漏洞(TP/FN)时为0
+    """
+    label = (result_type or "").split()[0].upper() if result_type else ""
+    if label in ("FP", "TN"):
+        return 1.0
+    if label in ("TP", "FN"):
+        return 0.0
+    return None
+
+
+def apply_match_results(store: ReliabilityStore, path: str) -> Dict[str, int]:
+    """
+    用sfpp.main输出的匹配结果中带标注的漏洞批量更新可靠性，只有被判为误报的漏洞会反馈给其最佳SFPP
+
+    返回:
+        {"applied": 已更新数, "duplicates": 重复反馈数, "skipped": 无标注或未判为误报的数量}
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    stats = {"applied": 0, "duplicates": 0, "skipped": 0}
+    for result in data.get("results", []):
+        match = result.get("match") or {}
+        feedback = verdict_feedback(result.get("result_type"))
+        if not match.get("is_false_positive") or not match.get("best_sfpp") or feedback is None:
+            stats["skipped"] += 1
+            continue
+        finding = f"{result.get('cwe')}|{result['signature']}"
+        if store.record_feedback(match["best_sfpp"], feedback, finding) is None:
+            stats["duplicates"] += 1
+        else:
+            stats["applied"] += 1
+    return stats
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='SFPP可靠性系数的反馈更新')
+    parser.add_argument('--store', default='sfpp_reliability.sqlite', help='可靠性存储文件')
+    parser.add_argument('--alpha', type=float, default=0.1, help='学习率α')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    apply_parser = subparsers.add_parser('apply', help='用带标注的匹配结果文件批量更新')
+    apply_parser.add_argument('--result', '-r', required=True, help='sfpp.main输出的匹配结果文件')
+
+    feedback_parser = subparsers.add_parser('feedback', help='记录单条反馈')
+    feedback_parser.add_argument('--sfpp', required=True, help='SFPP ID')
+    feedback_group = feedback_parser.add_mutually_exclusive_group(required=True)
+    feedback_group.add_argument('--label', choices=['TP', 'FP', 'TN', 'FN'], help='被该SFPP判为误报的漏洞的真实标注')
+    feedback_group.add_argument('--score', type=float, help='直接给出0~1的反馈分数')
+    feedback_parser.add_argument('--finding', help='漏洞标识，用于去除重复反馈')
+
+    subparsers.add_parser('show', help='输出全部SFPP的可靠性')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    with ReliabilityStore(args.store, args.alpha) as store:
+        if args.command == 'apply':
+            stats = apply_match_results(store, args.result)
+            logger.info(f"反馈更新完成: {stats}")
+        elif args.command == 'feedback':
+            score = args.score if args.score is not None else verdict_feedback(args.label)
+            value = store.record_feedback(args.sfpp, score, args.finding)
+            if value is None:
+                logger.info(f"重复反馈已忽略: {args.sfpp}")
+            else:
+                logger.info(f"{args.sfpp} 可靠性更新为 {value:.4f}")
+        else:
+            for row in store.all():
+                print(f"{row['sfpp_id']}\t{row['reliability']:.4f}\t反馈 {row['feedback_count']}"
+                      f"（确认 {row['confirmed']}，否定 {row['rejected']}）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+SFPP分层相似度打分器，实现SFPP_matching_formal_model.md第2、3节的计算
+
+对一个待判定漏洞D的查询子块矩阵与一批SFPP的子块矩阵，一次性向量化计算：
+局部余弦相似度、位置衰减加权 exp(-λ|i/q - j/m|)、逐块MaxSim、加权块组相似度、
+三维度加权总相似度、覆盖度、置信度以及稀疏匹配分数，不在Python中循环子块或SFPP。
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+DIMENSIONS = ('semantic', 'code', 'context')
+
+
+@dataclass
+class ScoringConfig:
+    """打分参数，默认值对应形式化模型中的推荐取值"""
+    # 维度权重 w_s, w_f, w_c；某个维度缺失时在剩余维度上重新归一化
+    dimension_weights: Dict[str, float] = field(
+        default_factory=lambda: {'semantic': 0.4, 'code': 0.4, 'context': 0.2})
+    # 位置衰减系数λ，0表示不考虑相对位置
+    position_decay: float = 1.0
+    # 局部匹配阈值θ_local，用于覆盖度
+    local_threshold: float = 0.8
+    # 覆盖度奖励系数δ
+    coverage_bonus: float = 0.3
+    # 稀疏匹配中最大匹配的权重β
+    sparse_beta: float = 0.7
+
+
+@dataclass
+class PatternBlocks:
+    """
+    一批SFPP在某一维度上的子块，填充成(SFPP数 x 最大块数 x 维度)的张量
+    """
+    vectors: np.ndarray
+    mask: np.ndarray
+    lengths: np.ndarray
+
+    @classmethod
+    def pack(cls, blocks: Sequence[Optional[np.ndarray]], dimension: Optional[int] = None) -> 'PatternBlocks':
+        """
+        参数:
+            blocks: 每个SFPP的子块向量矩阵(m_p x d)，没有该维度时为None或空矩阵
+            dimension: 向量维度，所有SFPP都缺失该维度时必须提供
+        """
+        arrays = [np.asarray(b, dtype=np.float32).reshape(-1, np.shape(b)[-1]) if b is not None and len(b) else None
+                  for b in blocks]
+        if dimension is None:
+            dimension = next(a.shape[1] for a in arrays if a is not None)
+        lengths = np.array([0 if a is None else a.shape[0] for a in arrays], dtype=np.int64)
+        max_blocks = max(int(lengths.max()) if len(lengths) else 0, 1)
+        vectors = np.zeros((len(arrays), max_blocks, dimension), dtype=np.float32)
+        for p, a in enumerate(arrays):
+            if a is not None:
+                vectors[p, :a.shape[0]] = a
+        vectors = _normalize(vectors)
+        mask = np.arange(max_blocks)[None, :] < lengths[:, None]
+        return cls(vectors, mask, lengths)
+
+
+@dataclass
+class ScoreResult:
+    """各SFPP的打分结果，数组第一维对应SFPP"""
+    max_sim: Dict[str, np.ndarray]
+    dimension_similarity: Dict[str, np.ndarray]
+    dimension_coverage: Dict[str, np.ndarray]
+    similarity: np.ndarray
+    coverage: np.ndarray
+    confidence: np.ndarray
+    sparse_score: np.ndarray
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+def position_weights(query_blocks: int, pattern_lengths: np.ndarray, max_blocks: int, decay: float,
+                     query_positions: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    计算位置相对性加权因子 w_position(d_i, s_j) = exp(-λ|i/q - j/m|)，i、j从1开始
+
+    参数:
+        query_positions: 查询子块的相对位置i/q，只使用部分子块（如按重要性提前终止）时传入，默认按顺序排列
+
+    返回:
+        (SFPP数 x q x 最大块数) 的权重张量
+    """
+    if query_positions is None:
+        query_positions = np.arange(1, query_blocks + 1, dtype=np.float32) / query_blocks
+    i = np.asarray(query_positions, dtype=np.float32)[None, :, None]
+    m = np.maximum(pattern_lengths, 1).astype(np.float32)[:, None, None]
+    j = np.arange(1, max_blocks + 1, dtype=np.float32)[None, None, :] / m
+    return np.exp(-decay * np.abs(i - j))
+
+
+def block_max_sim(query: np.ndarray, patterns: PatternBlocks, decay: float = 0.0,
+                  query_positions: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    计算每个查询子块对每个SFPP的MaxSim
+
+    参数:
+        query: 查询子块矩阵(q x d)
+        patterns: 打包后的SFPP子块
+        decay: 位置衰减系数λ
+        query_positions: 查询子块的相对位置i/q，默认按顺序排列
+
+    返回:
+        (SFPP数 x q) 的MaxSim矩阵，SFPP缺少该维度时为NaN
+    """
+    query = _normalize(np.asarray(query, dtype=np.float32).reshape(-1, patterns.vectors.shape[-1]))
+    count, max_blocks, dim = patterns.vectors.shape
+    # 一次矩阵乘法得到所有(查询子块, SFPP子块)对的余弦相似度
+    local = (patterns.vectors.reshape(-1, dim) @ query.T).reshape(count, max_blocks, -1).transpose(0, 2, 1)
+    if decay:
+        local = local * position_weights(query.shape[0], patterns.lengths, max_blocks, decay, query_positions)
+    local = np.where(patterns.mask[:, None, :], local, -np.inf)
+    max_sim = local.max(axis=2)
+    max_sim[patterns.lengths == 0] = np.nan
+    return max_sim
+
+
+def score_patterns(query_blocks: Dict[str, np.ndarray], pattern_blocks: Dict[str, PatternBlocks],
+                   block_weights: Optional[Dict[str, np.ndarray]] = None,
+                   reliability: Optional[np.ndarray] = None,
+                   config: Optional[ScoringConfig] = None,
+                   block_positions: Optional[Dict[str, np.ndarray]] = None) -> ScoreResult:
+    """
+    对一批SFPP计算分层相似度、覆盖度与置信度
+
+    参数:
+        query_blocks: 维度 -> 查询子块向量矩阵(q_dim x d)
+        pattern_blocks: 维度 -> 打包后的SFPP子块，所有维度的SFPP顺序必须一致
+        block_weights: 维度 -> 查询子块权重w_i(q_dim,)，默认均为1
+        reliability: 每个SFPP的历史可靠性系数(SFPP数,)，默认均为1
+        config: 打分参数
+        block_positions: 维度 -> 查询子块的相对位置i/q，只传入部分子块时使用
+
+    返回:
+        ScoreResult
+    """
+    config = config or ScoringConfig()
+    block_weights = block_weights or {}
+    block_positions = block_positions or {}
+    dims = [d for d in DIMENSIONS if d in query_blocks and d in pattern_blocks and len(query_blocks[d])]
+    if not dims:
+        raise ValueError("查询与SFPP没有共同的维度")
+    count = len(pattern_blocks[dims[0]].lengths)
+
+    max_sim, dimension_similarity, dimension_coverage = {}, {}, {}
+    weight_sum = np.zeros(count, dtype=np.float32)
+    similarity = np.zeros(count, dtype=np.float32)
+    coverage = np.zeros(count, dtype=np.float32)
+    best_local = np.full(count, -np.inf, dtype=np.float32)
+    for dim in dims:
+        sims = block_max_sim(query_blocks[dim], pattern_blocks[dim], config.position_decay,
+                             block_positions.get(dim))
+        weights = np.asarray(block_weights.get(dim, np.ones(sims.shape[1])), dtype=np.float32)
+        present = ~np.isnan(sims[:, 0])
+        filled = np.nan_to_num(sims, nan=0.0)
+        dim_similarity = filled @ weights / max(float(weights.sum()), 1e-12)
+        dim_coverage = (filled >= config.local_threshold).mean(axis=1).astype(np.float32)
+
+        max_sim[dim] = sims
+        dimension_similarity[dim] = np.where(present, dim_similarity, np.nan)
+        dimension_coverage[dim] = np.where(present, dim_coverage, np.nan)
+        # 维度权重只在该SFPP具备的维度上重新归一化
+        w = config.dimension_weights.get(dim, 0.0) * present
+        weight_sum += w
+        similarity += w * dim_similarity
+        coverage += w * dim_coverage
+        best_local = np.where(present, np.maximum(best_local, filled.max(axis=1)), best_local)
+
+    valid = weight_sum > 0
+    similarity = np.where(valid, similarity / np.where(valid, weight_sum, 1), 0.0)
+    coverage = np.where(valid, coverage / np.where(valid, weight_sum, 1), 0.0)
+    reliability = np.ones(count, dtype=np.float32) if reliability is None else np.asarray(reliability, np.float32)
+    confidence = similarity * (1 + config.coverage_bonus * coverage) * reliability
+    best_local = np.where(np.isfinite(best_local), best_local, 0.0)
+    sparse_score = config.sparse_beta * best_local + (1 - config.sparse_beta) * coverage
+    return ScoreResult(max_sim, dimension_similarity, dimension_coverage, similarity.astype(np.float32),
+                       coverage.astype(np.float32), confidence.astype(np.float32), sparse_score.astype(np.float32))
@@ -0,0 +1,82 @@
+import time
+import unittest
+
+from src.llm.db.batching import build_length_buckets, padding_ratio, padded_tokens, shard_by_tokens
+
+MODEL_PATH = '/home/ran/Documents/work/graduate/llm-agent/models/codebert'
+
+
+class TestLengthBuckets(unittest.TestCase):
+    def test_buckets_keep_every_input_once(self):
+        lengths = [512, 20, 37, 20, 300, 5, 511]
+        buckets = build_length_buckets(lengths, max_batch_tokens=1024)
+        flat = sorted(i for bucket in buckets for i in bucket)
+        self.assertEqual(flat, list(range(len(lengths))))
+        for bucket in buckets:
+            padded = len(bucket) * max(lengths[i] for i in bucket)
+            self.assertTrue(len(bucket) == 1 or padded <= 1024)
+
+    def test_oversized_input_gets_own_bucket(self):
+        buckets = build_length_buckets([4096, 10, 10], max_batch_tokens=512)
+        self.assertIn([0], buckets)
+
+    def test_max_batch_size(self):
+        buckets = build_length_buckets([10] * 10, max_batch_tokens=10_000, max_batch_size=4)
+        self.assertEqual([len(b) for b in buckets], [4, 4, 2])
+
+    def test_padding_ratio_mixed_lengths(self):
+        # 一个512的窗口混合63个20token的小块
+        lengths = [512] + [20] * 63
+        naive = [list(range(len(lengths)))]
+        bucketed = build_length_buckets(lengths, max_batch_tokens=8192)
+        print(f"padding ratio: naive={padding_ratio(lengths, naive):.3f}, "
+              f"bucketed={padding_ratio(lengths, bucketed):.3f}, "
+              f"tokens: naive={padded_tokens(lengths, naive)}, bucketed={padded_tokens(lengths, bucketed)}")
+        self.assertGreater(padding_ratio(lengths, naive), 0.9)
+        self.assertAlmostEqual(padding_ratio(lengths, bucketed), 0.0)
+
+    def test_shard_by_tokens(self):
+        lengths = [512, 20, 300, 20, 600, 5]
+        shards = shard_by_tokens(lengths, max_shard_tokens=600)
+        self.assertEqual(sorted(i for shard in shards for i in shard), list(range(len(lengths))))
+        # 最长的输入最先调度
+        self.assertEqual(shards[0], [4])
+        for shard in shards:
+            self.assertTrue(len(shard) == 1 or sum(lengths[i] for i in shard) <= 600)
+
+
+class BenchmarkEmbeddingBatching(unittest.TestCase):
+    """需要本地CodeBERT模型，对比一次性填充与分桶推理的吞吐量"""
+
+    def setUp(self):
+        from src.llm.db.vector_db import CustomEmbeddingFunction
+        self.embedding_function = CustomEmbeddingFunction(MODEL_PATH)
+
+    def test_throughput(self):
+        import torch
+
+        ef = self.embedding_function
+        long_text = "public void run() { int value = compute(input); log(value); }\n" * 60
+        short_text = "return a + b;"
+        texts = [long_text] + [short_text] * 63
+
+        # 旧实现：整个输入填充到最长序列
+        start = time.time()
+        inputs = ef.tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
+        naive = ef._forward(inputs)
+        naive_time = time.time() - start
+
+        start = time.time()
+        bucketed = ef(texts)
+        bucketed_time = time.time() - start
+
+        lengths = [len(ids) for ids in ef.tokenizer(texts, truncation=True)["input_ids"]]
+        print(f"naive: {naive_time:.3f}s ({len(texts) / naive_time:.1f} texts/s), "
+              f"padding ratio {padding_ratio(lengths, [list(range(len(texts)))]):.3f}")
+        print(f"bucketed: {bucketed_time:.3f}s ({len(texts) / bucketed_time:.1f} texts/s), "
+              f"padding ratio {padding_ratio(lengths, build_length_buckets(lengths, ef.max_batch_tokens)):.3f}")
+        self.assertTrue(torch.allclose(torch.tensor(naive), torch.tensor(bucketed), atol=1e-4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import unittest
+
+from src.llm.db.embedding_pool import THREAD_ENV_VARS, EmbeddingWorkerPool
+
+
+class StubEmbeddingFunction:
+    """不加载模型的嵌入函数：向量为(输入长度, 首个token, 工作进程中的线程数环境变量, 进程号)"""
+
+    def __init__(self, model_path, max_batch_tokens=None):
+        self.model_path = model_path
+
+    def embed_token_ids(self, token_ids):
+        threads = [float(os.environ[name]) for name in THREAD_ENV_VARS]
+        return [[float(len(ids)), float(ids[0])] + threads + [float(os.getpid())] for ids in token_ids]
+
+
+class TestEmbeddingWorkerPool(unittest.TestCase):
+    def test_embed_in_input_order(self):
+        token_ids = [[i] * length for i, length in enumerate([5, 40, 3, 40, 17, 1, 29, 8])]
+        with EmbeddingWorkerPool("stub-model", num_workers=2, threads_per_worker=3, max_shard_tokens=48,
+                                 embedding_factory=StubEmbeddingFunction) as pool:
+            shards = list(pool.iter_embed(token_ids))
+            vectors = pool.embed(token_ids)
+
+        # 输入被切分为多个分片，每个分片的向量与其下标一一对应
+        self.assertGreater(len(shards), 1)
+        self.assertEqual(sorted(i for indices, _ in shards for i in indices), list(range(len(token_ids))))
+        for indices, shard_vectors in shards:
+            self.assertEqual([int(v[1]) for v in shard_vectors], indices)
+
+        self.assertEqual([(int(v[0]), int(v[1])) for v in vectors],
+                         [(len(ids), ids[0]) for ids in token_ids])
+        # 工作进程中的线程数环境变量按threads_per_worker设置
+        for vector in vectors:
+            self.assertEqual(vector[2:2 + len(THREAD_ENV_VARS)], [3.0] * len(THREAD_ENV_VARS))
+            self.assertNotEqual(int(vector[-1]), os.getpid())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import json
+import threading
+import unittest
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+
+from src.llm.db.embedding_server import EmbeddingBatcher, _make_handler
+
+
+class RecordingEmbedFunction:
+    """记录每次调用的输入；代码模型按token数、文本模型按字符数生成向量"""
+
+    def __init__(self, as_numpy=False, error=None):
+        self.as_numpy = as_numpy
+        self.error = error
+        self.calls = []
+
+    def __call__(self, inputs):
+        self.calls.append(list(inputs))
+        if self.error is not None:
+            raise self.error
+        vectors = [[float(len(item)), 1.0] for item in inputs]
+        return [np.array(v, dtype=np.float32) for v in vectors] if self.as_numpy else vectors
+
+
+class TestEmbeddingBatcher(unittest.TestCase):
+    def _submit_concurrently(self, batcher, requests):
+        results = [None] * len(requests)
+
+        def submit(index, model, inputs):
+            try:
+                results[index] = batcher.submit(model, inputs)
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=submit, args=(i, model, inputs))
+                   for i, (model, inputs) in enumerate(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_merges_requests_within_max_wait(self):
+        code = RecordingEmbedFunction()
+        batcher = EmbeddingBatcher({"code": code}, max_wait_ms=300)
+        results = self._submit_concurrently(batcher, [("code", [[1, 2]]), ("code", [[1], [1, 2, 3]]),
+                                                      ("code", [[1, 2, 3, 4]])])
+        self.assertEqual(batcher.batches, 1)
+        self.assertEqual(batcher.requests, 3)
+        self.assertEqual(len(code.calls), 1)
+        self.assertEqual(sorted(len(item) for item in code.calls[0]), [1, 2, 3, 4])
+        self.assertEqual(results, [[[2.0, 1.0]], [[1.0, 1.0], [3.0, 1.0]], [[4.0, 1.0]]])
+
+    def test_mixed_models_sliced_per_job(self):
+        code, text = RecordingEmbedFunction(), RecordingEmbedFunction(as_numpy=True)
+        batcher = EmbeddingBatcher({"code": code, "text": text}, max_wait_ms=300)
+        results = self._submit_concurrently(batcher, [("text", ["ab", "abcde"]), ("code", [[1, 2, 3]]),
+                                                      ("text", ["abc"]), ("code", [[1], [1, 2]])])
+        self.assertEqual((len(code.calls), len(text.calls)), (1, 1))
+        self.assertEqual(results[0], [[2.0, 1.0], [5.0, 1.0]])
+        self.assertEqual(results[1], [[3.0, 1.0]])
+        self.assertEqual(results[2], [[3.0, 1.0]])
+        self.assertEqual(results[3], [[1.0, 1.0], [2.0, 1.0]])
+        # numpy结果已转为普通list
+        self.assertTrue(all(type(v) is list and type(v[0]) is float for result in results for v in result))
+
+    def test_error_reaches_every_job_in_group(self):
+        error = RuntimeError("CUDA out of memory")
+        batcher = EmbeddingBatcher({"code": RecordingEmbedFunction(error=error), "text": RecordingEmbedFunction()},
+                                   max_wait_ms=300)
+        results = self._submit_concurrently(batcher, [("code", [[1]]), ("code", [[1, 2]]), ("text", ["a"])])
+        self.assertIs(results[0], error)
+        self.assertIs(results[1], error)
+        # 其他模型的请求不受影响
+        self.assertEqual(results[2], [[1.0, 1.0]])
+
+    def test_bad_model_output_does_not_kill_batcher(self):
+        # 模型返回的向量少于输入条数
+        batcher = EmbeddingBatcher({"code": lambda inputs: [[1.0]], "text": RecordingEmbedFunction()},
+                                   max_wait_ms=1, timeout=5)
+        with self.assertRaises(ValueError):
+            batcher.submit("code", [[1], [2]])
+        # 推理线程仍在运行，后续请求正常返回
+        self.assertEqual(batcher.submit("text", ["ab"]), [[2.0, 1.0]])
+
+    def test_submit_timeout(self):
+        release = threading.Event()
+
+        def blocking(inputs):
+            release.wait(5)
+            return [[0.0]] * len(inputs)
+
+        batcher = EmbeddingBatcher({"code": blocking}, max_wait_ms=1, timeout=0.2)
+        try:
+            with self.assertRaises(TimeoutError):
+                batcher.submit("code", [[1]])
+        finally:
+            release.set()
+
+    def test_unknown_model(self):
+        batcher = EmbeddingBatcher({"code": RecordingEmbedFunction()})
+        with self.assertRaises(ValueError):
+            batcher.submit("text", ["a"])
+
+
+class TestEmbeddingServer(unittest.TestCase):
+    def setUp(self):
+        batcher = EmbeddingBatcher({"code": RecordingEmbedFunction(), "text": RecordingEmbedFunction(as_numpy=True)})
+        info = {"code_model": "codebert", "text_model": "minilm"}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(batcher, info))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _post(self, payload):
+        request = urllib.request.Request(f"{self.url}/embed", data=json.dumps(payload).encode('utf-8'),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_embed_round_trip(self):
+        status, body = self._post({"model": "code", "input_ids": [[1, 2], [1]]})
+        self.assertEqual(status, 200)
+        self.assertEqual(body["embeddings"], [[2.0, 1.0], [1.0, 1.0]])
+
+        # 文本模型返回numpy数组，normalize=False时也能序列化
+        status, body = self._post({"model": "text", "texts": ["abc"], "normalize": False})
+        self.assertEqual(status, 200)
+        self.assertEqual(body["embeddings"], [[3.0, 1.0]])
+
+        status, body = self._post({"model": "text", "texts": ["abc"], "normalize": True})
+        self.assertAlmostEqual(sum(v * v for v in body["embeddings"][0]), 1.0, places=5)
+
+        status, body = self._post({"model": "code"})
+        self.assertEqual(status, 400)
+
+    def test_health(self):
+        self._post({"model": "code", "input_ids": [[1]]})
+        with urllib.request.urlopen(f"{self.url}/health", timeout=5) as response:
+            body = json.loads(response.read())
+        self.assertEqual(body["code_model"], "codebert")
+        self.assertEqual(body["requests"], 1)
+        self.assertEqual(body["batches"], 1)
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(f"{self.url}/missing", timeout=5)
+        self.assertEqual(context.exception.code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.llm.db.flat_index import FlatIndex
+
+
+class TestFlatIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.vectors = rng.normal(size=(200, 32)).astype(np.float32)
+        self.ids = [f"chunk-{i}" for i in range(200)]
+        self.metadatas = [{"cwe": "78" if i % 2 == 0 else "89", "id": f"SFPP-{i // 4}"} for i in range(200)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _build(self, dtype):
+        index = FlatIndex(self.tmp.name, dtype)
+        index.add(self.ids, self.vectors, [f"doc {i}" for i in range(200)], self.metadatas)
+        index.save()
+        return FlatIndex(self.tmp.name)
+
+    def test_exact_top_k(self):
+        index = self._build("float32")
+        result = index.query(self.vectors[:3], n_results=5)
+        for row in range(3):
+            self.assertEqual(result["ids"][row][0], self.ids[row])
+            self.assertAlmostEqual(result["distances"][row][0], 0.0, places=5)
+            self.assertEqual(result["distances"][row], sorted(result["distances"][row]))
+
+    def test_where_filter(self):
+        index = self._build("float32")
+        result = index.query(self.vectors[1], n_results=10, where={"$and": [{"cwe": "78"}, {"id": "SFPP-0"}]})
+        self.assertEqual(sorted(result["ids"][0]), ["chunk-0", "chunk-2"])
+        result = index.query(self.vectors[1], n_results=3, where={"cwe": {"$in": ["89"]}})
+        self.assertEqual(result["ids"][0][0], "chunk-1")
+
+    def test_float16_storage(self):
+        index = self._build("float16")
+        self.assertEqual(index.vectors.dtype, np.float16)
+        result = index.query(self.vectors[:4], n_results=1, include=['similarities'])
+        self.assertEqual([ids[0] for ids in result["ids"]], self.ids[:4])
+        self.assertAlmostEqual(result["similarities"][0][0], 1.0, places=2)
+
+    def test_add_overwrites_existing_id(self):
+        index = self._build("float32")
+        index.add(["chunk-0"], -self.vectors[:1], ["replaced"], [{"cwe": "78"}])
+        self.assertEqual(len(index), 200)
+        self.assertEqual(index.query(-self.vectors[0], n_results=1)["documents"][0], ["replaced"])
+
+    def test_dtype_mismatch(self):
+        self._build("float16")
+        self.assertEqual(FlatIndex(self.tmp.name).dtype, np.float16)
+        with self.assertRaises(ValueError):
+            FlatIndex(self.tmp.name, "float32")
+
+    def test_reexport_rebuilds_index(self):
+        path = os.path.join(self.tmp.name, "index")
+        FlatIndex.from_collection(FakeCollection(self.ids[:3], self.vectors[:3], self.metadatas[:3]), path)
+        # 集合中删除了两个分块后以float16重新导出
+        index = FlatIndex.from_collection(FakeCollection(self.ids[:1], self.vectors[:1], self.metadatas[:1]), path,
+                                          "float16")
+        for loaded in (index, FlatIndex(path)):
+            self.assertEqual(loaded.ids, self.ids[:1])
+            self.assertEqual(loaded.dtype, np.float16)
+            self.assertEqual(loaded.vectors.dtype, np.float16)
+            self.assertEqual(loaded.vectors.shape, (1, 32))
+
+
+class FakeCollection:
+    def __init__(self, ids, embeddings, metadatas):
+        self.data = {"ids": list(ids), "embeddings": np.asarray(embeddings), "documents": [None] * len(ids),
+                     "metadatas": list(metadatas)}
+
+    def get(self, where=None, include=None):
+        return self.data
+
+
+if __name__ == '__main__':
+    unittest.main()
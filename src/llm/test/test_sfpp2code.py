@@ -2,14 +2,11 @@ import json
 import os.path
 import subprocess
 import unittest
-import time
-import uuid
 
-from numpy.ma.extras import average
-
-from src.config.config import system_prompt_sfpp_to_semantic, system_prompt_code_to_semantic
+from src.config.config import system_prompt_sfpp_to_semantic
 from src.llm.db.vector_db import VectorDB
 from src.llm.llm_client import LLMClient
+from src.llm.sfpp.matcher import SFPPMatcher
 
 
 def extract_between_markers(text, start_marker="++++++++++++++++++++++++++++++++",
@@ -268,13 +265,20 @@ class TestSFPPP2Code(unittest.TestCase):
     # TODO 保存<semantic,code>对
     def test_save_vectordb(self):
         base_dir = '/home/ran/Documents/work/graduate/sementic-restoration/experiments/sfppexp/'
-        for d in os.listdir(base_dir):
+        codes, semantics, metadata = [], [], []
+        for d in sorted(os.listdir(base_dir)):
             if os.path.isdir(os.path.join(base_dir, d)) and os.path.exists(os.path.join(base_dir, d, "SFPP.java")):
-                union_id = str(uuid.uuid4())
+                # 以目录名作为稳定ID，重复执行不会产生重复文档
+                union_id = f"SFPP-78-{d}"
                 with open(os.path.join(base_dir, d, "SFPP.java"), 'r') as f:
-                    self.db.save_code([f.read()], [{"cwe": "78", "type": "SFPP", "id": union_id}])
+                    codes.append(f.read())
                 with open(os.path.join(base_dir, d, "SFPP.semantic"), 'r') as f:
-                    self.db.save_semantic([f.read()], [{"cwe": "78", "type": "SFPP", "id": union_id}])
+                    semantics.append(f.read())
+                metadata.append({"cwe": "78", "type": "SFPP", "id": union_id})
+        where = {"$and": [{"cwe": "78"}, {"type": "SFPP"}]}
+        for name, stats in (("code", self.db.sync_code(codes, metadata, where=where)),
+                            ("semantic", self.db.sync_semantic(semantics, metadata, where=where))):
+            print(f"{name}: upserted={stats['upserted']}, unchanged={stats['unchanged']}, deleted={stats['deleted']}")
 
     def test_query1(self):
         # 查询示例
@@ -297,7 +301,7 @@ class TestSFPPP2Code(unittest.TestCase):
             print(f"元数据: {metadata}")
             print(f"距离分数: {distance}")
 
-    # TODO 获取cwe78检测结果,尝试sfpp匹配
+    # 获取cwe78检测结果并进行SFPP匹配
     def test_retrieve_defects_codes(self):
         base_dir = '/home/ran/Documents/work/graduate/sementic-restoration/experiments/'
         detect_result = os.path.join(base_dir, 'restore_detailed_results.json')
@@ -310,7 +314,8 @@ class TestSFPPP2Code(unittest.TestCase):
         if not cwe78_results:
             print("cwe78_result is None!")
             return
-        llm = LLMClient()
+        # 两阶段匹配：LLM生成语义描述，ANN粗筛候选SFPP后用分层MaxSim精排
+        matcher = SFPPMatcher(self.db, llm_client=LLMClient())
 
         query_results = []
 
@@ -319,97 +324,11 @@ class TestSFPPP2Code(unittest.TestCase):
             # java -jar target/code-index-1.0-SNAPSHOT.jar  -o ./output -s /home/ran/Documents/work/graduate/annotated-benchmark/src/main/java -extract -m "<edu.thu.benchmark.annotated.controller.XmlController: java.util.Map processXml(java.lang.String)>"
             # java -jar target/code-index-1.0-SNAPSHOT.jar -s /home/ran/Documents/work/graduate/annotated-benchmark/src/main/java -extract -m "<edu.thu.benchmark.annotated.controller.CommandInjectionController: java.lang.String executeArraySafe03(java.lang.String)>"
             command = f"java -jar /home/ran/Documents/work/graduate/code-index/target/code-index-1.0-SNAPSHOT.jar -s /home/ran/Documents/work/graduate/annotated-benchmark/src/main/java -extract -m \"{result['soot_signature']}\""
-            result = subprocess.run(command, shell=True, capture_output=True, text=True)
-            code = extract_between_markers(result.stdout)
-
-            # 添加异常处理和重试逻辑
-            max_retries = 3
-            retry_count = 0
-            retry_delay = 5  # 重试间隔5秒
-
-            while retry_count < max_retries:
-                try:
-                    response = llm.generate_completion(prompt=code, system_prompt=system_prompt_code_to_semantic)
-                    # 不再尝试解析为JSON，直接使用文本响应
-                    res = response['choices'][0]['message']['content']
-                    # 成功执行，跳出循环
-                    break
-                except KeyError as key_err:
-                    # 返回数据结构错误
-                    error_msg = f"返回数据结构错误 (尝试 {retry_count + 1}/{max_retries}): {key_err}"
-                    print(error_msg)
-                except Exception as e:
-                    # 其他异常
-                    error_msg = f"API调用异常 (尝试 {retry_count + 1}/{max_retries}): {str(e)}"
-                    print(error_msg)
-
-                # 增加重试计数
-                retry_count += 1
-
-                # 如果已经尝试了最大次数，则抛出最后一个异常
-                if retry_count >= max_retries:
-                    print(f"达到最大重试次数 ({max_retries})，操作失败")
-                    raise Exception(f"LLM API调用失败，已重试{max_retries}次")
-
-                # 等待一段时间后重试
-                print(f"等待 {retry_delay} 秒后重试...")
-                time.sleep(retry_delay)
-
-            filtered_result = self.db.semantic_collection.query(
-                query_texts=[res],
-                where={"cwe": "78"},
-                n_results=1,
-                include=['documents', 'metadatas', 'distances'],  # 包含文档内容、元数据和距离分数
-            )
-            query_result = {
-                "cwe": "78"
-            }
-            semantic_result = {}
-            union_id = None
-            # 打印详细结果
-            for i, (doc, metadata, distance) in enumerate(zip(
-                    filtered_result['documents'][0],
-                    filtered_result['metadatas'][0],
-                    filtered_result['distances'][0]
-            )):
-                semantic_result['documents'] = doc
-                semantic_result['distance'] = distance
-                union_id = metadata['id']
-                break
-
-            query_result['semantic'] = semantic_result
-
-            chunks = self.db.build_code_input(code)
-            chunk_score = []
-            for index, chunk in enumerate(chunks):
-                chunk_query = self.db.code_collection.query(
-                    query_texts=chunk,
-                    where={"$and": [
-                        {"cwe": "78"},
-                        {"id": union_id}
-                    ]},
-                    n_results=5,
-                    include=['documents', 'metadatas', 'distances'],  # 包含文档内容、元数据和距离分数
-                )
-
-                # 所有文档相似度平均
-                scores = []
-                for i, (doc, metadata, distance) in enumerate(zip(
-                        chunk_query['documents'][0],
-                        chunk_query['metadatas'][0],
-                        chunk_query['distances'][0]
-                )):
-                    scores.append(distance)
-
-                chunk_score.append(scores)
-
-            # 将所有元素展平为一维列表
-            flat_list = [item for sublist in chunk_score for item in sublist]
-            # 计算平均值
-            avg = sum(flat_list) / len(flat_list)
-            query_result['code'] = {'distance': avg}
-
-            query_results.append(query_result)
+            output = subprocess.run(command, shell=True, capture_output=True, text=True)
+            code = extract_between_markers(output.stdout)
+
+            match = matcher.match(code, cwe="78", signature=result['soot_signature'])
+            query_results.append({"cwe": "78", "signature": result['soot_signature'], **match.to_dict()})
 
         print(query_results)
         with open(os.path.join(base_dir, 'query_result.json'), 'w', encoding='utf-8') as ff:
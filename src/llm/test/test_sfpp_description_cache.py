@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.llm.sfpp.description_cache import DescriptionCache
+from src.llm.sfpp.matcher import SFPPMatcher
+
+
+class CountingLLMClient:
+    model = "test/model"
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_completion(self, prompt, system_prompt=None):
+        self.calls += 1
+        return {"choices": [{"message": {"content": f"描述{self.calls}"}}]}
+
+
+class SemanticOnlyVectorDB:
+    storage_version = 2
+    text_model = "test-text-model"
+
+    def __init__(self):
+        self.embedded = 0
+
+    def build_text_chunks(self, text):
+        return [{"text": text}]
+
+    def embed_queries(self, collection, chunks):
+        self.embedded += len(chunks)
+        return [[1.0, 0.0, 0.0] for _ in chunks]
+
+
+class TestDescriptionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "descriptions.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        with DescriptionCache(self.path) as cache:
+            key = cache.key("<A: void f()>", "void f() {}", "m")
+            self.assertEqual(cache.get(key), (None, None))
+            embedding = np.arange(6, dtype=np.float32).reshape(2, 3)
+            cache.put(key, "desc", embedding, "text@v1")
+
+        with DescriptionCache(self.path) as cache:
+            description, cached = cache.get(key, "text@v1")
+            self.assertEqual(description, "desc")
+            np.testing.assert_array_equal(cached, embedding)
+            # 嵌入模型不同时只复用描述
+            self.assertEqual(cache.get(key, "text@v2"), ("desc", None))
+            # 源码、提示词版本或模型改变时不命中
+            self.assertIsNone(cache.get(cache.key("<A: void f()>", "void f() { g(); }", "m"))[0])
+            self.assertIsNone(cache.get(cache.key("<A: void f()>", "void f() {}", "other"))[0])
+        with DescriptionCache(self.path, prompt_version="changed") as cache:
+            self.assertIsNone(cache.get(cache.key("<A: void f()>", "void f() {}", "m"))[0])
+
+    def test_matcher_reuses_description(self):
+        llm_client = CountingLLMClient()
+        db = SemanticOnlyVectorDB()
+        with DescriptionCache(self.path) as cache:
+            matcher = SFPPMatcher(db, llm_client, description_cache=cache)
+            first = matcher.semantic_blocks("void f() {}", "<A: void f()>")
+            second = matcher.semantic_blocks("void f() {}", "<A: void f()>")
+            self.assertEqual(first[0], second[0])
+            np.testing.assert_array_equal(first[1], second[1])
+            self.assertEqual(llm_client.calls, 1)
+            self.assertEqual(db.embedded, 1)
+
+            matcher.semantic_blocks("void f() { g(); }", "<A: void f()>")
+            self.assertEqual(llm_client.calls, 2)
+            self.assertEqual(cache.stats()["entries"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
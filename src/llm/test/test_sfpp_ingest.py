@@ -0,0 +1,39 @@
+import os
+import unittest
+
+import numpy as np
+
+from src.llm.sfpp.ingest import cluster_duplicates, discover, pattern_similarity, pattern_vectors
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SFPP_DIR = os.path.join(BASE_DIR, '..', '..', '..', 'experiments', 'sfppexp')
+
+
+class TestSFPPIngest(unittest.TestCase):
+    def test_discover(self):
+        records = discover([SFPP_DIR], cwe='78')
+        ids = [r['id'] for r in records]
+        self.assertEqual(ids, sorted(ids))
+        for d in ('ret0', 'ret1', 'ret2', 'ret3'):
+            self.assertIn(f'SFPP-78-{d}', ids)
+        # sfpp.json中的模式
+        self.assertIn('SFPP-CMDI-001', ids)
+        self.assertTrue(all(r['code'] for r in records))
+        self.assertTrue(all('semantic' in r for r in records))
+
+    def test_cluster_duplicates(self):
+        code = np.array([[1, 0], [0.999, 0.045], [0, 1], [0, 0]], dtype=np.float32)
+        semantic = np.array([[1, 0], [1, 0], [0, 1], [1, 0]], dtype=np.float32)
+        similarity = pattern_similarity({"code": code, "semantic": semantic}, {"code": 0.5, "semantic": 0.5})
+        # 第4个模式缺少代码维度，只按语义维度比较
+        self.assertAlmostEqual(float(similarity[0, 3]), 1.0, places=5)
+        self.assertEqual(cluster_duplicates(similarity, 0.95), [[0, 1, 3], [2]])
+        self.assertEqual(cluster_duplicates(similarity, 1.01), [[0], [1], [2], [3]])
+
+    def test_pattern_vectors(self):
+        vectors = pattern_vectors([[[3.0, 0.0], [0.0, 4.0]], None, []])
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), [1.0, 0.0, 0.0], atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
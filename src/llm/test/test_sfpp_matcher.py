@@ -0,0 +1,160 @@
+import os
+import unittest
+
+import numpy as np
+
+from src.llm.sfpp.importance import block_importance, importance_order
+from src.llm.sfpp.matcher import MatchConfig, SFPPMatcher, certainty_level, load_findings
+from src.llm.sfpp.scorer import DIMENSIONS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPERIMENTS_DIR = os.path.join(BASE_DIR, '..', '..', '..', 'experiments')
+
+
+class FakeCollection:
+    """按余弦相似度检索的内存集合，只实现匹配引擎用到的query/get"""
+
+    def __init__(self, vectors, metadatas):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.metadatas = metadatas
+
+    def query(self, query_embeddings, where=None, n_results=10, include=None):
+        sims = np.asarray(query_embeddings, dtype=np.float32) @ self.vectors.T
+        order = np.argsort(-sims, axis=1)[:, :n_results]
+        return {"metadatas": [[self.metadatas[i] for i in row] for row in order]}
+
+    def get(self, where=None, include=None):
+        ids = where["$and"][1]["id"]["$in"]
+        selected = [i for i, m in enumerate(self.metadatas) if m["id"] in ids]
+        return {"embeddings": self.vectors[selected].tolist(), "metadatas": [self.metadatas[i] for i in selected]}
+
+
+class RecordingCollection(FakeCollection):
+    """记录精排阶段按SFPP ID取出的子块"""
+
+    def __init__(self, vectors, metadatas):
+        super().__init__(vectors, metadatas)
+        self.fetched = []
+
+    def get(self, where=None, include=None):
+        self.fetched.append(sorted(where["$and"][1]["id"]["$in"]))
+        return super().get(where, include)
+
+
+class FakeVectorDB:
+    """每行源码作为一个代码子块，向量由测试直接给出"""
+
+    def __init__(self, line_vectors, collection):
+        self.line_vectors = line_vectors
+        self.collection = collection
+        self.embedded = 0
+
+    def build_code_chunks(self, code):
+        return [{"input_ids": list(range(i, i + 8)), "text": line} for i, line in enumerate(code.splitlines())]
+
+    def embed_queries(self, collection, chunks):
+        self.embedded += len(chunks)
+        return [self.line_vectors[chunk["text"]] for chunk in chunks]
+
+    def get_collection(self, name):
+        return self.collection
+
+
+class TestSFPPMatcher(unittest.TestCase):
+    def test_load_detailed_results(self):
+        findings = load_findings(os.path.join(EXPERIMENTS_DIR, 'restore_detailed_results.json'), cwe='78')
+        self.assertTrue(findings)
+        self.assertTrue(all(f['cwe'] == '78' and f['signature'].startswith('<') for f in findings))
+        self.assertEqual(len(findings), len({f['signature'] for f in findings}))
+
+    def test_load_raw_results(self):
+        raw = load_findings(os.path.join(BASE_DIR, 'workflow_result', 'detected_result_before.json'))
+        grouped = load_findings(os.path.join(BASE_DIR, 'workflow_result', 'detected_result_raw.json'))
+        self.assertTrue(raw)
+        self.assertTrue(grouped)
+        for finding in raw + grouped:
+            self.assertTrue(finding['signature'].startswith('<') and finding['signature'].endswith('>'))
+
+    def test_certainty_level(self):
+        self.assertEqual(certainty_level(0.99, 0.85, 0.1), "High")
+        self.assertEqual(certainty_level(0.92, 0.85, 0.1), "Medium")
+        self.assertEqual(certainty_level(0.84, 0.85, 0.1), "Low")
+
+    def test_two_stage_match(self):
+        basis = np.eye(8, dtype=np.float32)
+        similar = 0.6 * basis[0] + 0.8 * basis[2]
+        opposite = -(basis[0] + basis[1]) / np.sqrt(2)
+        # SFPP-A的两个子块与查询相同（逆序存储），SFPP-B与第一个查询子块部分相似，SFPP-C与查询相反
+        collection = RecordingCollection(
+            [basis[1], basis[0], similar, opposite],
+            [{"type": "SFPP", "id": "SFPP-A", "chunk": 1}, {"type": "SFPP", "id": "SFPP-A", "chunk": 0},
+             {"type": "SFPP", "id": "SFPP-B", "chunk": 0}, {"type": "SFPP", "id": "SFPP-C", "chunk": 0}])
+        config = MatchConfig(coarse_results=2, early_stop=False, threshold=0.8)
+        matcher = SFPPMatcher(FakeVectorDB({}, collection), config=config)
+        query_blocks = {"code": basis[:2]}
+
+        result = matcher.match_blocks(query_blocks, cwe="78")
+        # 粗筛：两个查询子块都召回SFPP-A，按SFPP ID合并；SFPP-C不是候选
+        self.assertEqual(result.stats["coarse_queries"], 2)
+        self.assertEqual(result.stats["candidates"], 2)
+        self.assertEqual(sorted(c["sfpp_id"] for c in result.candidates), ["SFPP-A", "SFPP-B"])
+        # 精排只取出候选SFPP的子块，每个维度取一次
+        self.assertEqual(collection.fetched, [["SFPP-A", "SFPP-B"]] * len(DIMENSIONS))
+        np.testing.assert_allclose(matcher.load_pattern_blocks(["SFPP-A"])["SFPP-A"]["code"], basis[:2])
+
+        # 判定与确定性来自精排后的置信度
+        scores = matcher.rerank(query_blocks, ["SFPP-A", "SFPP-B"])
+        self.assertEqual(result.best_sfpp, "SFPP-A")
+        self.assertAlmostEqual(result.confidence, float(np.max(scores.confidence)), places=5)
+        self.assertEqual(result.candidates[0]["sfpp_id"], "SFPP-A")
+        self.assertGreater(result.candidates[0]["confidence"], result.candidates[1]["confidence"])
+        self.assertEqual(result.is_false_positive, result.confidence >= config.threshold)
+        self.assertEqual(result.certainty, certainty_level(result.confidence, config.threshold,
+                                                           config.certainty_margin))
+
+        # 批量匹配时候选子块在漏洞之间复用，不再读取集合
+        matcher.match_blocks(query_blocks, cwe="78")
+        self.assertEqual(len(collection.fetched), len(DIMENSIONS))
+
+    def test_block_importance(self):
+        chunks = [
+            {"input_ids": [1] * 16, "text": "int a = 0; int b = 0;"},
+            {"input_ids": list(range(16)), "text": "if (!cmd.matches(ALLOWED)) throw new IllegalArgumentException();"},
+            {"input_ids": [2, 3] * 8, "text": "String x = y;"},
+            {"input_ids": list(range(16)), "text": "Runtime.getRuntime().exec(cmd);"},
+        ]
+        importance = block_importance(chunks)
+        self.assertTrue(np.all(importance > 0))
+        self.assertEqual(set(importance_order(importance)[:2].tolist()), {1, 3})
+
+    def test_early_stop(self):
+        rng = np.random.default_rng(0)
+        basis = np.linalg.qr(rng.normal(size=(16, 16)))[0].astype(np.float32)
+        lines = [f"exec(cmd{i}); if (x) return;" for i in range(12)]
+        # SFPP-A的子块与查询前4行完全相同，SFPP-B与查询无关
+        collection = FakeCollection(
+            np.concatenate([basis[:4], basis[12:16]]),
+            [{"type": "SFPP", "id": "SFPP-A", "chunk": i} for i in range(4)]
+            + [{"type": "SFPP", "id": "SFPP-B", "chunk": i} for i in range(4)])
+        line_vectors = {line: basis[i] for i, line in enumerate(lines)}
+        config = MatchConfig(coarse_top_k=4, early_stop_similarity=0.9, early_stop_coverage=0.7)
+        config.importance.entropy_weight = config.importance.position_weight = 0.0
+        config.importance.keyword_weight = 1.0
+
+        # 关键字相同时按原文顺序，前4行即可判定
+        db = FakeVectorDB(line_vectors, collection)
+        result = SFPPMatcher(db, config=config).match("\n".join(lines), semantic="")
+        self.assertTrue(result.stats["early_stopped"])
+        self.assertEqual(result.stats["skipped_queries"], 8)
+        self.assertEqual(db.embedded, 4)
+        self.assertEqual(result.best_sfpp, "SFPP-A")
+
+        config.early_stop = False
+        db = FakeVectorDB(line_vectors, collection)
+        result = SFPPMatcher(db, config=config).match("\n".join(lines), semantic="")
+        self.assertEqual(db.embedded, 12)
+        self.assertEqual(result.best_sfpp, "SFPP-A")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.llm.sfpp.reliability import ReliabilityStore, apply_match_results, verdict_feedback
+
+
+class TestReliabilityStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "reliability.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_incremental_update(self):
+        alpha = 0.2
+        expected = 1.0
+        with ReliabilityStore(self.path, alpha) as store:
+            for feedback in (0.0, 1.0, 0.0, 0.5):
+                expected = (1 - alpha) * expected + alpha * feedback
+                self.assertAlmostEqual(store.record_feedback("SFPP-A", feedback), expected)
+            row = store.all()[0]
+            self.assertEqual((row["feedback_count"], row["confirmed"], row["rejected"]), (4, 2, 2))
+
+        # 重新打开后状态保持，未记录的SFPP取默认值
+        with ReliabilityStore(self.path, alpha) as store:
+            np.testing.assert_allclose(store.get_many(["SFPP-B", "SFPP-A"]), [1.0, expected], rtol=1e-6)
+
+    def test_duplicate_feedback(self):
+        with ReliabilityStore(self.path, 0.5) as store:
+            self.assertAlmostEqual(store.record_feedback("SFPP-A", 0.0, finding="f1"), 0.5)
+            self.assertIsNone(store.record_feedback("SFPP-A", 0.0, finding="f1"))
+            # 标注被修正时替换原反馈：结果与当初直接记录新反馈相同，计数从旧标注移到新标注
+            self.assertAlmostEqual(store.record_feedback("SFPP-A", 1.0, finding="f1"), 1.0)
+            row = store.all()[0]
+            self.assertEqual((row["feedback_count"], row["confirmed"], row["rejected"]), (1, 1, 0))
+
+            self.assertAlmostEqual(store.record_feedback("SFPP-A", 0.0, finding="f2"), 0.5)
+            self.assertAlmostEqual(store.record_feedback("SFPP-A", 0.0, finding="f1"), 0.0)
+            row = store.all()[0]
+            self.assertEqual((row["feedback_count"], row["confirmed"], row["rejected"]), (2, 0, 2))
+
+    def test_apply_match_results(self):
+        results = {"results": [
+            {"cwe": "78", "signature": "<A: void f()>", "result_type": "TP",
+             "match": {"is_false_positive": True, "best_sfpp": "SFPP-A"}},
+            {"cwe": "78", "signature": "<A: void g()>", "result_type": "FP (未匹配)",
+             "match": {"is_false_positive": True, "best_sfpp": "SFPP-B"}},
+            {"cwe": "78", "signature": "<A: void h()>", "result_type": "TP",
+             "match": {"is_false_positive": False, "best_sfpp": "SFPP-A"}},
+            {"cwe": "78", "signature": "<A: void i()>", "error": "source not found"},
+        ]}
+        result_path = os.path.join(self.tmp.name, "result.json")
+        with open(result_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f)
+        with ReliabilityStore(self.path, 0.1) as store:
+            self.assertEqual(apply_match_results(store, result_path), {"applied": 2, "duplicates": 0, "skipped": 2})
+            self.assertEqual(apply_match_results(store, result_path), {"applied": 0, "duplicates": 2, "skipped": 2})
+            np.testing.assert_allclose(store.get_many(["SFPP-A", "SFPP-B"]), [0.9, 1.0], rtol=1e-6)
+
+    def test_verdict_feedback(self):
+        self.assertEqual(verdict_feedback("FP"), 1.0)
+        self.assertEqual(verdict_feedback("TP"), 0.0)
+        self.assertIsNone(verdict_feedback(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
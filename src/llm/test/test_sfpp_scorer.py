@@ -0,0 +1,96 @@
+import math
+import time
+import unittest
+
+import numpy as np
+
+from src.llm.sfpp.scorer import PatternBlocks, ScoringConfig, score_patterns
+
+
+def cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def reference_confidence(query, patterns, config):
+    """按形式化模型逐块循环计算，仅用于校验向量化实现"""
+    results = []
+    for pattern in patterns:
+        total, weight_sum, coverage = 0.0, 0.0, 0.0
+        for dim, blocks in pattern.items():
+            if blocks is None:
+                continue
+            q, m = len(query[dim]), len(blocks)
+            max_sims = []
+            for i, d_i in enumerate(query[dim], start=1):
+                max_sims.append(max(cosine(d_i, s_j) * math.exp(-config.position_decay * abs(i / q - j / m))
+                                    for j, s_j in enumerate(blocks, start=1)))
+            w = config.dimension_weights[dim]
+            total += w * sum(max_sims) / q
+            coverage += w * sum(s >= config.local_threshold for s in max_sims) / q
+            weight_sum += w
+        similarity, coverage = total / weight_sum, coverage / weight_sum
+        results.append(similarity * (1 + config.coverage_bonus * coverage))
+    return np.array(results)
+
+
+class TestSFPPScorer(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.config = ScoringConfig(local_threshold=0.3)
+
+    def _random_library(self, count, dim=32):
+        patterns = []
+        for p in range(count):
+            patterns.append({
+                'semantic': self.rng.normal(size=(self.rng.integers(1, 4), dim)),
+                'code': self.rng.normal(size=(self.rng.integers(1, 6), dim)),
+                # 部分SFPP没有上下文信息
+                'context': self.rng.normal(size=(2, dim)) if p % 3 else None,
+            })
+        return patterns
+
+    def _pack(self, patterns, dim=32):
+        return {d: PatternBlocks.pack([p[d] for p in patterns], dim) for d in ('semantic', 'code', 'context')}
+
+    def test_matches_reference(self):
+        patterns = self._random_library(12)
+        query = {'semantic': self.rng.normal(size=(2, 32)), 'code': self.rng.normal(size=(5, 32)),
+                 'context': self.rng.normal(size=(3, 32))}
+        result = score_patterns(query, self._pack(patterns), config=self.config)
+        np.testing.assert_allclose(result.confidence, reference_confidence(query, patterns, self.config), rtol=1e-4)
+        self.assertTrue(np.isnan(result.dimension_similarity['context'][0]))
+
+    def test_identical_pattern_scores_highest(self):
+        patterns = self._random_library(20)
+        query = {d: patterns[7][d] for d in ('semantic', 'code')}
+        result = score_patterns(query, self._pack(patterns), config=ScoringConfig(position_decay=0.0))
+        self.assertEqual(int(np.argmax(result.confidence)), 7)
+        self.assertAlmostEqual(float(result.coverage[7]), 1.0)
+
+    def test_reliability_scales_confidence(self):
+        patterns = self._random_library(4)
+        query = {'code': self.rng.normal(size=(3, 32))}
+        packed = self._pack(patterns)
+        base = score_patterns(query, packed).confidence
+        scaled = score_patterns(query, packed, reliability=np.array([1.0, 0.5, 0.0, 1.0])).confidence
+        np.testing.assert_allclose(scaled, base * np.array([1.0, 0.5, 0.0, 1.0]), rtol=1e-6)
+
+    def test_benchmark(self):
+        patterns = self._random_library(500, dim=768)
+        query = {'semantic': self.rng.normal(size=(2, 768)), 'code': self.rng.normal(size=(8, 768)),
+                 'context': self.rng.normal(size=(4, 768))}
+        packed = self._pack(patterns, 768)
+
+        start = time.time()
+        score_patterns(query, packed, config=self.config)
+        vectorized = time.time() - start
+
+        start = time.time()
+        reference_confidence(query, patterns[:50], self.config)
+        loop = (time.time() - start) * len(patterns) / 50
+        print(f"500 SFPP: vectorized {vectorized * 1000:.1f} ms, python loop ~{loop * 1000:.1f} ms "
+              f"({loop / vectorized:.0f}x)")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -87,9 +87,20 @@ class TestTokenizer(unittest.TestCase):
         restored_text = restore_text_from_tokens(chunks, self.tokenizer)
         print(restored_text)
 
-    
+    def test_sliding_window_chunks(self):
+        from src.llm.db.vector_db import sliding_window_chunks
+
+        code = "public int add(int a, int b) { return a + b; }\n" * 200
+        chunks = sliding_window_chunks(code, self.tokenizer, max_length=128, stride=64)
+        total = len(self.tokenizer(code, add_special_tokens=False)["input_ids"])
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk["input_ids"]), 128)
+            self.assertEqual(chunk["input_ids"][0], self.tokenizer.cls_token_id)
+            self.assertEqual(chunk["text"], code[chunk["start"]:chunk["end"]])
+        # 最后一个窗口到达结尾，且不存在被完全覆盖的尾部窗口
+        self.assertGreaterEqual(chunks[-1]["end"], len(code.rstrip()))
+        self.assertEqual(len(chunks), max(1, -(-(total - 126) // 64) + 1))
 
-    
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
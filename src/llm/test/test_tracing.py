@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from src.llm.tracing import NULL_SPAN, Tracer, get_tracer, set_tracer, span, traced
+from src.llm.workflow.state import WorkflowState
+from src.llm.workflow.workflow import SemanticRestorationWorkflow, execute_command
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+        self.previous = set_tracer(self.tracer)
+
+    def tearDown(self):
+        set_tracer(self.previous)
+
+    def test_nested_spans(self):
+        with span("stage", "stage") as outer:
+            with span("llm.request", "llm", model="m") as inner:
+                inner.set(prompt_tokens=10)
+            outer.set(status="ok")
+        inner_span, outer_span = self.tracer.spans
+        self.assertEqual(inner_span.parent, outer_span.id)
+        self.assertIsNone(outer_span.parent)
+        self.assertEqual(inner_span.attrs, {"model": "m", "prompt_tokens": 10})
+        self.assertGreaterEqual(inner_span.start, outer_span.start)
+        self.assertLessEqual(inner_span.end, outer_span.end)
+
+    def test_error_and_threads(self):
+        with self.assertRaises(RuntimeError):
+            with span("failing"):
+                raise RuntimeError("boom")
+        self.assertEqual(self.tracer.spans[0].attrs["error"], "boom")
+
+        with span("parent"):
+            worker = threading.Thread(target=traced(lambda: None, "child", "restoration", file="A.java"))
+            worker.start()
+            worker.join()
+        child = next(s for s in self.tracer.spans if s.name == "child")
+        # 其他线程上的span不嵌套在当前线程的span下
+        self.assertIsNone(child.parent)
+        self.assertNotEqual(child.thread, self.tracer.spans[-1].thread)
+        self.assertEqual(self.tracer.summary()["restoration"]["count"], 1)
+
+    def test_chrome_export(self):
+        with span("command", "subprocess", command="true"):
+            pass
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            self.tracer.export_chrome(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                trace = json.load(f)
+        events = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(events[0]["name"], "command")
+        self.assertEqual(events[0]["cat"], "subprocess")
+        self.assertEqual(events[0]["args"]["command"], "true")
+        self.assertIn("dur", events[0])
+        self.assertTrue(any(e["ph"] == "M" for e in trace["traceEvents"]))
+
+    def test_execute_command_span(self):
+        execute_command("exit 3")
+        self.assertEqual(self.tracer.spans[0].attrs["returncode"], 3)
+
+    def test_no_active_tracer(self):
+        set_tracer(None)
+        self.assertIsNone(get_tracer())
+        with span("ignored") as current:
+            self.assertIs(current, NULL_SPAN)
+            current.set(a=1)
+        self.assertEqual(self.tracer.spans, [])
+
+
+class EchoLLMClient:
+    def generate_completion(self, prompt, system_prompt=None):
+        return {"choices": [{"message": {"content": f"class {prompt} {{}}"}}]}
+
+
+class TracedWorkflow(SemanticRestorationWorkflow):
+    def __init__(self, output_path):
+        super().__init__(output_path, output_path, output_path, "test", llm_client=EchoLLMClient())
+        self.copy_project_path = os.path.join(output_path, 'project')
+        self.state = WorkflowState.RESTORATION
+
+    def _collect_restoration_tasks(self):
+        return [("A.java", "A"), ("B.java", "B")]
+
+    def _compile(self, files):
+        pass
+
+    def _execute_static_analysis(self, before=False, change_state=True):
+        self.state = WorkflowState.EVALUATION
+
+    def _execute_evaluation(self, before=False, change_state=True):
+        self.state = WorkflowState.COMPLETED
+
+
+class TestWorkflowTrace(unittest.TestCase):
+    def test_trace_next_to_statistics(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('before_detailed_results', 'before_evaluation_results', 'restored_detailed_results',
+                         'restored_evaluation_results'):
+                with open(os.path.join(tmp, f'{name}.json'), 'w') as f:
+                    f.write("{}")
+            workflow = TracedWorkflow(tmp)
+            workflow.run()
+            self.assertEqual(workflow.state, WorkflowState.COMPLETED)
+            self.assertIsNone(get_tracer())
+            with open(os.path.join(tmp, 'trace.json'), 'r', encoding='utf-8') as f:
+                events = [e for e in json.load(f)["traceEvents"] if e["ph"] == "X"]
+            with open(os.path.join(tmp, 'statistics.json'), 'r', encoding='utf-8') as f:
+                statistics = json.load(f)
+
+        names = [e["name"] for e in events]
+        self.assertEqual(names[0], "workflow")
+        for name in ("restoration", "analysis", "evaluation", "compile"):
+            self.assertIn(name, names)
+        self.assertEqual(sorted(e["args"]["file"] for e in events if e["name"] == "restore_file"),
+                         ["A.java", "B.java"])
+        self.assertEqual(statistics["trace"]["file"], "trace.json")
+        self.assertEqual(statistics["trace"]["summary"]["restoration"]["count"], 2)
+
+    def test_statistics_after_failed_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # 分析阶段失败，没有任何分析/评估结果文件
+            workflow = FailingAnalysisWorkflow(tmp)
+            workflow.run()
+            self.assertEqual(workflow.state, WorkflowState.FAILED)
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'trace.json')))
+            with open(os.path.join(tmp, 'statistics.json'), 'r', encoding='utf-8') as f:
+                statistics = json.load(f)
+
+        self.assertEqual(statistics["state"], "failed")
+        self.assertEqual(statistics["failure"]["state"], WorkflowState.ANALYSIS.value)
+        self.assertEqual(statistics["restored_files"], 2)
+        self.assertEqual([(c["stage"], c["returncode"]) for c in statistics["commands"]], [("analysis", 2)])
+        for key in ("before_detected_result", "before_evaluation", "restored_detected_result", "restored_evaluation"):
+            self.assertIsNone(statistics[key])
+
+
+class FailingAnalysisWorkflow(TracedWorkflow):
+    def _execute_static_analysis(self, before=False, change_state=True):
+        result = self._run_command("analysis", "exit 2", self.output_path)
+        raise RuntimeError(f"analysis exited with {result.returncode}")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.llm.db.migrate import _target_id, export_flat_index, migrate_collection
+from src.llm.db.vector_db import chunk_id, collection_name
+
+
+class InMemoryCollection:
+    """只实现迁移需要的get/upsert接口"""
+
+    def __init__(self, name, metadata=None):
+        self.name = name
+        self.metadata = metadata
+        self.rows = {}
+        self.upserts = 0
+
+    def get(self, limit=None, offset=0, include=(), where=None):
+        ids = sorted(self.rows)[offset:offset + limit if limit else None]
+        result = {"ids": ids,
+                  "documents": [self.rows[i][0] for i in ids],
+                  "metadatas": [self.rows[i][1] for i in ids]}
+        if 'embeddings' in include:
+            result["embeddings"] = [self.rows[i][2] for i in ids]
+        return result
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.upserts += 1
+        for i, e, d, m in zip(ids, embeddings, documents, metadatas):
+            self.rows[i] = (d, m, list(e))
+
+
+class InMemoryClient:
+    def __init__(self):
+        self.collections = {}
+
+    def get_collection(self, name):
+        return self.collections[name]
+
+    def get_or_create_collection(self, name, metadata=None):
+        if name not in self.collections:
+            self.collections[name] = InMemoryCollection(name, metadata)
+        return self.collections[name]
+
+    def delete_collection(self, name):
+        del self.collections[name]
+
+
+class FakeVectorDB:
+    """按文档长度生成向量的v2 VectorDB"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_queries(self, base_name, documents):
+        self.calls.append((base_name, list(documents)))
+        return [[float(len(d)), 0.0, 0.0] for d in documents]
+
+
+class TestVectorMigrate(unittest.TestCase):
+    def setUp(self):
+        self.client = InMemoryClient()
+        legacy = self.client.get_or_create_collection(collection_name('code', 1))
+        # 未归一化的v1向量；前两条带有来源信息，最后一条是旧格式的随机ID
+        legacy.upsert(["old-a", "old-b", "old-c"], [[3.0, 4.0, 0.0], [0.0, 0.0, 2.0], [1.0, 1.0, 1.0]],
+                      ["doc a", "doc b", "doc c"],
+                      [{"source_id": "SFPP-1", "content_hash": "h1", "chunk": 0},
+                       {"source_id": "SFPP-1", "content_hash": "h2", "chunk": -1},
+                       {"cwe": "78"}])
+
+    def test_target_id(self):
+        target = collection_name('code', 2)
+        self.assertEqual(_target_id(target, "old", {"source_id": "S", "content_hash": "h", "chunk": 3}),
+                         chunk_id(target, "S", 3, "h"))
+        # 负的分块序号（整篇文档）按0处理
+        self.assertEqual(_target_id(target, "old", {"source_id": "S", "content_hash": "h", "chunk": -1}),
+                         chunk_id(target, "S", 0, "h"))
+        self.assertEqual(_target_id(target, "old", {"source_id": "S"}), "old")
+        self.assertEqual(_target_id(target, "old", None), "old")
+
+    def test_migrate_normalizes_and_upserts(self):
+        stats = migrate_collection(self.client, 'code', page_size=2)
+        self.assertEqual(stats, {"migrated": 3, "dimension": 3})
+        target = self.client.get_collection('code_v2')
+        self.assertEqual(target.metadata["hnsw:space"], "cosine")
+        self.assertEqual(target.metadata["format_version"], 2)
+        self.assertEqual(target.upserts, 2)
+
+        expected_id = chunk_id('code_v2', "SFPP-1", 0, "h1")
+        self.assertIn(expected_id, target.rows)
+        self.assertIn("old-c", target.rows)
+        np.testing.assert_allclose(target.rows[expected_id][2], [0.6, 0.8, 0.0], rtol=1e-6)
+        for _, _, vector in target.rows.values():
+            self.assertAlmostEqual(float(np.linalg.norm(vector)), 1.0, places=5)
+
+        # 再次迁移时确定性ID保证不会产生重复
+        migrate_collection(self.client, 'code', page_size=2)
+        self.assertEqual(len(target.rows), 3)
+        self.assertIn('code', self.client.collections)
+
+    def test_migrate_re_embed_and_drop_legacy(self):
+        vector_db = FakeVectorDB()
+        stats = migrate_collection(self.client, 'code', page_size=10, vector_db=vector_db, drop_legacy=True)
+        self.assertEqual(stats["migrated"], 3)
+        self.assertEqual(vector_db.calls, [('code', ["doc a", "doc b", "doc c"])])
+        self.assertEqual(self.client.get_collection('code_v2').rows["old-c"][2], [5.0, 0.0, 0.0])
+        self.assertNotIn('code', self.client.collections)
+
+    def test_export_flat_index(self):
+        migrate_collection(self.client, 'code')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index")
+            self.assertEqual(len(export_flat_index(self.client, path, 'code', 'float32')), 3)
+            # 集合缩小后以float16重新导出：不残留已删除的分块，精度按参数生效
+            target = self.client.get_collection('code_v2')
+            del target.rows["old-c"]
+            index = export_flat_index(self.client, path, 'code', 'float16')
+            self.assertEqual(sorted(index.ids), sorted(target.rows))
+            self.assertEqual(index.vectors.dtype, np.float16)
+
+
+if __name__ == '__main__':
+    unittest.main()
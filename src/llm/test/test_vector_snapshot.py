@@ -0,0 +1,60 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.llm.db.snapshot import export_snapshot, load_snapshot
+
+
+class InMemoryCollection:
+    """只实现快照需要的get/upsert接口"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def get(self, limit=None, offset=0, include=()):
+        ids = sorted(self.rows)[offset:offset + limit if limit else None]
+        return {"ids": ids,
+                "documents": [self.rows[i][0] for i in ids],
+                "metadatas": [self.rows[i][1] for i in ids],
+                "embeddings": [self.rows[i][2] for i in ids]}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for i, e, d, m in zip(ids, embeddings, documents, metadatas):
+            self.rows[i] = (d, m, list(e))
+
+
+class InMemoryVectorDB:
+    storage_version = 2
+
+    def __init__(self):
+        self.collections = {name: InMemoryCollection() for name in ('semantic', 'code', 'context')}
+
+    def get_collection(self, name):
+        return self.collections[name]
+
+
+class TestVectorSnapshot(unittest.TestCase):
+    def test_round_trip(self):
+        source = InMemoryVectorDB()
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(25, 16)).astype(np.float32)
+        source.collections['code'].upsert([f"id-{i:02d}" for i in range(25)], vectors.tolist(),
+                                          [f"doc {i}" for i in range(25)],
+                                          [{"cwe": "78", "chunk": i} for i in range(25)])
+        with tempfile.TemporaryDirectory() as path:
+            manifest = export_snapshot(source, path, page_size=10)
+            self.assertEqual(manifest["collections"]["code"]["count"], 25)
+            self.assertNotIn("semantic", manifest["collections"])
+
+            target = InMemoryVectorDB()
+            loaded = load_snapshot(target, path, batch_size=7)
+            self.assertEqual(loaded, {"code": 25})
+            row = target.collections['code'].rows["id-03"]
+            self.assertEqual(row[0], "doc 3")
+            self.assertEqual(row[1], {"cwe": "78", "chunk": 3})
+            np.testing.assert_allclose(row[2], vectors[3], rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -88,3 +88,82 @@ class VectorDB2Test(unittest.TestCase):
                    """
 
         self.db.save_code([code], [{"name": "code1"}])
+
+    def test_idempotent_save_and_sync(self):
+        code = "public String run(String cmd) { if (ALLOWED.contains(cmd)) { return exec(cmd); } return null; }"
+        code2 = "public void noop() { }"
+        metadata = [{"type": "sync-test", "id": "sync-1"}, {"type": "sync-test", "id": "sync-2"}]
+        where = {"type": "sync-test"}
+
+        first = self.db.sync_code([code, code2], metadata, where=where)
+        second = self.db.save_code([code, code2], metadata)
+        self.assertEqual(first["ids"], second["ids"])
+        self.assertEqual(second["upserted"], 0)
+        self.assertEqual(len(self.db.code_collection.get(where=where)["ids"]), len(first["ids"]))
+
+        # 数据源中移除code2后，同步会删除其分块
+        third = self.db.sync_code([code], metadata[:1], where=where)
+        self.assertEqual(third["deleted"], len(first["ids"]) - len(third["ids"]))
+        # Chroma的get不保证返回顺序
+        self.assertEqual(set(self.db.code_collection.get(where=where)["ids"]), set(third["ids"]))
+        self.db.code_collection.delete(where=where)
+
+    def test_query_chunks(self):
+        code = "public String run(String cmd) { if (ALLOWED.contains(cmd)) { return exec(cmd); } return null; }\n" * 40
+        self.db.save_code([code], [{"type": "query-chunks-test", "id": "qc-1"}])
+        chunks = self.db.build_code_chunks(code)
+        distances = self.db.query_chunks('code', chunks, where={"type": "query-chunks-test"}, k=3)
+        self.assertEqual(distances.shape, (len(chunks), 3))
+        print(distances)
+        self.db.code_collection.delete(where={"type": "query-chunks-test"})
+
+
+class RecordingCollection:
+    def __init__(self, ids, name="code_v2"):
+        self.ids = ids
+        self.name = name
+        self.deleted = []
+        self.upserted = []
+
+    def update(self, ids=None, metadatas=None):
+        pass
+
+    def upsert(self, ids=None, metadatas=None, documents=None, embeddings=None):
+        # 与Chroma一致，拒绝同一批中的重复ID
+        if len(set(ids)) != len(ids):
+            raise ValueError(f"Expected IDs to be unique, found duplicates in {ids}")
+        self.upserted.extend(ids)
+
+    def get(self, ids=None, where=None, include=None):
+        if ids is not None:
+            return {"ids": [i for i in ids if i in self.ids]}
+        return {"ids": list(self.ids)}
+
+    def delete(self, ids=None):
+        self.deleted.extend(ids)
+
+
+class SyncScopeTest(unittest.TestCase):
+    def test_sync_requires_where(self):
+        collection = RecordingCollection(["a", "b", "other-cwe"])
+        with self.assertRaises(ValueError):
+            VectorDB._sync({"ids": ["a"]}, collection, {})
+        with self.assertRaises(TypeError):
+            VectorDB.sync_code(None, ["code"], [{"id": "a"}])
+        self.assertEqual(collection.deleted, [])
+
+        stats = VectorDB._sync({"ids": ["a"]}, collection, {"type": "SFPP"})
+        self.assertEqual(stats["deleted"], 2)
+
+    def test_save_deduplicates_ids(self):
+        collection = RecordingCollection([])
+        chunks = lambda doc: [{"text": line} for line in doc.splitlines()]
+        embed = lambda items: iter([(list(range(len(items))), [[1.0]] * len(items))])
+        # 同一来源重复出现的文档，以及同一文档中内容相同的分块序号不同，不算重复
+        stats = VectorDB._save(None, ["a\nb", "a\nb", "c\nc"], [{"id": "S1"}, {"id": "S1"}, {"id": "S2"}],
+                               chunks, collection, embed)
+        self.assertEqual(len(stats["ids"]), 4)
+        self.assertEqual(len(set(stats["ids"])), 4)
+        self.assertEqual(sorted(collection.upserted), sorted(stats["ids"]))
+        self.assertEqual(stats["upserted"], 4)
+
@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+
+from src.llm.workflow.artifact_cache import ArtifactCache, tree_manifest
+from src.llm.workflow.workflow import SemanticRestorationWorkflow
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class TestTreeManifest(unittest.TestCase):
+    def test_manifest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            write(os.path.join(tmp, "src", "A.java"), "class A {}")
+            first = tree_manifest(tmp)
+            # 编译产物与版本库元数据不影响清单
+            write(os.path.join(tmp, "target", "classes", "A.class"), "binary")
+            write(os.path.join(tmp, ".git", "HEAD"), "ref")
+            self.assertEqual(tree_manifest(tmp), first)
+            write(os.path.join(tmp, "src", "A.java"), "class A { int x; }")
+            self.assertNotEqual(tree_manifest(tmp), first)
+
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ArtifactCache(os.path.join(self.tmp.name, "cache"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_store_and_restore(self):
+        output = os.path.join(self.tmp.name, "run1")
+        write(os.path.join(output, "model", "beans.json"), "[]")
+        write(os.path.join(output, "before_evaluation_results.json"), "{}")
+        write(os.path.join(output, "before_detailed_results.json"), "{}")
+        key = ArtifactCache.key("stage", "cmd", {"sources": "abc"})
+        self.assertNotEqual(key, ArtifactCache.key("stage", "cmd", {"sources": "abd"}))
+        self.assertFalse(self.cache.restore("stage", key, output))
+        self.assertEqual(self.cache.store("stage", key, output, ["model", "before_*"]),
+                         ["before_detailed_results.json", "before_evaluation_results.json", "model"])
+        self.assertIsNone(self.cache.store("stage", key, output, ["missing"]))
+
+        restored = os.path.join(self.tmp.name, "run2")
+        write(os.path.join(restored, "model", "stale.json"), "stale")
+        self.assertTrue(self.cache.restore("stage", key, restored))
+        self.assertEqual(read(os.path.join(restored, "model", "beans.json")), "[]")
+        self.assertFalse(os.path.exists(os.path.join(restored, "model", "stale.json")))
+        self.assertTrue(os.path.exists(os.path.join(restored, "before_detailed_results.json")))
+
+    def test_store_keeps_complete_entry(self):
+        key = ArtifactCache.key("stage", "cmd", {})
+        first = os.path.join(self.tmp.name, "run1")
+        write(os.path.join(first, "model", "beans.json"), "first")
+        self.cache.store("stage", key, first, ["model"])
+        entry = os.path.join(self.cache.cache_dir, "stage", key)
+        inode = os.stat(os.path.join(entry, "model", "beans.json")).st_ino
+
+        # 其他进程随后写入相同的缓存项时不替换已完整的缓存项，避免正在restore的进程读到被删除的目录
+        second = os.path.join(self.tmp.name, "run2")
+        write(os.path.join(second, "model", "beans.json"), "second")
+        self.assertEqual(self.cache.store("stage", key, second, ["model"]), ["model"])
+        self.assertEqual(os.stat(os.path.join(entry, "model", "beans.json")).st_ino, inode)
+        self.assertEqual(read(os.path.join(entry, "model", "beans.json")), "first")
+        self.assertEqual(os.listdir(os.path.dirname(entry)), [key])
+
+        # 没有meta.json的残缺缓存项会被替换
+        os.remove(os.path.join(entry, "meta.json"))
+        self.cache.store("stage", key, second, ["model"])
+        self.assertEqual(read(os.path.join(entry, "model", "beans.json")), "second")
+
+
+class TestWorkflowArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+        self.calls = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _workflow(self, name):
+        output = os.path.join(self.tmp.name, name)
+        workflow = SemanticRestorationWorkflow("/project", output, "/tools", "test", llm_client=object(),
+                                               artifact_cache_dir=self.cache_dir)
+        workflow.copy_project_path = os.path.join(output, 'project')
+        write(os.path.join(workflow.copy_project_path, "src", "A.java"), "class A {}")
+        return workflow
+
+    def _run(self, workflow, return_code=0):
+        def action():
+            self.calls.append(workflow.output_path)
+            write(os.path.join(workflow.output_path, "model", "beans.json"), workflow.output_path)
+            return return_code
+
+        command = f"java -jar /tools/anno-model-1.0.jar -p {workflow.copy_project_path} -o {workflow.output_path}/model"
+        return workflow._run_cached("project_analysis", command,
+                                    lambda: {"sources": workflow._source_tree_manifest()}, ["model"], action)
+
+    def test_reuse_across_output_dirs(self):
+        first = self._workflow("run1")
+        self.assertEqual(self._run(first), 0)
+        second = self._workflow("run2")
+        self.assertEqual(self._run(second), 0)
+
+        self.assertEqual(self.calls, [first.output_path])
+        self.assertEqual(first.artifact_cache_results, {"project_analysis": "miss"})
+        self.assertEqual(second.artifact_cache_results, {"project_analysis": "hit"})
+        self.assertEqual(read(os.path.join(second.output_path, "model", "beans.json")), first.output_path)
+
+        # 源码改变后缓存失效
+        third = self._workflow("run3")
+        write(os.path.join(third.copy_project_path, "src", "A.java"), "class A { int x; }")
+        self._run(third)
+        self.assertEqual(third.artifact_cache_results, {"project_analysis": "miss"})
+
+    def test_failed_command_not_cached(self):
+        self.assertEqual(self._run(self._workflow("run1"), return_code=1), 1)
+        self._run(self._workflow("run2"))
+        self.assertEqual(len(self.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
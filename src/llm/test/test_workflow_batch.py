@@ -0,0 +1,132 @@
+import csv
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from src.llm.workflow.batch import (BudgetedLLMClient, SharedLLMBudget, format_table, load_manifest, summarize,
+                                    write_summary)
+
+
+class CountingLLMClient:
+    def __init__(self):
+        self.model = "test-model"
+        self.active = 0
+        self.max_active = 0
+        self.starts = []
+        self.lock = threading.Lock()
+
+    def generate_completion(self, prompt, system_prompt=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.starts.append(time.time())
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return {"choices": [{"message": {"content": prompt}}]}
+
+
+class TestManifest(unittest.TestCase):
+    def _write(self, tmp, manifest):
+        path = os.path.join(tmp, "manifest.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        return path
+
+    def test_defaults_and_names(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self._write(tmp, {
+                "defaults": {"tools": "/tools", "model": "m1", "options": {"repair_attempts": 1}},
+                "projects": [{"project": "/data/mall/"},
+                             {"name": "blog", "project": "/data/blog", "model": "m2",
+                              "options": {"restoration_concurrency": 2}}],
+            })
+            entries = load_manifest(path)
+        self.assertEqual([e.name for e in entries], ["mall", "blog"])
+        self.assertEqual([e.model for e in entries], ["m1", "m2"])
+        self.assertEqual(entries[0].tools, "/tools")
+        self.assertEqual(entries[1].options, {"repair_attempts": 1, "restoration_concurrency": 2})
+
+    def test_invalid_manifest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                load_manifest(self._write(tmp, [{"project": "/a/x", "tools": "/t", "model": "m"},
+                                                {"project": "/b/x", "tools": "/t", "model": "m"}]))
+            with self.assertRaises(ValueError):
+                load_manifest(self._write(tmp, [{"project": "/a/x", "tools": "/t"}]))
+
+
+class TestSharedLLMBudget(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.manager = multiprocessing.get_context("spawn").Manager()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.manager.shutdown()
+
+    def _run(self, budget, requests=6):
+        client = CountingLLMClient()
+        budgeted = BudgetedLLMClient(client, budget)
+        threads = [threading.Thread(target=budgeted.generate_completion, args=(str(i),)) for i in range(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return client, budgeted
+
+    def test_concurrency_limit(self):
+        client, budgeted = self._run(SharedLLMBudget(self.manager, concurrency=2))
+        self.assertEqual(client.max_active, 2)
+        # 其他属性转发给被包装的客户端
+        self.assertEqual(budgeted.model, "test-model")
+
+    def test_rate_limit(self):
+        client, _ = self._run(SharedLLMBudget(self.manager, concurrency=8, requests_per_minute=600), requests=4)
+        starts = sorted(client.starts)
+        # 每分钟600次即每0.1秒一次
+        for previous, current in zip(starts, starts[1:]):
+            self.assertGreaterEqual(current - previous, 0.09)
+
+
+class TestSummary(unittest.TestCase):
+    def test_summarize_and_write(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            completed = os.path.join(tmp, "mall")
+            os.makedirs(completed)
+            with open(os.path.join(completed, "statistics.json"), 'w', encoding='utf-8') as f:
+                json.dump({"restored_files": 12, "repair": {"fix_rate": 0.5},
+                           "times": {"restoration": 30.123456, "analysis": 12.0},
+                           "before_evaluation": {"总体": {"Precision": 0.5, "Recall": 0.25, "F1": 0.3333333}},
+                           "restored_evaluation": {"总体": {"Precision": 0.6, "Recall": 0.5, "F1": 0.5454545}}}, f)
+            rows = summarize([
+                {"name": "mall", "output": completed, "status": "completed", "elapsed": 50.0},
+                {"name": "blog", "output": os.path.join(tmp, "blog"), "status": "failed", "elapsed": 3.0,
+                 "error": "failed in state restoration"},
+            ])
+            write_summary(tmp, rows)
+            with open(os.path.join(tmp, "batch_statistics.csv"), 'r', encoding='utf-8') as f:
+                csv_rows = list(csv.DictReader(f))
+            with open(os.path.join(tmp, "batch_statistics.json"), 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), rows)
+
+        self.assertEqual(rows[0]["restored_files"], 12)
+        self.assertEqual(rows[0]["restored_f1"], 0.5455)
+        self.assertEqual(rows[0]["restoration_time"], 30.1235)
+        self.assertIsNone(rows[1]["restored_files"])
+        self.assertEqual(rows[1]["error"], "failed in state restoration")
+        self.assertEqual([row["name"] for row in csv_rows], ["mall", "blog"])
+
+        table = format_table(rows).split("\n")
+        self.assertEqual(len(table), 3)
+        self.assertTrue(table[0].startswith("name"))
+        self.assertNotIn("error", table[0])
+        self.assertIn(" - ", table[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from src.llm.workflow.compiler import (IncrementalCompiler, class_file_level, parse_javac_diagnostics, pom_hash,
+                                       pom_level, source_package)
+
+# 模拟javac：-version时输出版本号，编译时按 --release/-target 生成对应主版本号的A.class
+FAKE_JAVAC = """#!{python}
+import os, sys
+args = sys.argv[1:]
+if args == ["-version"]:
+    print("javac {version}", file=sys.stderr)
+    sys.exit(0)
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "javac-args.txt"), "w") as f:
+    f.write(" ".join(args))
+level = {version_level}
+for flag in ("--release", "-target"):
+    if flag in args:
+        value = args[args.index(flag) + 1]
+        level = int(value[2:] if value.startswith("1.") else value)
+classes = args[args.index("-d") + 1]
+with open(os.path.join(classes, "com", "example", "A.class"), "wb") as f:
+    f.write(bytes.fromhex("cafebabe0000") + (level + 44).to_bytes(2, "big"))
+"""
+
+
+def class_header(level):
+    return bytes.fromhex("cafebabe0000") + (level + 44).to_bytes(2, "big")
+
+JAVAC_OUTPUT = """/work/project/src/main/java/com/example/A.java:12: error: cannot find symbol
+        foo.bar();
+           ^
+  symbol:   method bar()
+/work/project/src/main/java/com/example/A.java:20: warning: [deprecation] x() has been deprecated
+/work/project/src/main/java/com/example/B.java:3: error: ';' expected
+2 errors
+"""
+
+
+class TestIncrementalCompiler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.project = os.path.join(self.tmp.name, 'project')
+        os.makedirs(os.path.join(self.project, 'src', 'main', 'java', 'com', 'example'))
+        os.makedirs(os.path.join(self.project, 'target', 'classes', 'com', 'example'))
+        with open(os.path.join(self.project, 'pom.xml'), 'w') as f:
+            f.write("<project></project>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_javac_diagnostics(self):
+        errors = parse_javac_diagnostics(JAVAC_OUTPUT, '/work/project')
+        self.assertEqual(sorted(errors), ['src/main/java/com/example/A.java', 'src/main/java/com/example/B.java'])
+        self.assertEqual(len(errors['src/main/java/com/example/A.java']), 1)
+        self.assertTrue(errors['src/main/java/com/example/A.java'][0].startswith("12: cannot find symbol"))
+        self.assertIn("symbol:   method bar()", errors['src/main/java/com/example/A.java'][0])
+        self.assertEqual(errors['src/main/java/com/example/B.java'], ["3: ';' expected"])
+
+    def test_source_package(self):
+        self.assertEqual(source_package("// c\npackage com.example.web;\nclass A {}"), "com.example.web")
+        self.assertEqual(source_package("class A {}"), "")
+
+    def test_pom_hash(self):
+        before = pom_hash(self.project)
+        with open(os.path.join(self.project, 'pom.xml'), 'w') as f:
+            f.write("<project><dependencies/></project>")
+        self.assertNotEqual(before, pom_hash(self.project))
+
+    def test_remove_stale_classes(self):
+        source = os.path.join('src', 'main', 'java', 'com', 'example', 'A.java')
+        with open(os.path.join(self.project, source), 'w') as f:
+            f.write("package com.example;\nclass A {}")
+        classes = os.path.join(self.project, 'target', 'classes', 'com', 'example')
+        for name in ('A.class', 'A$Inner.class', 'AB.class'):
+            open(os.path.join(classes, name), 'w').close()
+        compiler = IncrementalCompiler(self.project, os.path.join(self.tmp.name, 'cache'))
+        compiler.remove_stale_classes(source)
+        self.assertEqual(os.listdir(classes), ['AB.class'])
+
+    def _fake_javac(self, script):
+        path = os.path.join(self.tmp.name, 'javac')
+        with open(path, 'w') as f:
+            f.write("#!/bin/sh\n" + script)
+        os.chmod(path, 0o755)
+        return path
+
+    def test_stale_classes_kept_until_success(self):
+        source = os.path.join('src', 'main', 'java', 'com', 'example', 'A.java')
+        with open(os.path.join(self.project, source), 'w') as f:
+            f.write("package com.example;\nclass A {}")
+        classes = os.path.join(self.project, 'target', 'classes', 'com', 'example')
+        for name in ('A.class', 'A$Old.class'):
+            open(os.path.join(classes, name), 'w').close()
+
+        failing = self._fake_javac(f'echo "{os.path.join(self.project, source)}:2: error: bad"; exit 1')
+        result = IncrementalCompiler(self.project, os.path.join(self.tmp.name, 'cache'), javac=failing).compile([source])
+        self.assertFalse(result.success)
+        self.assertEqual(list(result.errors), [source])
+        # 编译失败时旧的class文件放回，其他文件仍可针对它们编译
+        self.assertEqual(sorted(os.listdir(classes)), ['A$Old.class', 'A.class'])
+
+        passing = self._fake_javac('touch "$6/com/example/A.class"')
+        result = IncrementalCompiler(self.project, os.path.join(self.tmp.name, 'cache'), javac=passing).compile([source])
+        self.assertTrue(result.success)
+        self.assertEqual(os.listdir(classes), ['A.class'])
+
+    def _write_fake_javac(self, version):
+        path = os.path.join(self.tmp.name, 'javac')
+        level = int(version.split('.')[1] if version.startswith("1.") else version.split('.')[0])
+        with open(path, 'w') as f:
+            f.write(FAKE_JAVAC.format(python=sys.executable, version=version, version_level=level))
+        os.chmod(path, 0o755)
+        return path
+
+    def _prepare_release_project(self, compiler, level):
+        source = os.path.join('src', 'main', 'java', 'com', 'example', 'A.java')
+        with open(os.path.join(self.project, source), 'w') as f:
+            f.write("package com.example;\nclass A {}")
+        # Maven按pom的编译级别生成的其他类
+        with open(os.path.join(self.project, 'target', 'classes', 'com', 'example', 'B.class'), 'wb') as f:
+            f.write(class_header(level))
+        with open(compiler.classpath_file, 'w') as f:
+            f.write("")
+        return source
+
+    def test_compile_matches_maven_release(self):
+        compiler = IncrementalCompiler(self.project, os.path.join(self.tmp.name, 'cache'),
+                                       javac=self._write_fake_javac("17.0.2"))
+        source = self._prepare_release_project(compiler, 8)
+        result = compiler.compile([source])
+        self.assertTrue(result.success)
+        self.assertEqual(result.release, 8)
+        classes = os.path.join(self.project, 'target', 'classes', 'com', 'example')
+        # 新生成的class文件与Maven的产物版本一致（主版本号52），而不是JDK默认的61
+        self.assertEqual(class_file_level(os.path.join(classes, 'A.class')), 8)
+        with open(os.path.join(self.tmp.name, 'javac-args.txt')) as f:
+            self.assertIn("--release 8", f.read())
+
+    def test_compile_release_with_jdk8_javac(self):
+        compiler = IncrementalCompiler(self.project, os.path.join(self.tmp.name, 'cache'),
+                                       javac=self._write_fake_javac("1.8.0_292"))
+        source = self._prepare_release_project(compiler, 7)
+        self.assertTrue(compiler.compile([source]).success)
+        with open(os.path.join(self.tmp.name, 'javac-args.txt')) as f:
+            self.assertIn("-source 1.7 -target 1.7", f.read())
+        self.assertEqual(class_file_level(os.path.join(self.project, 'target', 'classes', 'com', 'example', 'A.class')), 7)
+
+    @unittest.skipUnless(shutil.which("javac"), "javac not available")
+    def test_real_javac_release(self):
+        compiler = IncrementalCompiler(self.project, os.path.join(self.tmp.name, 'cache'))
+        version = subprocess.run([compiler.javac, "-version"], capture_output=True, text=True)
+        if compiler.javac_level() is None or compiler.javac_level() < 9:
+            self.skipTest(f"javac does not support --release: {version.stderr or version.stdout}")
+        source = self._prepare_release_project(compiler, 8)
+        result = compiler.compile([source])
+        self.assertTrue(result.success, result.output)
+        self.assertEqual(class_file_level(os.path.join(self.project, 'target', 'classes', 'com', 'example', 'A.class')), 8)
+
+    def test_pom_level(self):
+        self.assertIsNone(pom_level(self.project))
+        with open(os.path.join(self.project, 'pom.xml'), 'w') as f:
+            f.write("<project><properties><java.version>1.8</java.version>"
+                    "<maven.compiler.source>${java.version}</maven.compiler.source></properties></project>")
+        self.assertEqual(pom_level(self.project), 8)
+        with open(os.path.join(self.project, 'pom.xml'), 'w') as f:
+            f.write("<project><build><plugins><plugin><artifactId>maven-compiler-plugin</artifactId>"
+                    "<configuration><release>11</release></configuration></plugin></plugins></build></project>")
+        self.assertEqual(pom_level(self.project), 11)
+
+    def test_fallback_without_classpath(self):
+        compiler = IncrementalCompiler(self.project, os.path.join(self.tmp.name, 'cache'), javac='/usr/bin/javac')
+        self.assertFalse(compiler.can_compile_incrementally())
+        with open(compiler.classpath_file, 'w') as f:
+            f.write("/m2/a.jar")
+        self.assertTrue(compiler.can_compile_incrementally())
+        self.assertEqual(compiler.cached_classpath(), "/m2/a.jar")
+        # pom.xml改变后缓存失效
+        with open(os.path.join(self.project, 'pom.xml'), 'w') as f:
+            f.write("<project><dependencies/></project>")
+        self.assertFalse(compiler.can_compile_incrementally())
+
+
+if __name__ == '__main__':
+    unittest.main()
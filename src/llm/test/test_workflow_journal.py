@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.llm.workflow.journal import JOURNAL_FILE
+from src.llm.workflow.state import WorkflowState
+from src.llm.workflow.workflow import SemanticRestorationWorkflow
+
+
+class RecordingLLMClient:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.prompts = []
+
+    def generate_completion(self, prompt, system_prompt=None):
+        self.prompts.append(prompt)
+        if prompt == self.fail_on:
+            raise RuntimeError("API error")
+        return {"choices": [{"message": {"content": f"class {prompt} {{}}"}}]}
+
+
+class StubWorkflow(SemanticRestorationWorkflow):
+    """外部工具阶段只生成产物文件，用于验证状态日志与恢复"""
+    files = [f"A{i}" for i in range(4)]
+
+    def _execute_init(self, copy=True, baseline=True):
+        self.copy_project_path = os.path.join(self.output_path, 'project')
+        os.makedirs(self.copy_project_path, exist_ok=True)
+        self.state = WorkflowState.PROJECT_ANALYSIS
+        if baseline:
+            self._execute_static_analysis(before=True, change_state=False)
+            self._execute_evaluation(before=True, change_state=False)
+
+    def _execute_project_analysis(self, change_state=True):
+        self.modeling_result_path = os.path.join(self.output_path, 'model')
+        os.makedirs(self.modeling_result_path, exist_ok=True)
+        self.times["project_analysis"] += 1.0
+        if change_state:
+            self.state = WorkflowState.CODE_INDEXING
+
+    def _execute_code_indexing(self, change_state=True):
+        self.code_indexing_result_path = os.path.join(self.output_path, 'code_indexing')
+        os.makedirs(self.code_indexing_result_path, exist_ok=True)
+        if change_state:
+            self.state = WorkflowState.RESTORATION
+
+    def _collect_restoration_tasks(self):
+        return [(f"{name}.java", name) for name in self.files]
+
+    def _execute_compilation(self, files=None):
+        pass
+
+    def _execute_static_analysis(self, before=False, change_state=True):
+        name = 'detected_result_before.json' if before else 'detected_result_restore.json'
+        self.detected_result_path = os.path.join(self.output_path, name)
+        with open(self.detected_result_path, 'w') as f:
+            f.write("{}")
+        if change_state:
+            self.state = WorkflowState.EVALUATION
+
+    def _execute_evaluation(self, before=False, change_state=True):
+        if before:
+            with open(os.path.join(self.output_path, 'before_evaluation_results.json'), 'w') as f:
+                f.write("{}")
+        if change_state:
+            self.state = WorkflowState.COMPLETED
+
+    def _statistic(self):
+        pass
+
+
+class TestWorkflowJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _failed_run(self):
+        workflow = StubWorkflow("/project", self.output, "/tools", "test", restoration_concurrency=1,
+                                llm_client=RecordingLLMClient(fail_on="A3"))
+        workflow.run()
+        self.assertEqual(workflow.state, WorkflowState.FAILED)
+        return workflow
+
+    def test_journal_after_failure(self):
+        self._failed_run()
+        with open(os.path.join(self.output, JOURNAL_FILE), 'r', encoding='utf-8') as f:
+            journal = json.load(f)
+        self.assertEqual(journal["state"], "restoration")
+        self.assertEqual(journal["failure"]["state"], "restoration")
+        self.assertEqual(sorted(journal["completed_stages"]), ["code_indexing", "init", "project_analysis"])
+        self.assertEqual({f: r["status"] for f, r in journal["files"].items()},
+                         {"A0.java": "restored", "A1.java": "restored", "A2.java": "restored", "A3.java": "failed"})
+        self.assertEqual(journal["times"]["project_analysis"], 1.0)
+
+    def test_resume_restoration(self):
+        self._failed_run()
+        llm_client = RecordingLLMClient()
+        workflow = StubWorkflow.resume(self.output, llm_client=llm_client)
+        self.assertEqual(workflow.state, WorkflowState.RESTORATION)
+        workflow.run()
+
+        self.assertEqual(workflow.state, WorkflowState.COMPLETED)
+        # 已写回的文件不再请求LLM
+        self.assertEqual(llm_client.prompts, ["A3"])
+        self.assertEqual(workflow.restored_files, ["A0.java", "A1.java", "A2.java", "A3.java"])
+        self.assertEqual([r.get("resumed", False) for r in workflow.restoration_results], [True, True, True, False])
+        self.assertEqual(workflow.times["project_analysis"], 1.0)
+
+        # 已完成的工作流恢复后不再执行任何阶段
+        completed = StubWorkflow.resume(self.output, llm_client=RecordingLLMClient())
+        self.assertEqual(completed.state, WorkflowState.COMPLETED)
+
+    def test_resume_with_missing_artifacts(self):
+        self._failed_run()
+        shutil.rmtree(os.path.join(self.output, 'model'))
+        workflow = StubWorkflow.resume(self.output, llm_client=RecordingLLMClient())
+        # 工作副本已有还原结果，需从复制项目重新开始
+        self.assertEqual(workflow.state, WorkflowState.INIT)
+        self.assertEqual(workflow.file_status, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
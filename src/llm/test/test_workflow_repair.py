@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+from src.llm.workflow.compiler import CompileResult
+from src.llm.workflow.state import WorkflowState
+from src.llm.workflow.workflow import MAX_REPAIR_DIAGNOSTICS, SemanticRestorationWorkflow, build_repair_prompt
+
+
+class FakeCompiler:
+    """文件内容包含broken时编译失败"""
+
+    def __init__(self, project_path):
+        self.project_path = project_path
+        self.calls = []
+
+    def can_compile_incrementally(self):
+        return True
+
+    def compile(self, files):
+        self.calls.append(list(files))
+        errors = {}
+        for file in files:
+            with open(os.path.join(self.project_path, file), 'r', encoding='utf-8') as f:
+                if "broken" in f.read():
+                    errors[file] = ["1: cannot find symbol"]
+        return CompileResult(not errors, "javac", list(files), 0.01, errors)
+
+
+class RepairingLLMClient:
+    """还原时按提示词返回内容；修复时只有fixable中的文件能被修好"""
+
+    def __init__(self, restorations, fixable):
+        self.restorations = restorations
+        self.fixable = fixable
+        self.repair_prompts = []
+
+    def generate_completion(self, prompt, system_prompt=None):
+        if prompt in self.restorations:
+            content = self.restorations[prompt]
+        else:
+            self.repair_prompts.append(prompt)
+            file = prompt.split("\n")[0][len("文件: "):]
+            content = "class Fixed {}" if file in self.fixable else "class Still { broken }"
+        return {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+
+
+class RepairWorkflow(SemanticRestorationWorkflow):
+    def __init__(self, tmp, llm_client, repair_attempts=2):
+        project = os.path.join(tmp, 'original')
+        super().__init__(project, os.path.join(tmp, 'output'), tmp, "test", llm_client=llm_client,
+                         restoration_concurrency=1, repair_attempts=repair_attempts)
+        os.makedirs(project)
+        for name in ("A", "B", "C"):
+            with open(os.path.join(project, f"{name}.java"), 'w', encoding='utf-8') as f:
+                f.write(f"class {name} {{}}")
+        self.copy_project_path = os.path.join(self.output_path, 'project')
+        os.makedirs(self.copy_project_path)
+        self.compiler = FakeCompiler(self.copy_project_path)
+        self.state = WorkflowState.RESTORATION
+
+    def _collect_restoration_tasks(self):
+        return [(f"{name}.java", name) for name in ("A", "B", "C")]
+
+
+class TestCompileRepair(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.llm_client = RepairingLLMClient({"A": "class A { ok }", "B": "class B { broken }",
+                                              "C": "class C { broken }"}, fixable={"B.java"})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _read(self, workflow, file):
+        with open(os.path.join(workflow.copy_project_path, file), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_repair_and_revert(self):
+        workflow = RepairWorkflow(self.tmp.name, self.llm_client)
+        workflow._execute_restoration()
+
+        self.assertEqual(workflow.state, WorkflowState.ANALYSIS)
+        self.assertEqual(self._read(workflow, "B.java"), "class Fixed {}")
+        # 修复失败的文件回退为原始文件
+        self.assertEqual(self._read(workflow, "C.java"), "class C {}")
+        self.assertEqual(workflow.restored_files, ["A.java", "B.java"])
+        self.assertEqual([r["status"] for r in workflow.restoration_results], ["restored", "restored", "reverted"])
+        # 整体编译失败后先编译无错误的文件，之后每次只编译正在修复的文件
+        self.assertEqual(workflow.compiler.calls,
+                         [["A.java", "B.java", "C.java"], ["A.java"], ["B.java"], ["C.java"], ["C.java"],
+                          ["C.java"]])
+        # 提示词只包含出错文件本身及其错误
+        self.assertEqual(len(self.llm_client.repair_prompts), 3)
+        self.assertTrue(all("class A" not in prompt for prompt in self.llm_client.repair_prompts))
+
+        statistics = workflow._repair_statistics()
+        self.assertEqual((statistics["attempted"], statistics["fixed"], statistics["reverted"]), (2, 1, 1))
+        self.assertEqual(statistics["fix_rate"], 0.5)
+        self.assertEqual(statistics["llm_requests"], 3)
+        self.assertEqual(statistics["prompt_tokens"], 30)
+        self.assertEqual([r.get("repair") for r in workflow.compilations],
+                         [None, None, "B.java", "C.java", "C.java", "C.java"])
+
+    def test_repair_disabled(self):
+        workflow = RepairWorkflow(self.tmp.name, self.llm_client, repair_attempts=0)
+        workflow._execute_restoration()
+        self.assertEqual(workflow.state, WorkflowState.FAILED)
+        self.assertEqual(self.llm_client.repair_prompts, [])
+
+    def test_build_repair_prompt(self):
+        errors = [f"{i}: error" for i in range(MAX_REPAIR_DIAGNOSTICS + 5)]
+        prompt = build_repair_prompt("A.java", "class A {}", errors)
+        self.assertTrue(prompt.startswith("文件: A.java\n"))
+        self.assertIn("另有 5 个错误", prompt)
+        self.assertNotIn(f"{MAX_REPAIR_DIAGNOSTICS}: error", prompt)
+        self.assertIn("class A {}", prompt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from src.llm.workflow.state import WorkflowState
+from src.llm.workflow.workflow import SemanticRestorationWorkflow, needs_restoration
+
+
+class SleepingLLMClient:
+    """按提示词中给出的秒数延迟返回，模拟LLM请求耗时"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def generate_completion(self, prompt, system_prompt=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            name, delay = prompt.split(':')
+            time.sleep(float(delay))
+            if name == self.fail_on:
+                raise RuntimeError("API error")
+            return {"choices": [{"message": {"content": f"```java\nclass {name} {{}}\n```"}}]}
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class FakeWorkflow(SemanticRestorationWorkflow):
+    def __init__(self, output_path, tasks, llm_client, concurrency):
+        super().__init__(output_path, output_path, output_path, "test", restoration_concurrency=concurrency,
+                         llm_client=llm_client)
+        self.copy_project_path = os.path.join(output_path, 'project')
+        self.tasks = tasks
+        self.state = WorkflowState.RESTORATION
+
+    def _collect_restoration_tasks(self):
+        return self.tasks
+
+    def _execute_compilation(self, files=None):
+        self.compiled_files = files
+
+
+class TestWorkflowRestoration(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tasks = [(f"src/A{i}.java", f"A{i}:{0.05 * (i % 3 + 1)}") for i in range(8)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_concurrent_restoration(self):
+        llm_client = SleepingLLMClient()
+        workflow = FakeWorkflow(self.tmp.name, self.tasks, llm_client, concurrency=8)
+        start_time = time.time()
+        workflow._execute_restoration()
+        elapsed = time.time() - start_time
+
+        self.assertEqual(workflow.state, WorkflowState.ANALYSIS)
+        # 总耗时接近最慢的单个文件，而不是所有文件之和（约1.0秒）
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(llm_client.max_active, 8)
+        self.assertEqual([r["file"] for r in workflow.restoration_results], [file for file, _ in self.tasks])
+        self.assertEqual(workflow.restored_files, [file for file, _ in self.tasks])
+        self.assertEqual(workflow.compiled_files, workflow.restored_files)
+        with open(os.path.join(self.tmp.name, 'project', 'src', 'A3.java'), 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), "class A3 {}")
+
+    def test_concurrency_limit_and_failure(self):
+        llm_client = SleepingLLMClient(fail_on="A0")
+        workflow = FakeWorkflow(self.tmp.name, self.tasks, llm_client, concurrency=2)
+        workflow._execute_restoration()
+
+        self.assertEqual(workflow.state, WorkflowState.FAILED)
+        self.assertLessEqual(llm_client.max_active, 2)
+        statuses = {r["file"]: r["status"] for r in workflow.restoration_results}
+        self.assertEqual(statuses["src/A0.java"], "failed")
+        self.assertEqual(statuses["src/A7.java"], "cancelled")
+
+    def test_needs_restoration(self):
+        self.assertFalse(needs_restoration({}))
+        self.assertFalse(needs_restoration({"modeling_data": {"aop_data": [], "ioc_data": []}}))
+        self.assertTrue(needs_restoration({"modeling_data": {"aop_data": [{}], "ioc_data": []}}))
+        self.assertTrue(needs_restoration({"modeling_data": {"aop_data": [], "ioc_data": [{}]}}))
+
+
+if __name__ == '__main__':
+    unittest.main()
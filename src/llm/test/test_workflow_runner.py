@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from src.llm.workflow import runner
+from src.llm.workflow.runner import run_command
+
+
+class TestRunCommand(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmp.name, "logs", "stage.log")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_streams_to_log_and_keeps_tail(self):
+        command = f"{sys.executable} -c \"import sys; [print('line', i) for i in range(5000)]; print('err', file=sys.stderr)\""
+        result = run_command(command, cwd=self.tmp.name, log_file=self.log_file, tail_bytes=100)
+        self.assertEqual(result.returncode, 0)
+        self.assertIsNone(result.timed_out)
+        self.assertLessEqual(len(result.stdout), 100)
+        self.assertTrue(result.stdout.endswith("line 4999\n"))
+        self.assertEqual(result.stderr, "err\n")
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            log = f.read()
+        self.assertTrue(log.startswith(f"$ {command}\n"))
+        self.assertIn("line 0\n", log)
+        self.assertIn("line 4999\n", log)
+
+        # 同一阶段的日志追加写入
+        run_command(["echo", "second"], log_file=self.log_file)
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            self.assertTrue(f.read().endswith("$ echo second\nsecond\n"))
+
+    def test_resource_usage_and_exit_status(self):
+        result = run_command(f"{sys.executable} -c \"x = bytearray(64 * 1024 * 1024); exit(3)\"")
+        self.assertEqual(result.returncode, 3)
+        if hasattr(os, "wait4"):
+            self.assertGreater(result.max_rss_mb, 60)
+            self.assertIsNotNone(result.user_cpu)
+            self.assertIsNotNone(result.sys_cpu)
+        self.assertEqual(result.to_dict()["returncode"], 3)
+        self.assertNotEqual(run_command(["/nonexistent/tool"]).returncode, 0)
+
+    def test_idle_timeout(self):
+        start_time = time.time()
+        result = run_command("echo started; sleep 30", log_file=self.log_file, idle_timeout=0.3)
+        self.assertLess(time.time() - start_time, 5)
+        self.assertEqual(result.timed_out, "idle")
+        self.assertNotEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, "started\n")
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            self.assertIn("[timed out: idle]", f.read())
+
+    def test_wall_timeout_kills_process_group(self):
+        grace = runner.KILL_GRACE_SECONDS
+        runner.KILL_GRACE_SECONDS = 0.2
+        try:
+            start_time = time.time()
+            # 忽略SIGTERM且持续输出的进程：空闲超时不会触发，总时长超时后SIGKILL
+            result = run_command("trap '' TERM; while true; do echo tick; sleep 0.05; done",
+                                 timeout=0.5, idle_timeout=10)
+        finally:
+            runner.KILL_GRACE_SECONDS = grace
+        self.assertLess(time.time() - start_time, 3)
+        self.assertEqual(result.timed_out, "wall")
+        self.assertIn("tick", result.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import time
+import unittest
+
+from src.llm.workflow.scheduler import Stage, StageScheduler
+
+
+def sleeper(seconds):
+    return lambda: time.sleep(seconds)
+
+
+def failing():
+    raise RuntimeError("tool crashed")
+
+
+class TestStageScheduler(unittest.TestCase):
+    def _independent_stages(self, scheduler, cpus):
+        scheduler.add(Stage("init", sleeper(0.01)))
+        for name in ("model", "index", "baseline"):
+            scheduler.add(Stage(name, sleeper(0.2), ("init",), cpus=cpus))
+        scheduler.add(Stage("restore", sleeper(0.01), ("model", "index", "baseline")))
+
+    def test_independent_stages_run_concurrently(self):
+        scheduler = StageScheduler(cpu_budget=8, memory_budget_mb=None)
+        self._independent_stages(scheduler, cpus=2)
+        start_time = time.time()
+        results = scheduler.run()
+        self.assertLess(time.time() - start_time, 0.45)
+        self.assertTrue(all(r.status == "completed" for r in results.values()))
+        # 依赖全部完成后才开始
+        self.assertGreaterEqual(results["restore"].start, max(results[n].end for n in ("model", "index", "baseline")))
+        self.assertGreaterEqual(results["model"].start, results["init"].end)
+
+    def test_cpu_budget(self):
+        scheduler = StageScheduler(cpu_budget=2, memory_budget_mb=None)
+        self._independent_stages(scheduler, cpus=2)
+        results = scheduler.run()
+        spans = sorted((results[n].start, results[n].end) for n in ("model", "index", "baseline"))
+        for (_, end), (start, _) in zip(spans, spans[1:]):
+            self.assertGreaterEqual(start, end)
+
+    def test_memory_budget_and_oversized_stage(self):
+        scheduler = StageScheduler(cpu_budget=8, memory_budget_mb=1000)
+        scheduler.add(Stage("a", sleeper(0.1), memory_mb=600))
+        scheduler.add(Stage("b", sleeper(0.1), memory_mb=600))
+        # 超过预算的阶段在其他阶段结束后单独运行
+        scheduler.add(Stage("c", sleeper(0.01), memory_mb=4000))
+        results = scheduler.run()
+        self.assertTrue(all(r.status == "completed" for r in results.values()))
+        self.assertGreaterEqual(results["b"].start, results["a"].end)
+        self.assertGreaterEqual(results["c"].start, results["b"].end)
+
+    def test_failure_skips_dependents(self):
+        scheduler = StageScheduler(cpu_budget=8, memory_budget_mb=None)
+        scheduler.add(Stage("init", sleeper(0.01)))
+        scheduler.add(Stage("model", failing, ("init",)))
+        scheduler.add(Stage("baseline", sleeper(0.1), ("init",)))
+        scheduler.add(Stage("restore", sleeper(0.01), ("model", "baseline")))
+        results = scheduler.run()
+        self.assertEqual(results["model"].status, "failed")
+        self.assertEqual(results["model"].error, "tool crashed")
+        # 已在运行的阶段正常结束
+        self.assertEqual(results["baseline"].status, "completed")
+        self.assertEqual(results["restore"].status, "skipped")
+
+    def test_invalid_graph(self):
+        scheduler = StageScheduler()
+        scheduler.add(Stage("a", sleeper(0), ("b",)))
+        scheduler.add(Stage("b", sleeper(0), ("a",)))
+        with self.assertRaises(ValueError):
+            scheduler.run()
+        scheduler = StageScheduler()
+        scheduler.add(Stage("a", sleeper(0), ("missing",)))
+        with self.assertRaises(ValueError):
+            scheduler.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from src.llm.workflow.workspace import Workspace
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class TestWorkspace(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, "source")
+        self.target = os.path.join(self.tmp.name, "output", "project")
+        write(os.path.join(self.source, "pom.xml"), "<project/>")
+        write(os.path.join(self.source, "src", "main", "java", "A.java"), "class A {}")
+        write(os.path.join(self.source, ".git", "HEAD"), "ref: refs/heads/master")
+        write(os.path.join(self.source, "target", "classes", "A.class"), "binary")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_create_skips_ignored_dirs(self):
+        stats = Workspace(self.source, self.target, mode="hardlink").create()
+        self.assertEqual(stats.files, 2)
+        self.assertEqual(stats.skipped_dirs, 2)
+        self.assertEqual(stats.hardlinked + stats.copied, 2)
+        self.assertEqual(stats.source_bytes, len("<project/>") + len("class A {}"))
+        self.assertEqual(read(os.path.join(self.target, "src", "main", "java", "A.java")), "class A {}")
+        self.assertFalse(os.path.exists(os.path.join(self.target, ".git")))
+        self.assertFalse(os.path.exists(os.path.join(self.target, "target")))
+
+    def test_materialize_protects_source(self):
+        workspace = Workspace(self.source, self.target, mode="hardlink")
+        workspace.create()
+        file = os.path.join("src", "main", "java", "A.java")
+        path = workspace.materialize(file)
+        write(path, "class A { int restored; }")
+
+        self.assertEqual(read(os.path.join(self.source, file)), "class A {}")
+        self.assertEqual(read(path), "class A { int restored; }")
+        self.assertEqual(os.stat(path).st_nlink, 1)
+        self.assertEqual(workspace.stats.materialized, 1 if workspace.stats.hardlinked else 0)
+        # 新文件不需要materialize
+        self.assertIsNone(workspace.materialize("B.java"))
+
+    def test_recreate_and_copy_mode(self):
+        Workspace(self.source, self.target, mode="hardlink").create()
+        write(os.path.join(self.target, "stale.txt"), "stale")
+        stats = Workspace(self.source, self.target, mode="copy").create()
+        self.assertFalse(os.path.exists(os.path.join(self.target, "stale.txt")))
+        self.assertEqual(stats.copied, 2)
+        self.assertEqual(stats.copied_bytes, stats.source_bytes)
+        self.assertEqual(os.stat(os.path.join(self.target, "pom.xml")).st_nlink, 1)
+
+    def test_auto_mode(self):
+        stats = Workspace(self.source, self.target).create()
+        self.assertEqual(stats.reflinked + stats.hardlinked + stats.copied, 2)
+        self.assertIn(stats.mode, ("reflink", "hardlink", "copy"))
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            Workspace(self.source, self.target, mode="symlink")
+
+
+if __name__ == '__main__':
+    unittest.main()
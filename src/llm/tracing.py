@@ -0,0 +1,178 @@
+"""
+轻量级追踪
+
+记录带属性（文件、模型、token数、返回码等）的嵌套span，导出为Chrome trace / Perfetto可直接打开的JSON
+（chrome://tracing 或 https://ui.perfetto.dev）。同一线程内的span按调用栈嵌套，线程池中的span显示在各自的线程上。
+
+用法:
+    tracer = Tracer()
+    previous = set_tracer(tracer)
+    with span("restore_file", "restoration", file="A.java") as s:
+        ...
+        s.set(status="restored")
+    set_tracer(previous)
+    tracer.export_chrome("trace.json")
+
+没有激活的Tracer时span()不做任何记录，库代码（如LLMClient）可以无条件调用。
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+_active: Optional["Tracer"] = None
+_local = threading.local()
+
+
+class Span:
+    """一段计时区间，start/end为相对Tracer创建时刻的秒数"""
+    __slots__ = ("id", "parent", "name", "category", "attrs", "start", "end", "thread")
+
+    def __init__(self, span_id: int, parent: Optional[int], name: str, category: str, attrs: Dict[str, Any],
+                 start: float, thread: int):
+        self.id = span_id
+        self.parent = parent
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.start = start
+        self.end = start
+        self.thread = thread
+
+    def set(self, **attrs):
+        """补充属性，如返回码、token数"""
+        self.attrs.update(attrs)
+
+    @property
+    def elapsed(self) -> float:
+        return self.end - self.start
+
+
+class _NullSpan:
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class Tracer:
+    """收集span，线程安全"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # 线程标识 -> (顺序编号, 线程名)，导出时使用较小的tid
+        self._threads: Dict[int, tuple] = {}
+
+    def _thread(self) -> int:
+        ident = threading.get_ident()
+        with self._lock:
+            if ident not in self._threads:
+                self._threads[ident] = (len(self._threads) + 1, threading.current_thread().name)
+            return self._threads[ident][0]
+
+    @contextmanager
+    def span(self, name: str, category: str = "workflow", **attrs):
+        """
+        记录一个span，异常时记录error属性后继续抛出
+
+        参数:
+            name: span名称
+            category: 分类，如 stage、restoration、llm、subprocess
+            attrs: 属性
+        """
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        parent = stack[-1].id if stack else None
+        current = Span(next(self._ids), parent, name, category, dict(attrs), time.perf_counter() - self.origin,
+                       self._thread())
+        stack.append(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.attrs["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            current.end = time.perf_counter() - self.origin
+            stack.pop()
+            with self._lock:
+                self.spans.append(current)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """按分类汇总span数量与总耗时（秒）"""
+        result: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            item = result.setdefault(s.category, {"count": 0, "total": 0.0})
+            item["count"] += 1
+            item["total"] = round(item["total"] + s.elapsed, 3)
+        return result
+
+    def to_chrome(self) -> dict:
+        """转换为Chrome trace事件格式（完整事件ph=X，时间单位微秒）"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: (s.start, -s.end))
+            threads = list(self._threads.values())
+        events = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in threads]
+        for s in spans:
+            args = {key: _json_value(value) for key, value in s.attrs.items()}
+            args["span_id"] = s.id
+            if s.parent is not None:
+                args["parent_id"] = s.parent
+            events.append({"name": s.name, "cat": s.category, "ph": "X", "pid": self.pid, "tid": s.thread,
+                           "ts": round(s.start * 1e6, 1), "dur": round(s.elapsed * 1e6, 1), "args": args})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome(self, path: str):
+        """导出Chrome trace / Perfetto JSON"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome(), f, ensure_ascii=False)
+
+
+def set_tracer(tracer: Optional[Tracer]) -> Optional[Tracer]:
+    """激活tracer（None表示关闭），返回之前激活的tracer"""
+    global _active
+    previous = _active
+    _active = tracer
+    return previous
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _active
+
+
+@contextmanager
+def span(name: str, category: str = "workflow", **attrs):
+    """在当前激活的tracer上记录span，没有激活的tracer时返回不做记录的span"""
+    tracer = _active
+    if tracer is None:
+        yield NULL_SPAN
+        return
+    with tracer.span(name, category, **attrs) as current:
+        yield current
+
+
+def traced(fn: Callable, name: str, category: str = "workflow", **attrs) -> Callable:
+    """包装函数，每次调用记录一个span，用于提交到线程池或调度器的任务"""
+    def wrapper(*args, **kwargs):
+        with span(name, category, **attrs):
+            return fn(*args, **kwargs)
+    return wrapper
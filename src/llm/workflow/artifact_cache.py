@@ -0,0 +1,157 @@
+"""
+阶段产物缓存
+
+anno-model建模、code-index索引、原始项目的污点分析及其评估都只取决于项目源码、工具jar和命令行，
+源码不变时重复执行只是浪费时间。产物缓存以输入的哈希为键（源码树清单、jar校验和、归一化后的命令行），
+命中时直接把上一次的产物（model/、code_indexing/、detected_result_before.json、before_*）复制回输出目录。
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, List, Optional
+
+from src.llm.workflow.workspace import DEFAULT_IGNORED_DIRS
+
+logger = logging.getLogger("workflow_artifact_cache")
+
+META_FILE = "meta.json"
+
+
+def file_checksum(path: str) -> str:
+    """文件内容的sha256，文件不存在时返回空字符串"""
+    if not os.path.isfile(path):
+        return ""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def tree_manifest(root: str, ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS) -> str:
+    """
+    源码树清单的哈希：按相对路径排序的(路径, 内容sha256)，跳过.git、target等目录
+
+    参数:
+        root: 项目目录
+        ignored_dirs: 不计入清单的目录名
+
+    返回:
+        清单的sha256
+    """
+    ignored = set(ignored_dirs)
+    entries = []
+    for current, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in ignored]
+        for name in files:
+            path = os.path.join(current, name)
+            entries.append(f"{os.path.relpath(path, root)}\0{file_checksum(path)}")
+    digest = hashlib.sha256()
+    for entry in sorted(entries):
+        digest.update(entry.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def _copy(source: str, target: str):
+    if os.path.isdir(target) and not os.path.islink(target):
+        shutil.rmtree(target)
+    elif os.path.lexists(target):
+        os.remove(target)
+    if os.path.isdir(source):
+        shutil.copytree(source, target)
+    else:
+        shutil.copy2(source, target)
+
+
+class ArtifactCache:
+    """
+    用法:
+        cache = ArtifactCache("artifact_cache")
+        key = cache.key("project_analysis", command, {"sources": manifest, "jar": checksum})
+        if not cache.restore("project_analysis", key, output_path):
+            run_tool()
+            cache.store("project_analysis", key, output_path, ["model"])
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = os.path.abspath(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(stage: str, command: str, inputs: Dict[str, str]) -> str:
+        """阶段名、命令行与各输入哈希共同决定的缓存键"""
+        payload = json.dumps({"stage": stage, "command": command, "inputs": inputs}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry(self, stage: str, key: str) -> str:
+        return os.path.join(self.cache_dir, stage, key)
+
+    def restore(self, stage: str, key: str, output_path: str) -> bool:
+        """
+        命中时把缓存的产物复制到output_path
+
+        返回:
+            是否命中
+        """
+        entry = self._entry(stage, key)
+        meta_path = os.path.join(entry, META_FILE)
+        if not os.path.isfile(meta_path):
+            return False
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        for name in meta["outputs"]:
+            _copy(os.path.join(entry, name), os.path.join(output_path, name))
+        logger.info(f"Artifact cache hit: {stage} ({key[:12]}): {', '.join(meta['outputs'])}")
+        return True
+
+    def store(self, stage: str, key: str, output_path: str, patterns: List[str]) -> Optional[List[str]]:
+        """
+        缓存output_path下匹配patterns的产物
+
+        参数:
+            stage: 阶段名
+            key: 缓存键
+            output_path: 产物所在的输出目录
+            patterns: 相对output_path的产物路径或通配符，如 model、before_*
+
+        返回:
+            缓存的产物名；没有任何产物时不缓存，返回None
+        """
+        outputs = sorted({os.path.relpath(path, output_path)
+                          for pattern in patterns for path in glob.glob(os.path.join(output_path, pattern))})
+        if not outputs:
+            logger.warning(f"No artifacts to cache for stage {stage}: {patterns}")
+            return None
+        entry = self._entry(stage, key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # 先写入临时目录，最后写meta.json并整体重命名，中断时不会留下不完整的缓存项
+        temp_entry = tempfile.mkdtemp(dir=os.path.dirname(entry), prefix=f".{key[:12]}-")
+        try:
+            for name in outputs:
+                _copy(os.path.join(output_path, name), os.path.join(temp_entry, name))
+            with open(os.path.join(temp_entry, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({"stage": stage, "outputs": outputs}, f, indent=2)
+            # 批量运行时其他进程可能已写入相同的缓存项并正在restore，保留已完整的缓存项，丢弃本次的临时目录
+            if os.path.isfile(os.path.join(entry, META_FILE)):
+                logger.info(f"Artifact cache entry already stored: {stage} ({key[:12]})")
+                return outputs
+            if os.path.exists(entry):
+                # 没有meta.json的残缺缓存项
+                shutil.rmtree(entry, ignore_errors=True)
+            try:
+                os.replace(temp_entry, entry)
+            except OSError:
+                # 其他进程同时写入了相同的缓存项
+                if not os.path.isfile(os.path.join(entry, META_FILE)):
+                    raise
+        finally:
+            if os.path.exists(temp_entry):
+                shutil.rmtree(temp_entry)
+        logger.info(f"Artifact cache stored: {stage} ({key[:12]}): {', '.join(outputs)}")
+        return outputs
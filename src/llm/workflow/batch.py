@@ -0,0 +1,300 @@
+"""
+多项目批量语义还原
+
+按清单中的(项目, 工具目录, 模型)逐个创建SemanticRestorationWorkflow，每个项目在进程池中的独立进程里运行，
+输出到各自的子目录；所有项目共享同一个LLM并发/速率预算，避免多个工作流同时请求时触发限流。
+全部结束后汇总各项目的statistics.json，生成batch_statistics.json/.csv和一张对比表。
+
+清单为JSON，可以是项目列表，也可以带公共配置:
+    {
+        "defaults": {"tools": "/opt/tools", "model": "claude-3-sonnet", "options": {"repair_attempts": 2}},
+        "projects": [
+            {"project": "/data/mall"},
+            {"name": "blog", "project": "/data/blog", "model": "gpt-4o"}
+        ]
+    }
+
+用法:
+    python -m src.llm.workflow.batch -m manifest.json -o batch_output --workers 4 --llm-concurrency 8 --rpm 120
+"""
+
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("workflow_batch")
+
+BATCH_STATISTICS_FILE = "batch_statistics"
+# 汇总表的列: (列名, statistics.json中的路径)
+SUMMARY_COLUMNS = [
+    ("restored_files", ("restored_files",)),
+    ("repair_fix_rate", ("repair", "fix_rate")),
+    ("before_precision", ("before_evaluation", "总体", "Precision")),
+    ("before_recall", ("before_evaluation", "总体", "Recall")),
+    ("before_f1", ("before_evaluation", "总体", "F1")),
+    ("restored_precision", ("restored_evaluation", "总体", "Precision")),
+    ("restored_recall", ("restored_evaluation", "总体", "Recall")),
+    ("restored_f1", ("restored_evaluation", "总体", "F1")),
+    ("restoration_time", ("times", "restoration")),
+    ("analysis_time", ("times", "analysis")),
+]
+
+
+@dataclass
+class BatchEntry:
+    """清单中的一个项目"""
+    name: str
+    project: str
+    tools: str
+    model: str
+    # 传给SemanticRestorationWorkflow的其他参数
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+def load_manifest(path: str) -> List[BatchEntry]:
+    """
+    读取批量清单
+
+    返回:
+        BatchEntry列表，name默认为项目目录名，重名时报错
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"projects": manifest}
+    defaults = manifest.get("defaults", {})
+    entries = []
+    for item in manifest["projects"]:
+        merged = {**defaults, **item, "options": {**defaults.get("options", {}), **item.get("options", {})}}
+        for key in ("project", "tools", "model"):
+            if not merged.get(key):
+                raise ValueError(f"清单中的项目缺少 {key}: {item}")
+        name = merged.get("name") or os.path.basename(os.path.normpath(merged["project"]))
+        entries.append(BatchEntry(name, merged["project"], merged["tools"], merged["model"], merged["options"]))
+    names = [entry.name for entry in entries]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"清单中的项目重名: {', '.join(duplicates)}")
+    return entries
+
+
+class SharedLLMBudget:
+    """
+    跨进程共享的LLM请求预算：同时进行的请求数上限，以及每分钟请求数上限（按固定间隔发放请求时间片）
+
+    基于multiprocessing.Manager的代理对象，可以传给进程池中的工作进程
+    """
+
+    def __init__(self, manager, concurrency: int, requests_per_minute: Optional[float] = None):
+        self.semaphore = manager.BoundedSemaphore(max(1, concurrency))
+        self.lock = manager.Lock()
+        self.next_slot = manager.Value('d', 0.0)
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+
+    @contextmanager
+    def acquire(self):
+        self.semaphore.acquire()
+        try:
+            if self.interval:
+                with self.lock:
+                    now = time.time()
+                    slot = max(now, self.next_slot.value)
+                    self.next_slot.value = slot + self.interval
+                if slot > now:
+                    time.sleep(slot - now)
+            yield
+        finally:
+            self.semaphore.release()
+
+
+class BudgetedLLMClient:
+    """在共享预算内发送请求的LLM客户端包装，其他属性转发给被包装的客户端"""
+
+    def __init__(self, client, budget: SharedLLMBudget):
+        self.client = client
+        self.budget = budget
+
+    def generate_completion(self, *args, **kwargs):
+        with self.budget.acquire():
+            return self.client.generate_completion(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+# 工作进程内的共享预算，由_init_worker初始化
+_worker_budget: Optional[SharedLLMBudget] = None
+
+
+def _init_worker(budget: Optional[SharedLLMBudget]) -> None:
+    global _worker_budget
+    _worker_budget = budget
+
+
+def _run_project(entry: BatchEntry, output_root: str, resume: bool, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """在工作进程中运行单个项目的工作流"""
+    from src.llm.llm_client import LLMClient
+    from src.llm.workflow.journal import WorkflowJournal
+    from src.llm.workflow.workflow import SemanticRestorationWorkflow
+
+    output_path = os.path.join(output_root, entry.name)
+    os.makedirs(output_path, exist_ok=True)
+    start_time = time.time()
+    result = {"name": entry.name, "project": entry.project, "model": entry.model, "output": output_path,
+              "status": "error", "error": None}
+    workflow = None
+    try:
+        llm_client = LLMClient(model=entry.model)
+        if _worker_budget is not None:
+            llm_client = BudgetedLLMClient(llm_client, _worker_budget)
+        options = {**defaults, **entry.options}
+        if resume and WorkflowJournal(output_path).exists():
+            workflow = SemanticRestorationWorkflow.resume(output_path, llm_client=llm_client, **options)
+        else:
+            workflow = SemanticRestorationWorkflow(entry.project, output_path, entry.tools, entry.model,
+                                                   llm_client=llm_client, **options)
+        workflow.run()
+    except Exception as e:
+        logger.error(f"Project {entry.name} failed: {str(e)}")
+        result["error"] = str(e)
+    if workflow is not None:
+        result["status"] = workflow.state.value
+        if workflow.failure and not result["error"]:
+            result["error"] = f"failed in state {workflow.failure['state']}"
+    result["elapsed"] = round(time.time() - start_time, 3)
+    return result
+
+
+def _lookup(data: Any, path: tuple):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def summarize(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    汇总各项目的运行结果与statistics.json
+
+    返回:
+        每个项目一行，列为name、status、elapsed、error与SUMMARY_COLUMNS，没有统计数据的列为None
+    """
+    rows = []
+    for result in results:
+        statistics = {}
+        path = os.path.join(result["output"], 'statistics.json')
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                statistics = json.load(f)
+        row = {"name": result["name"], "status": result["status"], "elapsed": result.get("elapsed")}
+        for column, key_path in SUMMARY_COLUMNS:
+            value = _lookup(statistics, key_path)
+            row[column] = round(value, 4) if isinstance(value, float) else value
+        row["error"] = result.get("error")
+        rows.append(row)
+    return rows
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    """格式化为对齐的文本表格"""
+    if not rows:
+        return ""
+    columns = [column for column in rows[0] if column != "error"]
+    cells = [[column for column in columns]] + [["-" if row[c] is None else str(row[c]) for c in columns]
+                                                 for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in cells)
+
+
+def write_summary(output_root: str, rows: List[Dict[str, Any]]):
+    """写出batch_statistics.json与batch_statistics.csv"""
+    with open(os.path.join(output_root, f"{BATCH_STATISTICS_FILE}.json"), 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=4, ensure_ascii=False)
+    if rows:
+        with open(os.path.join(output_root, f"{BATCH_STATISTICS_FILE}.csv"), 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def run_batch(entries: List[BatchEntry], output_root: str, workers: int = 2, llm_concurrency: int = 8,
+              requests_per_minute: Optional[float] = None, resume: bool = False) -> List[Dict[str, Any]]:
+    """
+    用进程池批量运行工作流
+
+    参数:
+        entries: 清单中的项目
+        output_root: 输出根目录，每个项目输出到其下的同名子目录
+        workers: 同时运行的项目数
+        llm_concurrency: 所有项目合计同时进行的LLM请求数
+        requests_per_minute: 所有项目合计每分钟的LLM请求数上限，None表示不限制
+        resume: 输出目录中已有状态日志的项目从日志恢复，而不是重新开始
+
+    返回:
+        汇总表的行，按清单顺序
+    """
+    os.makedirs(output_root, exist_ok=True)
+    workers = max(1, min(workers, len(entries) or 1))
+    # 各项目的依赖图调度按进程数平分CPU，避免多个工作流都按整机核数并发
+    defaults = {"cpu_budget": max(1, (os.cpu_count() or 1) // workers)}
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    with context.Manager() as manager:
+        budget = SharedLLMBudget(manager, llm_concurrency, requests_per_minute)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(budget,)) as executor:
+            futures = {executor.submit(_run_project, entry, output_root, resume, defaults): entry
+                       for entry in entries}
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    results[entry.name] = future.result()
+                except Exception as e:
+                    # 工作进程异常退出
+                    results[entry.name] = {"name": entry.name, "output": os.path.join(output_root, entry.name),
+                                           "status": "error", "error": str(e)}
+                logger.info(f"Project {entry.name} finished: {results[entry.name]['status']}")
+
+    rows = summarize([results[entry.name] for entry in entries])
+    write_summary(output_root, rows)
+    return rows
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='多项目批量语义还原')
+    parser.add_argument('--manifest', '-m', required=True, help='批量清单（JSON）')
+    parser.add_argument('--output', '-o', required=True, help='输出根目录')
+    parser.add_argument('--workers', type=int, default=2, help='同时运行的项目数')
+    parser.add_argument('--llm-concurrency', type=int, default=8, help='所有项目合计同时进行的LLM请求数')
+    parser.add_argument('--rpm', type=float, help='所有项目合计每分钟的LLM请求数上限')
+    parser.add_argument('--resume', action='store_true', help='已有状态日志的项目从日志恢复')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    entries = load_manifest(args.manifest)
+    logger.info(f"{len(entries)} projects, {args.workers} workers, LLM concurrency {args.llm_concurrency}")
+    rows = run_batch(entries, args.output, args.workers, args.llm_concurrency, args.rpm, args.resume)
+    print(format_table(rows))
+    failed = [row["name"] for row in rows if row["status"] != "completed"]
+    if failed:
+        print(f"Failed projects: {', '.join(failed)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+"""
+增量编译
+
+完整的 mvn clean compile 每次都要重新解析依赖并编译整个项目。增量模式只在第一次完整构建时顺带
+用 dependency:build-classpath 解析依赖类路径并缓存（以pom.xml内容哈希为键），之后只对改动/还原过的
+源文件调用 javac，输出到已有的 target/classes。缺少 javac、target/classes 或类路径时回退到完整的Maven构建。
+
+javac 默认生成当前JDK版本的字节码，而 target/classes 中其余的类由Maven按pom中的编译级别生成，
+混在一起后基于 rt.jar 的Soot分析可能无法处理较新的class文件。因此完整构建后从已生成的class文件
+（或pom中的 maven.compiler.release/target/source）确定目标级别并缓存，javac 编译时以 --release 指定。
+"""
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.llm.workflow.runner import CommandResult, run_command
+
+logger = logging.getLogger("workflow_compiler")
+
+MAVEN_COMPILE_COMMAND = "mvn clean compile -Dmaven.test.skip=true"
+
+# javac诊断信息: /path/A.java:12: error: cannot find symbol
+DIAGNOSTIC_PATTERN = re.compile(r'^(?P<file>.+?\.java):(?P<line>\d+): (?P<kind>error|warning): (?P<message>.*)$')
+PACKAGE_PATTERN = re.compile(r'^\s*package\s+([\w.]+)\s*;', re.MULTILINE)
+# pom中决定编译级别的属性与maven-compiler-plugin配置项，按优先级排列
+POM_LEVEL_PROPERTIES = ("maven.compiler.release", "maven.compiler.target", "maven.compiler.source")
+POM_LEVEL_TAGS = ("release", "target", "source")
+CLASS_FILE_MAGIC = b'\xca\xfe\xba\xbe'
+
+
+@dataclass
+class CompileResult:
+    """一次编译的结果"""
+    success: bool
+    mode: str
+    files: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+    # 源文件 -> 错误信息列表（含行号）
+    errors: Dict[str, List[str]] = field(default_factory=dict)
+    output: str = ""
+    # 编译进程的退出状态、峰值内存与CPU时间
+    process: Optional[dict] = None
+    # 字节码的目标Java级别，如 8、11
+    release: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {"success": self.success, "mode": self.mode, "files": len(self.files),
+                "elapsed": round(self.elapsed, 3), "errors": {f: len(e) for f, e in self.errors.items()},
+                "process": self.process, "release": self.release}
+
+
+class CompilationError(RuntimeError):
+    """编译失败，result中按源文件给出诊断信息"""
+
+    def __init__(self, result: CompileResult):
+        super().__init__(f"Compilation failed ({result.mode})")
+        self.result = result
+
+
+def parse_javac_diagnostics(output: str, cwd: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    解析javac输出中的错误，按源文件分组
+
+    返回:
+        源文件路径（相对cwd时转为相对路径）-> ["行号: 错误信息\\n上下文..."]
+    """
+    errors: Dict[str, List[str]] = {}
+    current = None
+    for line in output.splitlines():
+        match = DIAGNOSTIC_PATTERN.match(line)
+        if match:
+            current = None
+            if match.group('kind') != 'error':
+                continue
+            file = match.group('file')
+            if cwd and os.path.isabs(file):
+                file = os.path.relpath(file, cwd)
+            current = errors.setdefault(file, [])
+            current.append(f"{match.group('line')}: {match.group('message')}")
+        elif current is not None and line.strip() and not re.match(r'^\d+ (errors?|warnings?)$', line.strip()):
+            # 源码行与^标记等上下文附在上一条错误后
+            current[-1] += "\n" + line
+    return errors
+
+
+def source_package(source: str) -> str:
+    match = PACKAGE_PATTERN.search(source)
+    return match.group(1) if match else ""
+
+
+def pom_hash(project_path: str) -> str:
+    """项目全部pom.xml的内容哈希，依赖改变时类路径缓存失效"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(project_path):
+        dirs[:] = sorted(d for d in dirs if d not in ('target', '.git'))
+        if 'pom.xml' in files:
+            with open(os.path.join(root, 'pom.xml'), 'rb') as f:
+                digest.update(os.path.relpath(root, project_path).encode('utf-8'))
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def java_level(version: str) -> Optional[int]:
+    """把 1.8、8、11 这样的版本号转为Java级别，无法识别时返回None"""
+    match = re.match(r'^\s*(?:1\.)?(\d+)', version or "")
+    return int(match.group(1)) if match else None
+
+
+def class_file_level(path: str) -> Optional[int]:
+    """class文件的Java级别（主版本号 - 44，52即Java 8），不是有效class文件时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(8)
+    except OSError:
+        return None
+    if len(header) < 8 or header[:4] != CLASS_FILE_MAGIC:
+        return None
+    return int.from_bytes(header[6:8], 'big') - 44
+
+
+def classes_level(classes_dir: str) -> Optional[int]:
+    """目录中第一个有效class文件的Java级别"""
+    for root, dirs, files in os.walk(classes_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".class"):
+                level = class_file_level(os.path.join(root, name))
+                if level is not None:
+                    return level
+    return None
+
+
+def pom_level(project_path: str) -> Optional[int]:
+    """
+    从根pom.xml的属性或maven-compiler-plugin配置中读取编译级别，支持 ${属性} 引用
+
+    返回:
+        Java级别，pom中没有配置时返回None（此时Maven使用插件默认值，应以class文件为准）
+    """
+    path = os.path.join(project_path, 'pom.xml')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        pom = f.read()
+    properties = dict(re.findall(r'<([\w.\-]+)>\s*([^<]*?)\s*</\1>', pom))
+
+    def resolve(value: str) -> str:
+        for _ in range(5):
+            match = re.fullmatch(r'\$\{([\w.\-]+)\}', value)
+            if not match or match.group(1) not in properties:
+                break
+            value = properties[match.group(1)]
+        return value
+
+    for name in POM_LEVEL_PROPERTIES:
+        if name in properties:
+            level = java_level(resolve(properties[name]))
+            if level is not None:
+                return level
+    plugin = re.search(r'<artifactId>\s*maven-compiler-plugin\s*</artifactId>(.*?)</plugin>', pom, re.DOTALL)
+    if plugin:
+        for tag in POM_LEVEL_TAGS:
+            match = re.search(rf'<{tag}>\s*([^<]+?)\s*</{tag}>', plugin.group(1))
+            if match:
+                level = java_level(resolve(match.group(1)))
+                if level is not None:
+                    return level
+    return None
+
+
+class IncrementalCompiler:
+    """
+    用法:
+        compiler = IncrementalCompiler(project_path, cache_dir)
+        compiler.full_build()                 # 完整构建并缓存类路径
+        compiler.compile(["src/main/java/A.java"])  # 之后只编译改动的文件
+    """
+
+    def __init__(self, project_path: str, cache_dir: str, javac: Optional[str] = None, encoding: str = "UTF-8",
+                 log_file: Optional[str] = None, timeout: Optional[float] = None, idle_timeout: Optional[float] = None):
+        """
+        参数:
+            project_path: Maven项目目录
+            cache_dir: 类路径缓存目录
+            javac: javac路径，默认从JAVA_HOME或PATH中查找
+            encoding: 源文件编码
+            log_file: Maven/javac输出追加写入的日志文件
+            timeout: 单次编译的总时长上限（秒）
+            idle_timeout: 编译进程没有输出的时长上限（秒）
+        """
+        self.project_path = project_path
+        self.cache_dir = cache_dir
+        self.encoding = encoding
+        self.log_file = log_file
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        java_home = os.environ.get("JAVA_HOME")
+        candidate = os.path.join(java_home, "bin", "javac") if java_home else None
+        self.javac = javac or (candidate if candidate and os.path.exists(candidate) else shutil.which("javac"))
+        self.classes_dir = os.path.join(project_path, "target", "classes")
+        self._javac_level = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def classpath_file(self) -> str:
+        return os.path.join(self.cache_dir, f"classpath-{pom_hash(self.project_path)[:16]}.txt")
+
+    @property
+    def release_file(self) -> str:
+        return os.path.join(self.cache_dir, f"release-{pom_hash(self.project_path)[:16]}.txt")
+
+    def detect_release(self) -> Optional[int]:
+        """Maven构建产物的目标级别：优先取已生成的class文件，没有时取pom中的配置"""
+        level = classes_level(self.classes_dir)
+        return level if level is not None else pom_level(self.project_path)
+
+    def target_release(self) -> Optional[int]:
+        """完整构建时缓存的目标级别，没有缓存时（如旧的输出目录）现场检测"""
+        if os.path.exists(self.release_file):
+            with open(self.release_file, 'r', encoding='utf-8') as f:
+                return java_level(f.read())
+        return self.detect_release()
+
+    def javac_level(self) -> Optional[int]:
+        """javac自身的版本，JDK 8 输出 javac 1.8.0_xxx，之后为 javac 17.0.x"""
+        if self._javac_level is None:
+            result = run_command([self.javac, "-version"], cwd=self.project_path, timeout=60)
+            match = re.search(r'javac\s+([\d.]+)', result.stdout + result.stderr)
+            self._javac_level = java_level(match.group(1)) if match else 0
+        return self._javac_level or None
+
+    def release_args(self, release: Optional[int]) -> List[str]:
+        """指定目标级别的javac参数，--release 从JDK 9开始支持，更早的javac使用 -source/-target"""
+        if release is None:
+            return []
+        javac_level = self.javac_level()
+        if javac_level is not None and javac_level < 9:
+            version = f"1.{release}" if release <= 8 else str(release)
+            return ["-source", version, "-target", version]
+        return ["--release", str(release)]
+
+    def cached_classpath(self) -> Optional[str]:
+        if not os.path.exists(self.classpath_file):
+            return None
+        with open(self.classpath_file, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+
+    def _run(self, args, **kwargs) -> CommandResult:
+        return run_command(args, cwd=self.project_path, log_file=self.log_file, timeout=self.timeout,
+                           idle_timeout=self.idle_timeout, **kwargs)
+
+    def full_build(self) -> CompileResult:
+        """完整Maven构建，同一次调用中解析并缓存依赖类路径"""
+        start_time = time.time()
+        command = f"{MAVEN_COMPILE_COMMAND} dependency:build-classpath -Dmdep.outputFile={self.classpath_file}"
+        logger.info(f"Running command: {command}")
+        result = self._run(command)
+        success = result.returncode == 0 and "BUILD SUCCESS" in result.stdout
+        release = None
+        if success:
+            release = self.detect_release()
+            if release is not None:
+                with open(self.release_file, 'w', encoding='utf-8') as f:
+                    f.write(str(release))
+                logger.info(f"Target bytecode level: Java {release}")
+        else:
+            for path in (self.classpath_file, self.release_file):
+                if os.path.exists(path):
+                    os.remove(path)
+        return CompileResult(success, "maven", elapsed=time.time() - start_time,
+                             output=result.stdout + result.stderr, process=result.to_dict(), release=release)
+
+    def can_compile_incrementally(self) -> bool:
+        if not self.javac:
+            logger.info("未找到javac，使用完整Maven构建")
+            return False
+        if not os.path.isdir(self.classes_dir):
+            logger.info("缺少target/classes，使用完整Maven构建")
+            return False
+        if self.cached_classpath() is None:
+            logger.info("没有可用的类路径缓存（首次构建或pom.xml已改变），使用完整Maven构建")
+            return False
+        return True
+
+    def stale_classes(self, file: str) -> List[str]:
+        """源文件对应的已有class文件（包括内部类）"""
+        path = os.path.join(self.project_path, file)
+        with open(path, 'r', encoding=self.encoding, errors='replace') as f:
+            package = source_package(f.read())
+        name = os.path.splitext(os.path.basename(file))[0]
+        directory = os.path.join(self.classes_dir, *package.split('.')) if package else self.classes_dir
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join(directory, class_file) for class_file in sorted(os.listdir(directory))
+                if class_file == f"{name}.class" or (class_file.startswith(f"{name}$") and class_file.endswith(".class"))]
+
+    def remove_stale_classes(self, file: str):
+        """删除源文件对应的旧class文件（包括内部类），避免还原后已不存在的类残留"""
+        for class_file in self.stale_classes(file):
+            os.remove(class_file)
+
+    def _stash_classes(self, files: List[str]) -> List[tuple]:
+        """把旧class文件移到暂存目录，编译成功后删除，失败时放回，使其他文件仍能针对旧类单独编译"""
+        stash_dir = os.path.join(self.cache_dir, "stash")
+        if os.path.exists(stash_dir):
+            shutil.rmtree(stash_dir)
+        moved = []
+        for file in files:
+            for class_file in self.stale_classes(file):
+                backup = os.path.join(stash_dir, os.path.relpath(class_file, self.classes_dir))
+                os.makedirs(os.path.dirname(backup), exist_ok=True)
+                os.replace(class_file, backup)
+                moved.append((class_file, backup))
+        return moved
+
+    def compile(self, files: List[str]) -> CompileResult:
+        """
+        用javac只编译给定的源文件（相对项目目录），类路径为target/classes加缓存的依赖类路径
+
+        返回:
+            CompileResult，失败时errors按源文件给出诊断信息
+        """
+        start_time = time.time()
+        if not files:
+            return CompileResult(True, "javac")
+        release = self.target_release()
+        stashed = self._stash_classes(files)
+        classpath = os.pathsep.join(p for p in (self.classes_dir, self.cached_classpath()) if p)
+        args_file = os.path.join(self.cache_dir, "javac-sources.txt")
+        with open(args_file, 'w', encoding='utf-8') as f:
+            f.write("\n".join(f'"{os.path.join(self.project_path, file)}"' for file in files))
+        args = [self.javac, "-encoding", self.encoding, "-nowarn", "-g", "-d", self.classes_dir,
+                "-cp", classpath] + self.release_args(release) + [f"@{args_file}"]
+        # javac的输出只有诊断信息，全部保留用于按文件解析
+        result = self._run(args, tail_bytes=None)
+        output = result.stdout + result.stderr
+        errors = parse_javac_diagnostics(output, self.project_path) if result.returncode != 0 else {}
+        if result.returncode != 0 and not errors:
+            errors = {"<javac>": [output.strip()]}
+        if result.returncode != 0:
+            for class_file, backup in stashed:
+                if not os.path.exists(class_file):
+                    os.replace(backup, class_file)
+        shutil.rmtree(os.path.join(self.cache_dir, "stash"), ignore_errors=True)
+        return CompileResult(result.returncode == 0, "javac", list(files), time.time() - start_time, errors, output,
+                             result.to_dict(), release)
@@ -0,0 +1,45 @@
+"""
+工作流状态日志
+
+在output_path下持久化工作流进度：下一个要执行的状态、已完成阶段及其产物路径、每个文件的还原状态和
+各阶段耗时。每次写入都先写临时文件再原子替换，进程在任意时刻退出都能读到最近一次完整的日志。
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+JOURNAL_FILE = "workflow_journal.json"
+JOURNAL_FORMAT = 1
+
+
+class WorkflowJournal:
+    def __init__(self, output_path: str):
+        self.path = os.path.join(output_path, JOURNAL_FILE)
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> Optional[dict]:
+        if not self.exists():
+            return None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("format") != JOURNAL_FORMAT:
+            raise ValueError(f"不支持的工作流日志格式: {data.get('format')}")
+        return data
+
+    def save(self, data: dict):
+        """原子写入，多个还原线程可以同时调用"""
+        data = {"format": JOURNAL_FORMAT, "updated_at": time.strftime('%Y-%m-%d %H:%M:%S'), **data}
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
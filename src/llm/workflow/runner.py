@@ -0,0 +1,202 @@
+"""
+外部命令执行器
+
+subprocess.run(capture_output=True)会把Maven、Soot动辄数GB的日志全部读进内存，且没有超时，JVM挂起时
+工作流会一直阻塞。run_command把stdout/stderr边读边写入日志文件，内存中只保留末尾一段供调用方检查
+（如 BUILD SUCCESS）；超过总时长或长时间没有任何输出时终止整个进程组；结束后通过wait4取得
+峰值内存（RSS）、用户态/内核态CPU时间和退出状态。
+"""
+
+import logging
+import os
+import selectors
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from src.llm.tracing import span as trace_span
+
+logger = logging.getLogger("workflow_runner")
+
+# 默认保留输出末尾的字节数
+DEFAULT_TAIL_BYTES = 64 * 1024
+# 超时后发送SIGTERM，等待该秒数后仍未退出则SIGKILL
+KILL_GRACE_SECONDS = 5.0
+
+
+@dataclass
+class CommandResult:
+    """命令的执行结果，stdout/stderr只包含末尾部分，完整输出见log_file"""
+    command: str
+    returncode: int
+    stdout: str = ""
+    stderr: str = ""
+    elapsed: float = 0.0
+    # wall: 超过总时长; idle: 长时间没有输出
+    timed_out: Optional[str] = None
+    max_rss_mb: Optional[float] = None
+    user_cpu: Optional[float] = None
+    sys_cpu: Optional[float] = None
+    log_file: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {"command": self.command, "returncode": self.returncode, "elapsed": round(self.elapsed, 3),
+                "timed_out": self.timed_out, "max_rss_mb": self.max_rss_mb, "user_cpu": self.user_cpu,
+                "sys_cpu": self.sys_cpu, "log_file": self.log_file}
+
+
+class _Tail:
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self.data = bytearray()
+
+    def add(self, chunk: bytes):
+        self.data.extend(chunk)
+        if self.limit is not None and len(self.data) > 2 * self.limit:
+            del self.data[:-self.limit]
+
+    def text(self) -> str:
+        data = self.data if self.limit is None else self.data[-self.limit:]
+        return bytes(data).decode('utf-8', errors='replace')
+
+
+def _kill(process: subprocess.Popen, sig: int):
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError, AttributeError):
+        try:
+            process.send_signal(sig)
+        except ProcessLookupError:
+            pass
+
+
+def _reap(process: subprocess.Popen, deadline: Optional[float]):
+    """
+    等待进程退出并返回(退出码, rusage)，平台不支持wait4时rusage为None
+
+    返回:
+        deadline之前没有退出时返回None
+    """
+    if not hasattr(os, "wait4"):
+        try:
+            process.wait(None if deadline is None else max(deadline - time.time(), 0))
+        except subprocess.TimeoutExpired:
+            return None
+        return process.returncode, None
+    while True:
+        pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+        if pid == process.pid:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return process.returncode, rusage
+        if deadline is not None and time.time() >= deadline:
+            return None
+        time.sleep(0.05)
+
+
+def run_command(command: Union[str, list], cwd: Optional[str] = None, log_file: Optional[str] = None,
+                timeout: Optional[float] = None, idle_timeout: Optional[float] = None,
+                tail_bytes: Optional[int] = DEFAULT_TAIL_BYTES) -> CommandResult:
+    """
+    执行命令，输出流式写入日志文件
+
+    参数:
+        command: 字符串时通过shell执行，列表时直接执行
+        cwd: 工作目录
+        log_file: 追加写入stdout/stderr的日志文件，None表示不写日志
+        timeout: 总时长上限（秒），None表示不限制
+        idle_timeout: 没有任何输出的时长上限（秒），None表示不限制
+        tail_bytes: stdout/stderr各保留的末尾字节数，None表示全部保留
+
+    返回:
+        CommandResult，超时时returncode为负的信号值且timed_out给出原因
+    """
+    text = command if isinstance(command, str) else " ".join(command)
+    with trace_span("command", "subprocess", command=text, cwd=cwd) as trace:
+        start_time = time.time()
+        log = None
+        if log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            log = open(log_file, 'ab')
+            log.write(f"$ {text}\n".encode('utf-8'))
+            log.flush()
+        try:
+            process = subprocess.Popen(command, shell=isinstance(command, str), cwd=cwd, stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+        except Exception as e:
+            if log:
+                log.close()
+            trace.set(returncode=1, error=str(e))
+            return CommandResult(text, 1, stderr=str(e), elapsed=time.time() - start_time, log_file=log_file)
+
+        stdout_fd, stderr_fd = process.stdout.fileno(), process.stderr.fileno()
+        tails = {stdout_fd: _Tail(tail_bytes), stderr_fd: _Tail(tail_bytes)}
+        deadline = start_time + timeout if timeout else None
+        last_output = start_time
+        timed_out = None
+        selector = selectors.DefaultSelector()
+        for stream in (process.stdout, process.stderr):
+            selector.register(stream, selectors.EVENT_READ)
+        try:
+            while selector.get_map():
+                now = time.time()
+                if deadline is not None and now >= deadline:
+                    timed_out = "wall"
+                    break
+                if idle_timeout and now - last_output >= idle_timeout:
+                    timed_out = "idle"
+                    break
+                waits = [1.0]
+                if deadline is not None:
+                    waits.append(deadline - now)
+                if idle_timeout:
+                    waits.append(last_output + idle_timeout - now)
+                for key, _ in selector.select(max(min(waits), 0)):
+                    chunk = os.read(key.fd, 65536)
+                    if not chunk:
+                        selector.unregister(key.fileobj)
+                        continue
+                    last_output = time.time()
+                    tails[key.fd].add(chunk)
+                    if log:
+                        log.write(chunk)
+            if timed_out is None:
+                # 输出已关闭，等待进程退出（仍受总时长限制）
+                reaped = _reap(process, deadline)
+                if reaped is None:
+                    timed_out = "wall"
+            if timed_out is not None:
+                logger.error(f"Command timed out ({timed_out}): {text}")
+                _kill(process, signal.SIGTERM)
+                reaped = _reap(process, time.time() + KILL_GRACE_SECONDS)
+                if reaped is None:
+                    _kill(process, signal.SIGKILL)
+                    reaped = _reap(process, None)
+        except BaseException:
+            # 被中断时不留下孤儿进程
+            _kill(process, signal.SIGKILL)
+            _reap(process, None)
+            raise
+        finally:
+            selector.close()
+            process.stdout.close()
+            process.stderr.close()
+            if log:
+                if timed_out:
+                    log.write(f"\n[timed out: {timed_out}]\n".encode('utf-8'))
+                log.close()
+
+        returncode, rusage = reaped
+        result = CommandResult(text, returncode, tails[stdout_fd].text(), tails[stderr_fd].text(),
+                               time.time() - start_time, timed_out, log_file=log_file)
+        if rusage is not None:
+            # Linux下ru_maxrss单位为KB，macOS下为字节
+            scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+            result.max_rss_mb = round(rusage.ru_maxrss / scale, 1)
+            result.user_cpu = round(rusage.ru_utime, 3)
+            result.sys_cpu = round(rusage.ru_stime, 3)
+        trace.set(returncode=returncode, timed_out=timed_out, max_rss_mb=result.max_rss_mb,
+                  user_cpu=result.user_cpu, sys_cpu=result.sys_cpu)
+        return result
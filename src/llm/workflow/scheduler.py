@@ -0,0 +1,174 @@
+"""
+阶段依赖图调度器
+
+工作流中互不依赖的阶段（如建模、代码索引与基线污点分析都只依赖编译后的工作副本）可以并发执行。
+每个阶段声明依赖和所需的CPU核数/内存，调度器在资源预算内尽可能多地启动已就绪的阶段；
+单个阶段的需求超过预算时，等其他阶段全部结束后单独运行。任一阶段失败后不再启动新阶段，
+已在运行的阶段正常结束，依赖失败阶段的阶段标记为skipped。
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("workflow_scheduler")
+
+
+@dataclass
+class Stage:
+    """调度的阶段"""
+    name: str
+    action: Callable[[], None]
+    deps: Tuple[str, ...] = ()
+    cpus: int = 1
+    memory_mb: int = 0
+
+
+@dataclass
+class StageResult:
+    """阶段的执行结果，start/end为相对调度开始的秒数"""
+    name: str
+    status: str = "pending"
+    start: Optional[float] = None
+    end: Optional[float] = None
+    error: Optional[str] = None
+    thread: Optional[str] = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+    def to_dict(self) -> dict:
+        return {"status": self.status, "start": _round(self.start), "end": _round(self.end),
+                "elapsed": round(self.elapsed, 3), "error": self.error}
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+def total_memory_mb() -> Optional[int]:
+    """物理内存总量（MB），无法获取时返回None"""
+    try:
+        return int(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 * 1024))
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class StageScheduler:
+    """
+    用法:
+        scheduler = StageScheduler(cpu_budget=8, memory_budget_mb=16000)
+        scheduler.add(Stage("init", init))
+        scheduler.add(Stage("model", run_model, deps=("init",), cpus=1, memory_mb=2048))
+        results = scheduler.run()
+    """
+
+    def __init__(self, cpu_budget: Optional[int] = None, memory_budget_mb: Optional[int] = None):
+        """
+        参数:
+            cpu_budget: 同时运行的阶段CPU核数之和上限，默认为CPU核数
+            memory_budget_mb: 同时运行的阶段内存之和上限（MB），默认为物理内存的80%，None表示不限制
+        """
+        self.cpu_budget = cpu_budget or os.cpu_count() or 1
+        if memory_budget_mb is None:
+            total = total_memory_mb()
+            memory_budget_mb = int(total * 0.8) if total else None
+        self.memory_budget_mb = memory_budget_mb
+        self.stages: Dict[str, Stage] = {}
+
+    def add(self, stage: Stage):
+        if stage.name in self.stages:
+            raise ValueError(f"阶段重复: {stage.name}")
+        self.stages[stage.name] = stage
+
+    def _check(self):
+        for stage in self.stages.values():
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"阶段 {stage.name} 依赖未知阶段 {dep}")
+        # 拓扑排序检查环
+        remaining = {name: set(stage.deps) for name, stage in self.stages.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"阶段依赖存在环: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def _fits(self, stage: Stage, running: List[Stage]) -> bool:
+        if not running:
+            return True
+        cpus = sum(s.cpus for s in running) + stage.cpus
+        if cpus > self.cpu_budget:
+            return False
+        if self.memory_budget_mb is not None:
+            memory = sum(s.memory_mb for s in running) + stage.memory_mb
+            if memory > self.memory_budget_mb:
+                return False
+        return True
+
+    def run(self) -> Dict[str, StageResult]:
+        """
+        执行全部阶段
+
+        返回:
+            阶段名 -> StageResult，按添加顺序排列
+        """
+        self._check()
+        results = {name: StageResult(name) for name in self.stages}
+        origin = time.time()
+        lock = threading.Lock()
+
+        def execute(stage: Stage):
+            result = results[stage.name]
+            with lock:
+                result.start = time.time() - origin
+                result.thread = threading.current_thread().name
+            logger.info(f"Stage started: {stage.name}")
+            try:
+                stage.action()
+                result.status = "completed"
+            except Exception as e:
+                result.status = "failed"
+                result.error = str(e)
+                logger.error(f"Stage failed: {stage.name}: {str(e)}")
+            finally:
+                result.end = time.time() - origin
+            logger.info(f"Stage finished: {stage.name} ({result.status}, {result.elapsed:.2f}s)")
+
+        running: Dict = {}
+        failed = False
+        with ThreadPoolExecutor(max_workers=max(len(self.stages), 1), thread_name_prefix="stage") as executor:
+            while True:
+                if not failed:
+                    # 按添加顺序启动依赖已完成且资源足够的阶段
+                    for name, stage in self.stages.items():
+                        if results[name].status != "pending" or name in running.values():
+                            continue
+                        if not all(results[dep].status == "completed" for dep in stage.deps):
+                            continue
+                        if not self._fits(stage, [self.stages[n] for n in running.values()]):
+                            continue
+                        results[name].status = "running"
+                        running[executor.submit(execute, stage)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if results[name].status == "failed":
+                        failed = True
+
+        for result in results.values():
+            if result.status == "pending":
+                result.status = "skipped"
+        return results
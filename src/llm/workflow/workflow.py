@@ -1,17 +1,24 @@
+import argparse
 import json
 import logging
 import os
 import shutil
-import subprocess
+import threading
 import time
-from typing import Optional, Tuple
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
 
-from mpmath import eighe
-
-from src.config.config import system_prompt_semantic_restoration
+from src.config.config import system_prompt_compile_repair, system_prompt_semantic_restoration
 from src.llm.llm_client import LLMClient
+from src.llm.tracing import Tracer, set_tracer, span as trace_span, traced
 from src.llm.util import ModelingDataProcessor
+from src.llm.workflow.artifact_cache import ArtifactCache, file_checksum, tree_manifest
+from src.llm.workflow.compiler import MAVEN_COMPILE_COMMAND, CompilationError, CompileResult, IncrementalCompiler
+from src.llm.workflow.journal import WorkflowJournal
+from src.llm.workflow.runner import CommandResult, run_command
+from src.llm.workflow.scheduler import Stage, StageScheduler
 from src.llm.workflow.state import WorkflowState
+from src.llm.workflow.workspace import WORKSPACE_MODES, Workspace
 
 
 def strip_code_markers_completely(text: str) -> str:
@@ -45,28 +52,23 @@ def copy_directory(source_dir, target_dir):
     shutil.copytree(source_dir, target_dir)
 
 
-def execute_command(command: str, cwd: Optional[str] = None) -> Tuple[int, str, str]:
+def execute_command(command: str, cwd: Optional[str] = None, log_file: Optional[str] = None,
+                    timeout: Optional[float] = None, idle_timeout: Optional[float] = None) -> Tuple[int, str, str]:
     """
-    执行命令行命令
+    执行命令行命令，输出流式写入日志文件，内存中只保留末尾部分
 
     Args:
         command: 要执行的命令
         cwd: 命令执行的工作目录，默认为None表示当前目录
+        log_file: 完整输出追加写入的日志文件
+        timeout: 总时长上限（秒）
+        idle_timeout: 没有输出的时长上限（秒）
 
     Returns:
-        Tuple[int, str, str]: (返回码, 标准输出, 标准错误)
+        Tuple[int, str, str]: (返回码, 标准输出末尾, 标准错误末尾)
     """
-    try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            cwd=cwd,
-            capture_output=True,
-            text=True
-        )
-        return result.returncode, result.stdout, result.stderr
-    except Exception as e:
-        return 1, "", str(e)
+    result = run_command(command, cwd=cwd, log_file=log_file, timeout=timeout, idle_timeout=idle_timeout)
+    return result.returncode, result.stdout, result.stderr
 
 
 def write_string_to_file(content, file_path, encoding="utf-8", create_dirs=True, mode="w"):
@@ -123,18 +125,122 @@ def load_json_file(file_path: str) -> dict:
     except json.JSONDecodeError as e:
         raise json.JSONDecodeError(f"JSON格式错误：{str(e)}", e.doc, e.pos)
 
+# 修复提示词中每个文件最多附带的编译错误数，控制token消耗
+MAX_REPAIR_DIAGNOSTICS = 20
+
+
+def build_repair_prompt(file: str, source: str, errors: List[str]) -> str:
+    """
+    编译错误修复的提示词，只包含出错的文件及其编译错误
+
+    参数:
+        file: 源文件相对路径
+        source: 当前的文件内容
+        errors: javac诊断信息（行号: 错误信息）
+    """
+    shown = errors[:MAX_REPAIR_DIAGNOSTICS]
+    omitted = len(errors) - len(shown)
+    diagnostics = "\n".join(shown) + (f"\n... 另有 {omitted} 个错误" if omitted > 0 else "")
+    return f"文件: {file}\n\n编译错误:\n{diagnostics}\n\n源代码:\n```java\n{source}\n```"
+
+
+def needs_restoration(prompt_data: dict) -> bool:
+    """文件存在AOP或IoC建模数据时才需要语义还原"""
+    modeling_data = prompt_data.get('modeling_data')
+    if not modeling_data:
+        return False
+    return len(modeling_data.get('aop_data', [])) > 0 or len(modeling_data.get('ioc_data', [])) > 0
+
+
+# 按执行顺序排列的阶段，恢复时据此检查已完成阶段的产物
+STAGE_ORDER = [
+    WorkflowState.INIT,
+    WorkflowState.PROJECT_ANALYSIS,
+    WorkflowState.CODE_INDEXING,
+    WorkflowState.RESTORATION,
+    WorkflowState.ANALYSIS,
+    WorkflowState.EVALUATION,
+]
+
+# 依赖图调度时各阶段的资源需求 (CPU核数, 内存MB)，工具均为独立的JVM进程
+STAGE_RESOURCES = {
+    "init": (2, 2048),
+    "project_analysis": (1, 2048),
+    "code_indexing": (2, 4096),
+    "baseline_analysis": (2, 8192),
+    "baseline_evaluation": (1, 512),
+}
+
+
 class SemanticRestorationWorkflow:
-    def __init__(self, project_path: str, output_path: str, tool_path: str, llm_model: str):
+    def __init__(self, project_path: str, output_path: str, tool_path: str, llm_model: str,
+                 restoration_concurrency: int = 4, llm_client: Optional[LLMClient] = None,
+                 compile_mode: str = "incremental", parallel_stages: bool = True,
+                 cpu_budget: Optional[int] = None, memory_budget_mb: Optional[int] = None,
+                 workspace_mode: str = "auto", artifact_cache_dir: Optional[str] = None,
+                 command_timeout: Optional[float] = 6 * 3600, idle_timeout: Optional[float] = 3600,
+                 repair_attempts: int = 2):
+        """
+        参数:
+            project_path: 原始项目路径
+            output_path: 输出目录
+            tool_path: 建模、索引、污点分析等工具所在目录
+            llm_model: 语义还原使用的LLM模型
+            restoration_concurrency: 语义还原阶段同时请求LLM的文件数
+            llm_client: 使用的LLM客户端，默认按llm_model创建
+            compile_mode: incremental只用javac编译还原过的文件（必要时回退Maven），full每次完整Maven构建
+            parallel_stages: 是否按依赖图并发执行建模、代码索引与基线分析
+            cpu_budget: 并发阶段的CPU核数预算，默认为CPU核数
+            memory_budget_mb: 并发阶段的内存预算（MB），默认为物理内存的80%
+            workspace_mode: 工作副本的创建方式，auto依次尝试reflink、硬链接和复制
+            artifact_cache_dir: 阶段产物缓存目录，输入不变时复用建模、索引与基线分析的产物，None表示不缓存
+            command_timeout: 单个外部命令（Maven、建模、索引、污点分析等）的总时长上限（秒），None表示不限制
+            idle_timeout: 外部命令没有任何输出的时长上限（秒），None表示不限制
+            repair_attempts: 还原后无法编译的文件交给LLM修复的最多次数，仍失败时回退为原始文件；0表示不修复
+        """
+        if compile_mode not in ("incremental", "full"):
+            raise ValueError(f"不支持的编译模式: {compile_mode}")
+        if workspace_mode not in WORKSPACE_MODES:
+            raise ValueError(f"不支持的工作副本模式: {workspace_mode}")
         self.project_path = project_path
         self.output_path = output_path
         self.tool_path = tool_path
         self.llm_model = llm_model
-        self.llm_client = LLMClient(model=self.llm_model)
+        self.restoration_concurrency = max(1, restoration_concurrency)
+        self.compile_mode = compile_mode
+        self.parallel_stages = parallel_stages
+        self.cpu_budget = cpu_budget
+        self.memory_budget_mb = memory_budget_mb
+        self.workspace_mode = workspace_mode
+        # 工作副本与原始项目共享未改写的文件，还原写回前先materialize
+        self.workspace = Workspace(project_path, os.path.join(output_path, 'project'), workspace_mode)
+        self.artifact_cache_dir = artifact_cache_dir
+        self.artifact_cache = ArtifactCache(artifact_cache_dir) if artifact_cache_dir else None
+        # 阶段名 -> hit/miss
+        self.artifact_cache_results: Dict[str, str] = {}
+        self._source_manifest = None
+        self._manifest_lock = threading.Lock()
+        self.command_timeout = command_timeout
+        self.idle_timeout = idle_timeout
+        # 外部命令的输出按阶段写入logs/，退出状态、峰值内存与CPU时间记入commands
+        self.log_path = os.path.join(output_path, 'logs')
+        self.commands: List[Dict] = []
+        self.repair_attempts = max(0, repair_attempts)
+        # 编译错误修复的逐文件结果
+        self.repair_results: List[Dict] = []
+        # 依赖图调度的各阶段起止时间与状态
+        self.stage_results: Dict[str, Dict] = {}
+        self.compiler = None
+        # 每次编译的模式、文件数与耗时
+        self.compilations: List[Dict] = []
+        self.llm_client = llm_client or LLMClient(model=self.llm_model)
         self.state = WorkflowState.INIT
         self.project_summary = None
         self.framework_info = None
         self.current_file = None
         self.restored_files = []
+        # 每个需要还原的文件的处理结果，按扫描顺序排列
+        self.restoration_results: List[Dict] = []
         self.retry_count = 0
         self.max_retries = {
             WorkflowState.PROJECT_ANALYSIS: 1,
@@ -152,6 +258,7 @@ class SemanticRestorationWorkflow:
             "compilation": 0.0,
             "analysis": 0.0,
             "evaluation": 0.0,
+            "repair": 0.0,
         }
         self.logger = self._setup_logger('info')
 
@@ -162,38 +269,221 @@ class SemanticRestorationWorkflow:
         self.last_llm_response = None
         self.start_time = None
 
+        # 状态日志：已完成阶段及产物、每个文件的还原状态，用于中断后恢复
+        self.journal = WorkflowJournal(output_path)
+        self._journal_lock = threading.RLock()
+        self.completed_stages: Dict[str, Dict] = {}
+        self.file_status: Dict[str, Dict] = {}
+        self.failure = None
+        # 各阶段、每个还原文件、LLM请求与外部命令的span，导出为trace.json
+        self.tracer = Tracer()
+
+    @classmethod
+    def resume(cls, output_path: str, llm_client: Optional[LLMClient] = None,
+               **kwargs) -> "SemanticRestorationWorkflow":
+        """
+        从output_path中的状态日志恢复工作流，之后调用run()从最近一个完成的步骤继续
+
+        参数:
+            output_path: 上一次运行的输出目录
+            llm_client: 使用的LLM客户端，默认按日志中记录的模型创建
+            kwargs: 覆盖日志中记录的restoration_concurrency、compile_mode、parallel_stages等配置
+        """
+        journal = WorkflowJournal(output_path).load()
+        if journal is None:
+            raise FileNotFoundError(f"找不到工作流日志: {WorkflowJournal(output_path).path}")
+        config = {**journal["config"], **kwargs}
+        workflow = cls(config["project_path"], output_path, config["tool_path"], config["llm_model"],
+                       restoration_concurrency=config.get("restoration_concurrency", 4), llm_client=llm_client,
+                       compile_mode=config.get("compile_mode", "incremental"),
+                       parallel_stages=config.get("parallel_stages", True), cpu_budget=config.get("cpu_budget"),
+                       memory_budget_mb=config.get("memory_budget_mb"),
+                       workspace_mode=config.get("workspace_mode", "auto"),
+                       artifact_cache_dir=config.get("artifact_cache_dir"),
+                       command_timeout=config.get("command_timeout", 6 * 3600),
+                       idle_timeout=config.get("idle_timeout", 3600),
+                       repair_attempts=config.get("repair_attempts", 2))
+        workflow._load_journal(journal)
+        return workflow
+
+    def _load_journal(self, journal: dict):
+        self.times.update(journal.get("times", {}))
+        self.compilations = journal.get("compilations", [])
+        self.completed_stages = journal.get("completed_stages", {})
+        self.file_status = journal.get("files", {})
+        paths = journal.get("paths", {})
+        self.copy_project_path = paths.get("copy_project_path")
+        self.modeling_result_path = paths.get("modeling_result_path")
+        self.code_indexing_result_path = paths.get("code_indexing_result_path")
+        self.detected_result_path = paths.get("detected_result_path")
+        self.state = WorkflowState(journal["state"])
+
+        # 已完成阶段的产物缺失时，从该阶段重新执行
+        if self.state in STAGE_ORDER or self.state == WorkflowState.COMPLETED:
+            for stage in STAGE_ORDER:
+                if stage == self.state:
+                    break
+                record = self.completed_stages.get(stage.value)
+                if record is None or not all(os.path.exists(p) for p in record["artifacts"].values()):
+                    self.logger.warning(f"Artifacts of stage {stage.value} are missing, resume from it")
+                    self.state = stage
+                    break
+        # 工作副本已包含部分还原结果时，还原之前的阶段需要从复制项目重新开始
+        if self.state in STAGE_ORDER[1:STAGE_ORDER.index(WorkflowState.RESTORATION)] and self.file_status:
+            self.state = WorkflowState.INIT
+        if self.state == WorkflowState.INIT:
+            self.completed_stages = {}
+            self.file_status = {}
+        self.logger.info(f"Resume workflow from state: {self.state.value}, "
+                         f"{sum(1 for r in self.file_status.values() if r['status'] == 'restored')} files restored")
+
+    def _stage_artifacts(self, state: WorkflowState) -> Dict[str, str]:
+        """阶段完成后产生的文件或目录（只记录实际存在的）"""
+        output = self.output_path
+        artifacts = {
+            WorkflowState.INIT: {
+                "project": self.copy_project_path,
+                "detected_result_before": os.path.join(output, 'detected_result_before.json'),
+                "before_evaluation": os.path.join(output, 'before_evaluation_results.json'),
+            },
+            WorkflowState.PROJECT_ANALYSIS: {"model": self.modeling_result_path},
+            WorkflowState.CODE_INDEXING: {"code_indexing": self.code_indexing_result_path},
+            WorkflowState.RESTORATION: {"project": self.copy_project_path},
+            WorkflowState.ANALYSIS: {"detected_result_restore": os.path.join(output, 'detected_result_restore.json')},
+            WorkflowState.EVALUATION: {"restored_evaluation": os.path.join(output, 'restored_evaluation_results.json')},
+        }.get(state, {})
+        return {name: path for name, path in artifacts.items() if path and os.path.exists(path)}
+
+    def _save_journal(self, state: Optional[WorkflowState] = None):
+        """
+        保存状态日志
+
+        参数:
+            state: 下一次恢复时要执行的状态，默认为当前状态
+        """
+        with self._journal_lock:
+            self.journal.save({
+                "state": (state or self.state).value,
+                "failure": self.failure,
+                "config": {
+                    "project_path": self.project_path,
+                    "tool_path": self.tool_path,
+                    "llm_model": self.llm_model,
+                    "restoration_concurrency": self.restoration_concurrency,
+                    "compile_mode": self.compile_mode,
+                    "parallel_stages": self.parallel_stages,
+                    "cpu_budget": self.cpu_budget,
+                    "memory_budget_mb": self.memory_budget_mb,
+                    "workspace_mode": self.workspace_mode,
+                    "artifact_cache_dir": self.artifact_cache_dir,
+                    "command_timeout": self.command_timeout,
+                    "idle_timeout": self.idle_timeout,
+                    "repair_attempts": self.repair_attempts,
+                },
+                "paths": {
+                    "copy_project_path": self.copy_project_path,
+                    "modeling_result_path": self.modeling_result_path,
+                    "code_indexing_result_path": self.code_indexing_result_path,
+                    "detected_result_path": self.detected_result_path,
+                },
+                "completed_stages": self.completed_stages,
+                "files": self.file_status,
+                "times": self.times,
+                "compilations": self.compilations,
+            })
+
+    def _complete_stage(self, state: WorkflowState):
+        """记录阶段完成及其产物并落盘"""
+        with self._journal_lock:
+            self.completed_stages[state.value] = {"artifacts": self._stage_artifacts(state),
+                                                  "completed_at": time.strftime('%Y-%m-%d %H:%M:%S')}
+            self._save_journal()
+
+    def _record_file(self, result: Dict):
+        """记录单个文件的还原状态并立即落盘"""
+        with self._journal_lock:
+            self.file_status[result["file"]] = result
+            self._save_journal()
+
     def run(self):
-        while self.state not in [WorkflowState.COMPLETED, WorkflowState.FAILED]:
-            try:
-                self._execute_current_state()
-            except Exception as e:
-                self.logger.error(f"Error in state {self.state}: {str(e)}")
-                self.state = WorkflowState.FAILED
-                break
+        previous_tracer = set_tracer(self.tracer)
+        try:
+            with trace_span("workflow", "workflow", project=self.project_path, model=self.llm_model):
+                self._run_states()
+        finally:
+            set_tracer(previous_tracer)
 
         self._statistic()
 
+    def _run_states(self):
+        while self.state not in [WorkflowState.COMPLETED, WorkflowState.FAILED]:
+            state = self.state
+            with trace_span(state.value, "stage") as trace:
+                try:
+                    self._execute_current_state()
+                except Exception as e:
+                    self.logger.error(f"Error in state {self.state}: {str(e)}")
+                    self.state = WorkflowState.FAILED
+                    trace.set(error=str(e))
+                trace.set(next_state=self.state.value)
+            if self.state == WorkflowState.FAILED:
+                # 日志中保留失败的阶段，恢复时从该阶段重新执行
+                self.failure = {"state": state.value, "time": time.strftime('%Y-%m-%d %H:%M:%S')}
+                self._save_journal(state)
+                break
+            if self.state != state:
+                self.failure = None
+                self._complete_stage(state)
+
     def run_state(self, state: WorkflowState):
         if state == WorkflowState.INIT:
             self._execute_init(False)
 
+    def _load_output_json(self, name: str) -> Optional[dict]:
+        """读取输出目录中的分析/评估结果，运行失败或中途停止时文件可能不存在，返回None"""
+        path = os.path.join(self.output_path, name)
+        if not os.path.exists(path):
+            return None
+        return load_json_file(path)
+
     def _statistic(self):
-        result = {
-            "times": self.times,
-            "model": self.llm_model,
-            "restored_files": len(self.restored_files),
-            "before_detected_result":load_json_file(os.path.join(self.output_path, 'before_detailed_results.json')),
-            "before_evaluation": load_json_file(os.path.join(self.output_path, 'before_evaluation_results.json')),
-            "restored_detected_result": load_json_file(os.path.join(self.output_path, 'restored_detailed_results.json')),
-            "restored_evaluation": load_json_file(os.path.join(self.output_path, 'restored_evaluation_results.json')),
-        }
-        statistics = json.dumps(result,indent=4)
-        self.logger.info(statistics)
-        write_string_to_file(statistics, os.path.join(self.output_path, 'statistics.json'))
+        # 先导出trace，即使统计数据出错也保留失败运行的trace
+        try:
+            self.tracer.export_chrome(os.path.join(self.output_path, 'trace.json'))
+        finally:
+            result = {
+                "state": self.state.value,
+                "failure": self.failure,
+                "times": self.times,
+                "model": self.llm_model,
+                "restored_files": len(self.restored_files),
+                "resumed_files": sum(1 for r in self.restoration_results if r.get("resumed")),
+                "compilations": self.compilations,
+                "commands": self.commands,
+                "repair": self._repair_statistics(),
+                "stages": self.stage_results,
+                "workspace": self.workspace.stats.to_dict(),
+                "artifact_cache": self.artifact_cache_results,
+                "trace": {"file": "trace.json", "summary": self.tracer.summary()},
+                "restoration": {
+                    "concurrency": self.restoration_concurrency,
+                    "files": self.restoration_results,
+                },
+                "before_detected_result": self._load_output_json('before_detailed_results.json'),
+                "before_evaluation": self._load_output_json('before_evaluation_results.json'),
+                "restored_detected_result": self._load_output_json('restored_detailed_results.json'),
+                "restored_evaluation": self._load_output_json('restored_evaluation_results.json'),
+            }
+            statistics = json.dumps(result,indent=4)
+            self.logger.info(statistics)
+            write_string_to_file(statistics, os.path.join(self.output_path, 'statistics.json'))
 
     def _execute_current_state(self):
         if self.state == WorkflowState.INIT:
-            self._execute_init()
+            if self.parallel_stages:
+                self._execute_stage_graph()
+            else:
+                self._execute_init()
         elif self.state == WorkflowState.PROJECT_ANALYSIS:
             self._execute_project_analysis()
         elif self.state == WorkflowState.CODE_INDEXING:
@@ -205,104 +495,294 @@ class SemanticRestorationWorkflow:
         elif self.state == WorkflowState.EVALUATION:
             self._execute_evaluation()
 
-    def _execute_init(self,copy=True):
-        """初始化工作流"""
+    def _execute_init(self, copy=True, baseline=True):
+        """
+        初始化工作流
+
+        参数:
+            copy: 是否复制项目作为工作副本
+            baseline: 是否同时对原始项目执行静态分析与评估，依赖图调度时作为独立阶段执行
+        """
         self.start_time = time.time()
         self.logger.info("Starting semantic restoration workflow")
         if copy:
-            # copy project to new directory as work directory
-            copy_directory(self.project_path, os.path.join(self.output_path, 'project'))
+            # 以reflink/硬链接创建工作副本，跳过.git、target等目录
+            self.workspace.create()
         self.state = WorkflowState.PROJECT_ANALYSIS
         self.copy_project_path = os.path.join(self.output_path, 'project')
         # 对原始项目首先进行一次编译和静态分析
         self._execute_compilation()
-        self._execute_static_analysis(before=True, change_state=False)
-        self._execute_evaluation(before=True, change_state=False)
+        if baseline:
+            self._execute_static_analysis(before=True, change_state=False)
+            self._execute_evaluation(before=True, change_state=False)
+
+    def _execute_stage_graph(self):
+        """
+        按依赖图执行语义还原之前的阶段：建模、代码索引与基线污点分析都只依赖编译后的工作副本，
+        在CPU/内存预算内并发执行
+        """
+        scheduler = StageScheduler(self.cpu_budget, self.memory_budget_mb)
+        stages = [
+            ("init", lambda: self._execute_init(baseline=False), ()),
+            ("project_analysis", lambda: self._execute_project_analysis(change_state=False), ("init",)),
+            ("code_indexing", lambda: self._execute_code_indexing(change_state=False), ("init",)),
+            ("baseline_analysis", lambda: self._execute_static_analysis(before=True, change_state=False), ("init",)),
+            ("baseline_evaluation", lambda: self._execute_evaluation(before=True, change_state=False),
+             ("baseline_analysis",)),
+        ]
+        for name, action, deps in stages:
+            cpus, memory_mb = STAGE_RESOURCES[name]
+            scheduler.add(Stage(name, traced(action, name, "stage"), deps, cpus, memory_mb))
+        results = scheduler.run()
+        self.stage_results.update({name: result.to_dict() for name, result in results.items()})
+
+        failed = [result for result in results.values() if result.status == "failed"]
+        if failed:
+            raise RuntimeError("; ".join(f"{result.name}: {result.error}" for result in failed))
+        self._complete_stage(WorkflowState.PROJECT_ANALYSIS)
+        self._complete_stage(WorkflowState.CODE_INDEXING)
+        self.state = WorkflowState.RESTORATION
+
+    def _source_tree_manifest(self) -> str:
+        """还原前工作副本的源码树清单哈希，各阶段并发调用时只计算一次"""
+        with self._manifest_lock:
+            if self._source_manifest is None:
+                self._source_manifest = tree_manifest(self.copy_project_path)
+            return self._source_manifest
+
+    def _normalize_command(self, command: str) -> str:
+        """把命令行中与本次运行相关的路径替换为占位符，使不同输出目录的运行可以共享缓存"""
+        for path, placeholder in ((self.copy_project_path, "{project}"), (self.output_path, "{output}"),
+                                  (self.tool_path, "{tools}")):
+            if path:
+                command = command.replace(path, placeholder)
+        return command
+
+    def _run_cached(self, stage: str, command: str, inputs: Callable[[], Dict[str, str]], patterns: List[str],
+                    action: Callable[[], int]) -> int:
+        """
+        带产物缓存地执行阶段命令
+
+        参数:
+            stage: 阶段名
+            command: 执行的命令行，归一化后计入缓存键
+            inputs: 返回输入哈希（源码树清单、jar校验和等）的函数，不启用缓存时不调用
+            patterns: 相对输出目录的产物路径或通配符
+            action: 执行命令并返回退出码，只有退出码为0时缓存产物
+
+        返回:
+            退出码，命中缓存时为0
+        """
+        if self.artifact_cache is None:
+            return action()
+        key = self.artifact_cache.key(stage, self._normalize_command(command), inputs())
+        if self.artifact_cache.restore(stage, key, self.output_path):
+            self.artifact_cache_results[stage] = "hit"
+            return 0
+        self.artifact_cache_results[stage] = "miss"
+        return_code = action()
+        if return_code == 0:
+            self.artifact_cache.store(stage, key, self.output_path, patterns)
+        return return_code
+
+    def _run_command(self, stage: str, command: str, cwd: Optional[str] = None) -> CommandResult:
+        """
+        执行外部命令，输出写入logs/<stage>.log，并记录退出状态与资源使用
+
+        参数:
+            stage: 阶段名，决定日志文件
+            command: 命令行
+            cwd: 工作目录
+        """
+        result = run_command(command, cwd=cwd, log_file=os.path.join(self.log_path, f"{stage}.log"),
+                             timeout=self.command_timeout, idle_timeout=self.idle_timeout)
+        with self._journal_lock:
+            self.commands.append({"stage": stage, **result.to_dict()})
+        self.logger.info(f"Command finished ({stage}): exit {result.returncode}, {result.elapsed:.2f}s, "
+                         f"peak RSS {result.max_rss_mb}MB, user {result.user_cpu}s, sys {result.sys_cpu}s")
+        if result.timed_out:
+            self.logger.error(f"Command timed out ({result.timed_out}), see {result.log_file}")
+        return result
 
-    def _execute_project_analysis(self):
+    def _execute_project_analysis(self, change_state=True):
         self.logger.info("----Starting project analysis workflow----")
         # 调用建模工具
         start_time = time.time()
         project = self.copy_project_path
-        command = f"java -jar {self.tool_path}/anno-model-1.0.jar -p {project} -o {self.output_path}/model"
+        jar = f"{self.tool_path}/anno-model-1.0.jar"
+        command = f"java -jar {jar} -p {project} -o {self.output_path}/model"
         self.logger.info(f"Running command: {command}")
-        execute_command(command)
-        self.state = WorkflowState.CODE_INDEXING
+        self._run_cached("project_analysis", command,
+                         lambda: {"sources": self._source_tree_manifest(), "jar": file_checksum(jar)},
+                         ["model"], lambda: self._run_command("project_analysis", command).returncode)
+        if change_state:
+            self.state = WorkflowState.CODE_INDEXING
         self.modeling_result_path = os.path.join(self.output_path, 'model')
         elapsed_time = time.time() - start_time
         self.times["project_analysis"] = self.times["project_analysis"] + elapsed_time
         self.logger.info("----Completed project analysis workflow----")
 
-    def _execute_code_indexing(self):
+    def _execute_code_indexing(self, change_state=True):
         self.logger.info("------Starting code indexing workflow------")
         # java -cp target/code-index-1.0-SNAPSHOT.jar edu.thu.soot.SootCodeAnalyzer -t /target/classes -o ./analysis-result -c -i -j
         code_indexing_result = os.path.join(self.output_path, 'code_indexing')
         start_time = time.time()
-        command1 = f"java -jar {self.tool_path}/code-index-1.0-SNAPSHOT.jar -t {self.copy_project_path}/target/classes -o {code_indexing_result} -c -j -i"
+        jar = f"{self.tool_path}/code-index-1.0-SNAPSHOT.jar"
+        command1 = f"java -jar {jar} -t {self.copy_project_path}/target/classes -o {code_indexing_result} -c -j -i"
         self.logger.info(f"Running command: {command1}")
-        execute_command(command1, cwd=self.copy_project_path)
+        # target/classes由源码编译得到，以源码树清单作为输入
+        self._run_cached("code_indexing", command1,
+                         lambda: {"sources": self._source_tree_manifest(), "jar": file_checksum(jar)},
+                         ["code_indexing"],
+                         lambda: self._run_command("code_indexing", command1, cwd=self.copy_project_path).returncode)
         self.code_indexing_result_path = code_indexing_result
         elapsed_time = time.time() - start_time
         self.times["code_indexing"] = self.times["code_indexing"] + elapsed_time
         self.logger.info("----Completed code indexing workflow----")
         # TODO debug
         # self.state = WorkflowState.ANALYSIS
-        self.state = WorkflowState.RESTORATION
+        if change_state:
+            self.state = WorkflowState.RESTORATION
+
+    def _execute_compilation(self, files: Optional[List[str]] = None):
+        """
+        编译工作副本
 
-    def _execute_compilation(self):
+        参数:
+            files: 改动过的源文件（相对项目目录）。增量模式下给出时只用javac编译这些文件，否则完整Maven构建
+        """
+        with trace_span("compile", "compilation", mode=self.compile_mode,
+                        files=None if files is None else len(files)):
+            self._compile(files)
+
+    def _compile(self, files: Optional[List[str]]):
         self.logger.info("------compile project------")
         start_time = time.time()
-        command = f"mvn clean compile -Dmaven.test.skip=true"
+        if self.compile_mode == "incremental":
+            if self.compiler is None:
+                self.compiler = IncrementalCompiler(self.copy_project_path, os.path.join(self.output_path, '.build'),
+                                                    log_file=os.path.join(self.log_path, 'compilation.log'),
+                                                    timeout=self.command_timeout, idle_timeout=self.idle_timeout)
+            if files is not None and self.compiler.can_compile_incrementally():
+                result = self.compiler.compile(files)
+                self.logger.info(f"javac compiled {len(files)} files in {result.elapsed:.2f}s")
+            else:
+                result = self.compiler.full_build()
+            self.compilations.append(result.to_dict())
+            self.times["compilation"] = self.times["compilation"] + time.time() - start_time
+            if not result.success:
+                for file, errors in result.errors.items():
+                    self.logger.error(f"{file}:\n" + "\n".join(errors))
+                if not result.errors:
+                    self.logger.error(result.output)
+                raise CompilationError(result)
+            return
+
+        command = MAVEN_COMPILE_COMMAND
         self.logger.info(f"Running command: {command}")
-        return_code, stdout, stderr = execute_command(command, cwd=self.copy_project_path)
-        if return_code != 0:
+        result = self._run_command("compilation", command, cwd=self.copy_project_path)
+        if result.returncode != 0:
             raise RuntimeError(f"Error while executing command: {command}")
-        if "BUILD SUCCESS" not in stdout:
-            self.logger.error(f"{stdout}")
-            raise RuntimeError(f"{stdout}")
+        if "BUILD SUCCESS" not in result.stdout:
+            self.logger.error(f"{result.stdout}")
+            raise RuntimeError(f"{result.stdout}")
         elapsed_time = time.time() - start_time
         self.times["compilation"] = self.times["compilation"] + elapsed_time
+        self.compilations.append({"success": True, "mode": "maven", "files": 0, "elapsed": round(elapsed_time, 3),
+                                  "errors": {}})
 
-    def _execute_restoration(self):
-        """执行语义还原"""
-        self.logger.info("------Starting restoration workflow------")
+    def _restore_file(self, file: str, prompt: str) -> Dict:
+        """请求LLM还原单个文件，完成后立即写回工作副本"""
+        start_time = time.time()
+        self.logger.info(f"Processing file: {file}")
+        with trace_span("restore_file", "restoration", file=file, model=self.llm_model):
+            response = self.llm_client.generate_completion(prompt=prompt,
+                                                           system_prompt=system_prompt_semantic_restoration)
+            self.last_llm_response = response
+            restoration = strip_code_markers_completely(response['choices'][0]['message']['content'])
+            modified = os.path.join(self.copy_project_path, file)
+            self.logger.info(f"write file: {modified}")
+            # 原地写入硬链接会改动原始项目，先断开链接
+            self.workspace.materialize(file)
+            if not write_string_to_file(restoration, modified):
+                raise RuntimeError(f"写入还原结果失败: {modified}")
+        result = {"file": file, "status": "restored", "elapsed": round(time.time() - start_time, 3)}
+        self._record_file(result)
+        return result
 
+    def _collect_restoration_tasks(self) -> List[Tuple[str, str]]:
+        """扫描工作副本，返回需要还原的(文件相对路径, 提示词)列表"""
         processor = ModelingDataProcessor(self.copy_project_path, self.modeling_result_path,
                                           self.code_indexing_result_path)
         # 加载建模数据
         processor.load_modeling_data()
         # 扫描Java文件
         java_files = processor.scan_java_files()
-        try:
-            for file in java_files:
-                prompt_data = processor.gather_file_modeling_data(file)
-                json_pretty = json.dumps(prompt_data, indent=2)
-                if 'modeling_data' not in prompt_data or (len(prompt_data['modeling_data']['aop_data']) == 0 and len(
-                        prompt_data['modeling_data']['ioc_data'])) == 0:
-                    self.logger.info(f"No need to do semantic restoration for: {file}. skip...")
+        tasks = []
+        for file in java_files:
+            prompt_data = processor.gather_file_modeling_data(file)
+            if not needs_restoration(prompt_data):
+                self.logger.info(f"No need to do semantic restoration for: {file}. skip...")
+                continue
+            tasks.append((file, json.dumps(prompt_data, indent=2)))
+        return tasks
+
+    def _execute_restoration(self):
+        """执行语义还原，各文件的LLM请求并发执行，每个文件完成后立即写回"""
+        self.logger.info("------Starting restoration workflow------")
+        start_time = time.time()
+        tasks = self._collect_restoration_tasks()
+        results = {}
+        # 恢复运行时跳过上次已写回的文件
+        for file, _ in tasks:
+            previous = self.file_status.get(file)
+            if previous is not None and previous["status"] == "restored":
+                results[file] = {**previous, "resumed": True}
+        pending_tasks = [(file, prompt) for file, prompt in tasks if file not in results]
+        self.logger.info(f"{len(pending_tasks)} files to restore ({len(results)} restored before), "
+                         f"concurrency: {self.restoration_concurrency}")
+        failed = False
+        with ThreadPoolExecutor(max_workers=self.restoration_concurrency,
+                                thread_name_prefix="restoration") as executor:
+            futures = {executor.submit(self._restore_file, file, prompt): file for file, prompt in pending_tasks}
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            # 出现失败后不再开始新的文件，已在请求中的文件仍会写回
+            for future in pending:
+                future.cancel()
+            for future in futures:
+                file = futures[future]
+                if future.cancelled():
+                    results[file] = {"file": file, "status": "cancelled"}
                     continue
-                start_time = time.time()
-                self.logger.info(f"Processing file: {file}")
-                response = self.llm_client.generate_completion(prompt=json_pretty,
-                                                               system_prompt=system_prompt_semantic_restoration)
-                self.last_llm_response = response
-                restoration = strip_code_markers_completely(response['choices'][0]['message']['content'])
-                modified = os.path.join(self.copy_project_path, file)
-                self.logger.info(f"write file: {modified}")
-
-                write_string_to_file(restoration, modified)
-                elapsed_time = time.time() - start_time
-                self.times["restoration"] = self.times["restoration"] + elapsed_time
-                try:
-                    # TODO 注释这行只执行一次,节省调试时间
-                    """注释这行只执行一次,节省调试时间"""
-                    # self._execute_compilation()
-                except RuntimeError as e:
-                    self.logger.error(f"Error while executing command: {e}")
-                    # TODO try to fix
-                    self.state = WorkflowState.FAILED
-                    return
-            self._execute_compilation()
+                error = future.exception()
+                if error is not None:
+                    failed = True
+                    results[file] = {"file": file, "status": "failed", "error": str(error)}
+                    self._record_file(results[file])
+                else:
+                    results[file] = future.result()
+
+        # 汇总按扫描顺序输出，与并发完成顺序无关
+        self.restoration_results = [results[file] for file, _ in tasks]
+        self.restored_files = [r["file"] for r in self.restoration_results if r["status"] == "restored"]
+        for result in self.restoration_results:
+            if result["status"] == "failed":
+                self.logger.error(f"Restoration failed: {result['file']}: {result['error']}")
+            else:
+                self.logger.info(f"Restoration {result['status']}: {result['file']} ({result.get('elapsed', 0)}s)")
+        self.times["restoration"] = self.times["restoration"] + time.time() - start_time
+        if failed:
+            self.logger.error("Error in semantic restoration workflow")
+            self.state = WorkflowState.FAILED
+            return
+
+        try:
+            try:
+                self._execute_compilation(self.restored_files)
+            except CompilationError as e:
+                if not self.repair_attempts:
+                    raise
+                self._execute_repair(e.result)
         except Exception as e:
             self.logger.error(f"Error in semantic restoration workflow: {str(e)}")
             self.state = WorkflowState.FAILED
@@ -311,6 +791,109 @@ class SemanticRestorationWorkflow:
         self.state = WorkflowState.ANALYSIS
         self.logger.info("------Completed restoration workflow------")
 
+    def _compile_files(self, files: List[str], repair: Optional[str] = None) -> CompileResult:
+        """用javac编译给定文件并记录，不抛出编译错误"""
+        start_time = time.time()
+        with trace_span("compile", "compilation", mode="javac", files=len(files), repair=repair):
+            result = self.compiler.compile(files)
+        self.times["compilation"] = self.times["compilation"] + time.time() - start_time
+        self.compilations.append({**result.to_dict(), "repair": repair})
+        return result
+
+    def _execute_repair(self, failed: CompileResult):
+        """
+        编译错误修复：先编译没有错误的还原文件，再把每个出错的文件连同其编译错误单独交给LLM修复，
+        每次修复后只重新编译该文件；超过修复次数仍无法编译的文件回退为原始文件
+
+        参数:
+            failed: 还原文件整体编译失败的结果
+        """
+        self.logger.info("------Starting compile error repair------")
+        start_time = time.time()
+        if failed.mode != "javac" or self.compiler is None:
+            raise CompilationError(failed)
+        unknown = [file for file in failed.errors if file not in self.restored_files]
+        if unknown:
+            # 错误不在还原过的文件中（如类路径问题），无法通过修复单个文件解决
+            raise RuntimeError(f"Compilation errors outside restored files: {', '.join(unknown)}")
+
+        errors = dict(failed.errors)
+        pending = [file for file in self.restored_files if file not in errors]
+        while pending:
+            result = self._compile_files(pending)
+            if result.success:
+                break
+            new_errors = {file: e for file, e in result.errors.items() if file in pending}
+            if not new_errors:
+                raise CompilationError(result)
+            errors.update(new_errors)
+            pending = [file for file in pending if file not in new_errors]
+
+        for file in self.restored_files:
+            if file in errors:
+                self.repair_results.append(self._repair_file(file, errors[file]))
+
+        reverted = {r["file"] for r in self.repair_results if r["status"] == "reverted"}
+        for result in self.restoration_results:
+            if result["file"] in reverted:
+                result["status"] = "reverted"
+                self._record_file(result)
+        self.restored_files = [file for file in self.restored_files if file not in reverted]
+        self.times["repair"] = self.times["repair"] + time.time() - start_time
+        statistics = self._repair_statistics()
+        self.logger.info(f"Compile error repair: {statistics['fixed']}/{statistics['attempted']} fixed, "
+                         f"{statistics['reverted']} reverted, {statistics['llm_requests']} LLM requests")
+
+    def _repair_file(self, file: str, errors: List[str]) -> Dict:
+        """对单个文件反复请求LLM修复并只重新编译该文件，返回修复结果"""
+        path = os.path.join(self.copy_project_path, file)
+        result = {"file": file, "status": "reverted", "attempts": 0, "initial_errors": len(errors),
+                  "prompt_tokens": 0, "completion_tokens": 0}
+        with trace_span("repair_file", "repair", file=file) as trace:
+            for attempt in range(1, self.repair_attempts + 1):
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    source = f.read()
+                response = self.llm_client.generate_completion(prompt=build_repair_prompt(file, source, errors),
+                                                               system_prompt=system_prompt_compile_repair)
+                usage = response.get('usage') or {}
+                result["prompt_tokens"] += usage.get('prompt_tokens') or 0
+                result["completion_tokens"] += usage.get('completion_tokens') or 0
+                result["attempts"] = attempt
+                repaired = strip_code_markers_completely(response['choices'][0]['message']['content'])
+                if not write_string_to_file(repaired, path):
+                    raise RuntimeError(f"写入修复结果失败: {path}")
+                compiled = self._compile_files([file], repair=file)
+                if compiled.success:
+                    result["status"] = "fixed"
+                    break
+                errors = compiled.errors.get(file) or [compiled.output.strip()]
+                self.logger.info(f"Repair attempt {attempt} failed for {file}: {len(errors)} errors")
+
+            if result["status"] != "fixed":
+                # 回退为原始文件，工作流可以继续，只是该文件不参与语义还原
+                self.logger.error(f"Could not repair {file}, reverting to the original source")
+                shutil.copyfile(os.path.join(self.project_path, file), path)
+                compiled = self._compile_files([file], repair=file)
+                if not compiled.success:
+                    raise CompilationError(compiled)
+            trace.set(status=result["status"], attempts=result["attempts"])
+        return result
+
+    def _repair_statistics(self) -> Dict:
+        """修复率等汇总"""
+        attempted = len(self.repair_results)
+        fixed = sum(1 for r in self.repair_results if r["status"] == "fixed")
+        return {
+            "attempted": attempted,
+            "fixed": fixed,
+            "reverted": attempted - fixed,
+            "fix_rate": round(fixed / attempted, 3) if attempted else None,
+            "llm_requests": sum(r["attempts"] for r in self.repair_results),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in self.repair_results),
+            "completion_tokens": sum(r["completion_tokens"] for r in self.repair_results),
+            "files": self.repair_results,
+        }
+
     def _execute_static_analysis(self, before=False, change_state=True):
         """执行静态分析"""
         self.logger.info("------Starting static analysis workflow------")
@@ -326,7 +909,17 @@ class SemanticRestorationWorkflow:
             f"java -jar {self.tool_path}/taintanalysis.jar -p {self.copy_project_path} -j {self.tool_path}/rt.jar "
             f"-w true -o {self.detected_result_path} -c {config_path}")
         self.logger.info(f"Running command: {command}")
-        return_code, stdout, stderr = execute_command(command, cwd=self.copy_project_path)
+        if before:
+            # 原始项目的污点分析只取决于源码、分析工具与配置
+            return_code = self._run_cached(
+                "baseline_analysis", command,
+                lambda: {"sources": self._source_tree_manifest(),
+                         "jar": file_checksum(f"{self.tool_path}/taintanalysis.jar"),
+                         "rt": file_checksum(f"{self.tool_path}/rt.jar"), "config": file_checksum(config_path)},
+                [os.path.basename(result_file)],
+                lambda: self._run_command("baseline_analysis", command, cwd=self.copy_project_path).returncode)
+        else:
+            return_code = self._run_command("analysis", command, cwd=self.copy_project_path).returncode
         if return_code != 0:
             self.state = WorkflowState.FAILED
             raise RuntimeError(f"Error while executing command: {command}")
@@ -341,10 +934,22 @@ class SemanticRestorationWorkflow:
         start_time = time.time()
         # python3 evaluate_flowdroid_optimized.py --input test_result_restore.json --output restore
         output_name = os.path.join(self.output_path, 'before' if before else 'restored')
-        command = f"python3 {self.tool_path}/evaluate_flowdroid_optimized.py --input {self.detected_result_path} --output {output_name}"
+        script = f"{self.tool_path}/evaluate_flowdroid_optimized.py"
+        command = f"python3 {script} --input {self.detected_result_path} --output {output_name}"
         self.logger.info(f"{command}")
-        exit_code, stdout, stderr = execute_command(command, cwd=self.tool_path)
-        self.logger.info(f"---- evaluation -----\n {stdout}")
+
+        def evaluate() -> int:
+            result = self._run_command("baseline_evaluation" if before else "evaluation", command, cwd=self.tool_path)
+            self.logger.info(f"---- evaluation -----\n {result.stdout}")
+            return result.returncode
+
+        if before:
+            detected_result_path = self.detected_result_path
+            self._run_cached("baseline_evaluation", command,
+                             lambda: {"input": file_checksum(detected_result_path), "script": file_checksum(script)},
+                             ["before_*"], evaluate)
+        else:
+            evaluate()
         elapsed_time = time.time() - start_time
         self.times["evaluation"] = self.times["evaluation"] + elapsed_time
         self.logger.info("------Completed evaluation workflow------")
@@ -378,14 +983,71 @@ class SemanticRestorationWorkflow:
         return logger
 
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='语义还原工作流')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='从头执行工作流')
+    run_parser.add_argument('--project', '-p', required=True, help='原始项目路径')
+    run_parser.add_argument('--output', '-o', required=True, help='输出目录')
+    run_parser.add_argument('--tools', '-t', required=True, help='工具目录')
+    run_parser.add_argument('--model', '-m', required=True, help='语义还原使用的LLM模型')
+    run_parser.add_argument('--artifact-cache', default='artifact_cache', help='阶段产物缓存目录，可在多次运行间共享')
+
+    resume_parser = subparsers.add_parser('resume', help='从输出目录中的状态日志继续执行')
+    resume_parser.add_argument('--output', '-o', required=True, help='上一次运行的输出目录')
+
+    for sub in (run_parser, resume_parser):
+        sub.add_argument('--concurrency', type=int, help='语义还原并发文件数')
+        sub.add_argument('--compile-mode', choices=['incremental', 'full'], help='编译模式')
+        sub.add_argument('--sequential', action='store_true', help='按线性状态机依次执行各阶段，不并发')
+        sub.add_argument('--cpu-budget', type=int, help='并发阶段的CPU核数预算')
+        sub.add_argument('--memory-budget', type=int, help='并发阶段的内存预算（MB）')
+        sub.add_argument('--workspace-mode', choices=list(WORKSPACE_MODES), help='工作副本的创建方式')
+        sub.add_argument('--no-artifact-cache', action='store_true', help='不复用建模、索引与基线分析的缓存产物')
+        sub.add_argument('--command-timeout', type=float, help='单个外部命令的总时长上限（秒）')
+        sub.add_argument('--idle-timeout', type=float, help='外部命令没有输出的时长上限（秒）')
+        sub.add_argument('--repair-attempts', type=int, help='无法编译的还原文件交给LLM修复的最多次数，0表示不修复')
+    return parser.parse_args()
+
+
 def main():
-    workflow = SemanticRestorationWorkflow(
-        project_path="/path/to/project",
-        output_path="/path/to/output"
-    )
+    args = parse_arguments()
+    options = {}
+    if args.concurrency:
+        options["restoration_concurrency"] = args.concurrency
+    if args.compile_mode:
+        options["compile_mode"] = args.compile_mode
+    if args.sequential:
+        options["parallel_stages"] = False
+    if args.cpu_budget:
+        options["cpu_budget"] = args.cpu_budget
+    if args.memory_budget:
+        options["memory_budget_mb"] = args.memory_budget
+    if args.workspace_mode:
+        options["workspace_mode"] = args.workspace_mode
+    if args.command == 'run':
+        options["artifact_cache_dir"] = args.artifact_cache
+    if args.no_artifact_cache:
+        options["artifact_cache_dir"] = None
+    if args.command_timeout:
+        options["command_timeout"] = args.command_timeout
+    if args.idle_timeout:
+        options["idle_timeout"] = args.idle_timeout
+    if args.repair_attempts is not None:
+        options["repair_attempts"] = args.repair_attempts
+
+    if args.command == 'resume':
+        workflow = SemanticRestorationWorkflow.resume(args.output, **options)
+    else:
+        workflow = SemanticRestorationWorkflow(args.project, args.output, args.tools, args.model, **options)
     workflow.run()
 
     if workflow.state == WorkflowState.COMPLETED:
         print("Semantic restoration completed successfully")
     else:
         print("Semantic restoration failed")
+
+
+if __name__ == '__main__':
+    main()
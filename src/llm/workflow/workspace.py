@@ -0,0 +1,183 @@
+"""
+写时复制的项目工作副本
+
+copy_directory每次都完整复制整个项目（包括.git、target和大体积资源）。工作副本管理器改为按目录结构
+逐个文件创建reflink（文件系统支持时，如Btrfs/XFS）或硬链接，跳过可忽略的目录，只有语义还原要改写的
+文件才通过materialize()变成真正独立的副本，从而不会改动原始项目。
+"""
+
+import errno
+import logging
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Iterable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger("workflow_workspace")
+
+# Linux FICLONE ioctl，整文件reflink
+FICLONE = 0x40049409
+DEFAULT_IGNORED_DIRS = ('.git', '.svn', '.hg', '.idea', '.gradle', 'target', 'node_modules')
+WORKSPACE_MODES = ('auto', 'reflink', 'hardlink', 'copy')
+_UNSUPPORTED = (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOTTY,
+                errno.EBADF, errno.EMLINK)
+
+
+@dataclass
+class WorkspaceStats:
+    """工作副本的创建统计，*_bytes为文件大小之和"""
+    mode: str = ""
+    files: int = 0
+    reflinked: int = 0
+    hardlinked: int = 0
+    copied: int = 0
+    symlinks: int = 0
+    skipped_dirs: int = 0
+    materialized: int = 0
+    source_bytes: int = 0
+    shared_bytes: int = 0
+    copied_bytes: int = 0
+    elapsed: float = 0.0
+
+    def to_dict(self) -> dict:
+        result = asdict(self)
+        result["elapsed"] = round(self.elapsed, 3)
+        return result
+
+
+def _reflink(source: str, target: str):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink不可用")
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(target)
+            raise
+
+
+class Workspace:
+    """
+    用法:
+        workspace = Workspace(project_path, os.path.join(output_path, 'project'))
+        workspace.create()
+        workspace.materialize("src/main/java/A.java")   # 改写文件之前调用
+    """
+
+    def __init__(self, source: str, target: str, mode: str = "auto", ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS):
+        """
+        参数:
+            source: 原始项目目录
+            target: 工作副本目录，已存在时先删除
+            mode: auto依次尝试reflink、硬链接和复制；也可固定为reflink、hardlink或copy
+            ignored_dirs: 不进入工作副本的目录名
+        """
+        if mode not in WORKSPACE_MODES:
+            raise ValueError(f"不支持的工作副本模式: {mode}")
+        self.source = os.path.abspath(source)
+        self.target = os.path.abspath(target)
+        self.mode = mode
+        self.ignored_dirs = set(ignored_dirs)
+        self.stats = WorkspaceStats(mode=mode)
+        # auto模式下依次降级的链接方式
+        self._methods = {"auto": ["reflink", "hardlink", "copy"], "reflink": ["reflink", "copy"],
+                         "hardlink": ["hardlink", "copy"], "copy": ["copy"]}[mode]
+
+    def _place(self, source: str, target: str):
+        while True:
+            method = self._methods[0]
+            try:
+                if method == "reflink":
+                    _reflink(source, target)
+                    shutil.copystat(source, target)
+                    self.stats.reflinked += 1
+                elif method == "hardlink":
+                    os.link(source, target)
+                    self.stats.hardlinked += 1
+                else:
+                    shutil.copy2(source, target)
+                    self.stats.copied += 1
+                return method
+            except OSError as e:
+                if method == "copy" or e.errno not in _UNSUPPORTED:
+                    raise
+                logger.info(f"{method}不可用（{os.strerror(e.errno)}），改用{self._methods[1]}")
+                self._methods.pop(0)
+
+    def create(self) -> WorkspaceStats:
+        """创建工作副本，返回统计信息"""
+        start_time = time.time()
+        if os.path.lexists(self.target):
+            shutil.rmtree(self.target)
+        for root, dirs, files in os.walk(self.source):
+            kept = []
+            for d in dirs:
+                if d in self.ignored_dirs:
+                    self.stats.skipped_dirs += 1
+                elif os.path.islink(os.path.join(root, d)):
+                    files.append(d)
+                else:
+                    kept.append(d)
+            dirs[:] = kept
+            relative = os.path.relpath(root, self.source)
+            target_dir = os.path.normpath(os.path.join(self.target, relative))
+            os.makedirs(target_dir, exist_ok=True)
+            for name in files:
+                source_file = os.path.join(root, name)
+                target_file = os.path.join(target_dir, name)
+                if os.path.islink(source_file):
+                    os.symlink(os.readlink(source_file), target_file)
+                    self.stats.symlinks += 1
+                    continue
+                size = os.path.getsize(source_file)
+                method = self._place(source_file, target_file)
+                self.stats.files += 1
+                self.stats.source_bytes += size
+                if method == "copy":
+                    self.stats.copied_bytes += size
+                else:
+                    self.stats.shared_bytes += size
+        self.stats.elapsed = time.time() - start_time
+        self.stats.mode = self._methods[0] if self.mode == "auto" else self.mode
+        logger.info(f"工作副本已创建: {self.target}，耗时 {self.stats.elapsed:.2f} 秒，{self.stats.files} 个文件"
+                    f"（reflink {self.stats.reflinked}，硬链接 {self.stats.hardlinked}，复制 {self.stats.copied}），"
+                    f"实际复制 {self.stats.copied_bytes / 1024 / 1024:.1f}MB / {self.stats.source_bytes / 1024 / 1024:.1f}MB")
+        return self.stats
+
+    def materialize(self, file: str) -> Optional[str]:
+        """
+        将工作副本中的文件变成独立的副本，之后可以安全地原地改写而不影响原始项目
+
+        参数:
+            file: 相对工作副本的路径
+
+        返回:
+            文件的绝对路径；文件不存在（新文件）时返回None
+        """
+        path = os.path.join(self.target, file)
+        if not os.path.exists(path) or os.path.islink(path):
+            return None
+        # reflink在块级别写时复制，只有硬链接需要断开
+        if os.stat(path).st_nlink <= 1:
+            return path
+        # 复制到同目录的临时文件后原子替换，断开与原始文件的链接
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".materialize-")
+        os.close(descriptor)
+        try:
+            shutil.copy2(path, temp_path)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.stats.materialized += 1
+        self.stats.copied_bytes += os.path.getsize(path)
+        return path